@@ -199,10 +199,15 @@ class JobSubmitter(Base):
         if job_id and self.options.blocking:
             inquirer = Inquirer(context)
             job = inquirer.get_job_status(job_id)
+            timeout = min(max(self.options.poll_interval, 1), 300)
             while job['job_state'] in ['SUBMITTED', 'READY', 'STAGING', 'ACTIVE']:
                 self.logger.info("Job in state %s" % job['job_state'])
-                time.sleep(self.options.poll_interval)
-                job = inquirer.get_job_status(job_id)
+                start = time.time()
+                job = inquirer.wait_for_job(job_id, timeout=timeout)
+                # Servers without long polling answer right away
+                remaining = timeout - (time.time() - start)
+                if job['job_state'] in ['SUBMITTED', 'READY', 'STAGING', 'ACTIVE'] and remaining > 0:
+                    time.sleep(remaining)
 
             self.logger.info("Job finished with state %s" % job['job_state'])
             if job['reason']:
@@ -18,6 +18,7 @@
 import sqlalchemy
 from base import Base
 from banned import *
+from cancellation import *
 from cloudStorage import *
 from config import *
 from credentials import *
@@ -0,0 +1,40 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+
+from base import Base
+
+
+JobCancellationActiveStates = ['PENDING', 'RUNNING']
+
+
+class JobCancellation(Base):
+    """
+    Cancellation of the files of a big job, done in the background by one of the servers.
+    The server working on it holds a lease, which is renewed as it progresses
+    """
+    __tablename__ = 't_job_cancellation'
+
+    job_id   = Column(String(36), ForeignKey('t_job.job_id'), primary_key=True)
+    reason   = Column(String(2048))
+    state    = Column(String(32))
+    total    = Column(Integer)
+    canceled = Column(Integer, default=0)
+    error    = Column(String(2048))
+    started  = Column(DateTime)
+    finished = Column(DateTime)
+    owner    = Column(String(255))
+    lease    = Column(DateTime)
@@ -31,6 +31,7 @@ import os
 import sys
 import urllib
 
+from decoders import OUTPUT_FORMATS, accept_header, decode
 from exceptions import *
 from request import RequestFactory
 
@@ -135,8 +136,12 @@ class Context(object):
             raise BadEndpoint("%s (%s)" % (self.endpoint, str(e))), None, sys.exc_info()[2]
         return endpoint_info
 
-    def __init__(self, endpoint, ucert=None, ukey=None, verify=True, access_token=None, no_creds=False):
+    def __init__(self, endpoint, ucert=None, ukey=None, verify=True, access_token=None, no_creds=False,
+                 output_format='json'):
         self.passwd = None
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError('The output format must be one of %s' % ', '.join(OUTPUT_FORMATS))
+        self.output_format = output_format
 
         self._set_endpoint(endpoint)
         if no_creds:
@@ -168,6 +173,19 @@ class Context(object):
         return self._requester.method('GET',
                                       "%s/%s" % (self.endpoint, path))
 
+    def get_decoded(self, path, listing=False):
+        """
+        Like get, but the answer is requested in the output format of the context, and decoded.
+        NDJSON is only asked for listings
+        """
+        output_format = self.output_format
+        if output_format == 'ndjson' and not listing:
+            output_format = 'json'
+        body = self._requester.method('GET',
+                                      "%s/%s" % (self.endpoint, path),
+                                      headers={'Accept': accept_header(output_format)})
+        return decode(body, self._requester.content_type)
+
     def put(self, path, body):
         return self._requester.method('PUT',
                                       "%s/%s" % (self.endpoint, path),
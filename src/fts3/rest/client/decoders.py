@@ -0,0 +1,74 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+try:
+    import json
+except:
+    import simplejson as json
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from exceptions import *
+
+# Output formats that can be asked to the server
+OUTPUT_FORMATS = ('json', 'ndjson', 'msgpack')
+
+
+def accept_header(output_format):
+    """
+    Accept header asking for output_format, with minified json as fallback.
+    msgpack is only asked for if it can be decoded
+    """
+    if output_format == 'msgpack' and msgpack is not None:
+        return 'application/msgpack, application/json;pretty=false;q=0.5'
+    elif output_format == 'ndjson':
+        return 'application/x-ndjson, application/json;pretty=false;q=0.5'
+    return 'application/json;pretty=false'
+
+
+def iter_ndjson(body):
+    """
+    Generator of the objects in a NDJSON body, one per line
+    """
+    for line in body.splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+
+def decode(body, content_type):
+    """
+    Decode the body of an answer, depending on its content type.
+    NDJSON is used for listings, so it is always decoded as a list
+    """
+    if content_type:
+        media_type = content_type.split(';')[0].strip().lower()
+    else:
+        media_type = 'application/json'
+    if media_type == 'application/x-ndjson':
+        return list(iter_ndjson(body))
+    elif media_type in ('application/msgpack', 'application/x-msgpack'):
+        if msgpack is None:
+            raise ClientError('The answer is encoded with msgpack, which is not installed')
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except TypeError:
+            # msgpack older than 0.5.2 does not know about raw
+            return msgpack.unpackb(body, encoding='utf-8')
+    return json.loads(body)
+
+
+__all__ = ['OUTPUT_FORMATS', 'accept_header', 'decode', 'iter_ndjson']
@@ -34,6 +34,22 @@ def list_jobs(context, user_dn=None, vo=None, source_se=None, dest_se=None, dele
     return inquirer.get_job_list(user_dn, vo, source_se, dest_se, delegation_id, state_in)
 
 
+def iter_jobs(context, user_dn=None, vo=None, source_se=None, dest_se=None, delegation_id=None, state_in=None,
+              page_size=100):
+    """
+    Iterate over the active jobs, requesting them by pages. Same filters as list_jobs
+
+    Args:
+        context:   fts3.rest.client.context.Context instance
+        page_size: How many jobs are requested each time
+
+    Returns:
+        A generator of the decoded jobs
+    """
+    inquirer = Inquirer(context)
+    return inquirer.iter_jobs(user_dn, vo, source_se, dest_se, delegation_id, state_in, page_size)
+
+
 def get_job_status(context, job_id, list_files=False):
     """
     Get a job status
@@ -34,6 +34,23 @@ def cancel(context, job_id):
     return submitter.cancel(job_id)
 
 
+def cancel_files(context, job_id, file_ids):
+    """
+    Cancels some files of a job. Their alternatives, if any, are enabled
+
+    Args:
+        context:  fts3.rest.client.context.Context instance
+        job_id:   The job the files belong to
+        file_ids: List of file ids to cancel
+
+    Returns:
+        The state in which each file has been left.
+        Note that it may not be CANCELED if the file finished already!
+    """
+    submitter = Submitter(context)
+    return submitter.cancel_files(job_id, file_ids)
+
+
 def new_transfer(source, destination, checksum=None, filesize=None, metadata=None):
     """
     Creates a new transfer pair
@@ -125,7 +142,8 @@ def new_delete_job(files, spacetoken=None, metadata=None):
     Creates a new dictionary representing a deletion job
 
     Args:
-        files:      Array of surls to delete. Each item can be either a string or a dictionary with keys surl and metadata
+        files:      Array of surls to delete. Each item can be either a string,
+                    or a dictionary with keys surl and metadata
         spacetoken: Deletion spacetoken
         metadata:   Metadata to bind to the job
 
@@ -31,16 +31,25 @@ class Inquirer(object):
 
     def get_job_status(self, job_id, list_files=False):
         try:
-            job_info = json.loads(self.context.get("/jobs/%s" % job_id))
+            job_info = self.context.get_decoded("/jobs/%s" % job_id)
             if list_files:
-                job_info['files'] = json.loads(self.context.get("/jobs/%s/files" % job_id))
-                job_info['dm'] = json.loads(self.context.get("/jobs/%s/dm" % job_id))
+                job_info['files'] = self.context.get_decoded("/jobs/%s/files" % job_id, listing=True)
+                job_info['dm'] = self.context.get_decoded("/jobs/%s/dm" % job_id, listing=True)
             return job_info
         except NotFound:
             raise NotFound(job_id)
 
-    def get_job_list(self, user_dn=None, vo_name=None, source_se=None, dest_se=None, delegation_id=None, state_in=None):
-        url = "/jobs?"
+    def wait_for_job(self, job_id, until='terminal', timeout=60):
+        """
+        Get the job status once it is terminal (or its state changes, if until is 'change'),
+        or after timeout seconds, whatever happens first. The server holds the request meanwhile
+        """
+        try:
+            return self.context.get_decoded("/jobs/%s?wait_until=%s&timeout=%d" % (job_id, until, timeout))
+        except NotFound:
+            raise NotFound(job_id)
+
+    def _job_list_args(self, user_dn, vo_name, source_se, dest_se, delegation_id, state_in):
         args = {}
         if user_dn:
             args['user_dn'] = user_dn
@@ -54,12 +63,32 @@ class Inquirer(object):
             args['dlg_id'] = delegation_id
         if state_in:
             args['state_in'] = ','.join(state_in)
+        return args
 
+    def _job_list_url(self, args):
         query = '&'.join(map(lambda (k, v): "%s=%s" % (k, urllib.quote(v, '')),
                              args.iteritems()))
-        url += query
+        return "/jobs?" + query
+
+    def get_job_list(self, user_dn=None, vo_name=None, source_se=None, dest_se=None, delegation_id=None, state_in=None):
+        args = self._job_list_args(user_dn, vo_name, source_se, dest_se, delegation_id, state_in)
+        return self.context.get_decoded(self._job_list_url(args), listing=True)
 
-        return json.loads(self.context.get(url))
+    def iter_jobs(self, user_dn=None, vo_name=None, source_se=None, dest_se=None, delegation_id=None, state_in=None,
+                  page_size=100):
+        """
+        Generator over the job list. The jobs are requested by pages of page_size,
+        so only one page is in memory at a time
+        """
+        args = self._job_list_args(user_dn, vo_name, source_se, dest_se, delegation_id, state_in)
+        args['page_size'] = str(page_size)
+        while True:
+            page = self.context.get_decoded(self._job_list_url(args))
+            for job in page['jobs']:
+                yield job
+            if not page.get('next', None):
+                break
+            args['cursor'] = page['next']
 
     def whoami(self):
         return json.loads(self.context.get("/whoami"))
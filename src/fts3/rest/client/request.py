@@ -24,6 +24,9 @@ from StringIO import StringIO
 
 _PYCURL_SSL = pycurl.version_info()[5].split('/')[0]
 
+# How many answers are kept to be revalidated with their ETag
+MAX_CACHED_ANSWERS = 100
+
 
 class RequestFactory(object):
 
@@ -62,8 +65,15 @@ class RequestFactory(object):
         else:
             self.capath = '/etc/grid-security/certificates'
 
+        # url => (etag, body, content type) of the last answers to GET
+        self._cached = dict()
+        # Content type of the last answer
+        self.content_type = None
+
         self.curl_handle = pycurl.Curl()
         self._set_ssl()
+        # Ask for compressed answers. libcurl decodes them
+        self.curl_handle.setopt(pycurl.ENCODING, 'gzip, deflate')
 
     def _handle_error(self, url, code, response_body=None):
         # Try parsing the response, maybe we can get the error message
@@ -98,6 +108,16 @@ class RequestFactory(object):
         self._response += data
         return len(data)
 
+    def _receive_header(self, line):
+        if ':' in line:
+            name, value = line.split(':', 1)
+            self._response_headers[name.strip().lower()] = value.strip()
+
+    def _remember(self, url, etag, body, content_type):
+        if len(self._cached) >= MAX_CACHED_ANSWERS:
+            self._cached.clear()
+        self._cached[url] = (etag, body, content_type)
+
     def _send(self, length):
         return self._input.read(length)
 
@@ -120,6 +140,12 @@ class RequestFactory(object):
         _headers = {'Accept': 'application/json'}
         if headers:
             _headers.update(headers)
+        # Revalidate the last answer, if the server gave a validator
+        cached = None
+        if method == 'GET':
+            cached = self._cached.get(url, None)
+            if cached:
+                _headers['If-None-Match'] = cached[0]
         if self.access_token:
             _headers['Authorization'] = 'Bearer ' + self.access_token
         if len(_headers) > 0:
@@ -129,7 +155,9 @@ class RequestFactory(object):
         #self.curl_handle.setopt(pycurl.VERBOSE, 1)
 
         self._response = ''
+        self._response_headers = dict()
         self.curl_handle.setopt(pycurl.WRITEFUNCTION, self._receive)
+        self.curl_handle.setopt(pycurl.HEADERFUNCTION, self._receive_header)
 
         if body is not None:
             self._input = StringIO(body)
@@ -140,7 +168,19 @@ class RequestFactory(object):
 
         self.curl_handle.perform()
 
-        self._handle_error(url, self.curl_handle.getinfo(pycurl.HTTP_CODE), self._response)
+        code = self.curl_handle.getinfo(pycurl.HTTP_CODE)
+        if code == 304 and cached:
+            self.content_type = cached[2]
+            return cached[1]
+        self._handle_error(url, code, self._response)
+
+        self.content_type = self._response_headers.get('content-type', None)
+        if method == 'GET':
+            etag = self._response_headers.get('etag', None)
+            if etag:
+                self._remember(url, etag, self._response, self.content_type)
+            else:
+                self._cached.pop(url, None)
 
         return self._response
 
@@ -19,6 +19,10 @@ try:
     import json
 except:
     import simplejson as json
+try:
+    from collections import OrderedDict
+except ImportError:
+    OrderedDict = dict
 
 
 class Submitter(object):
@@ -28,7 +32,8 @@ class Submitter(object):
 
     @staticmethod
     def build_submission(transfers=None, delete=None, **kwargs):
-        job = dict()
+        # params go first, so the server can insert the transfers while it receives them
+        job = OrderedDict()
 
         job['params'] = dict()
         job['params'].update(kwargs)
@@ -60,3 +65,6 @@ class Submitter(object):
 
     def cancel(self, job_id):
         return json.loads(self.context.delete('/jobs/%s' % job_id))
+
+    def cancel_files(self, job_id, file_ids):
+        return json.loads(self.context.delete('/jobs/%s/files/%s' % (job_id, ','.join(map(str, file_ids)))))
@@ -35,6 +35,8 @@ import fts3rest.lib.helpers
 from fts3rest.lib.helpers import fts3_config
 from fts3rest.lib.helpers.connection_validator import ConnectionValidator
 from fts3rest.config.routing import make_map
+from fts3rest.lib.cancellation import setup_canceller
+from fts3rest.lib.spool import setup_spool
 from fts3rest.model import init_model
 
 
@@ -80,6 +82,10 @@ def load_environment(global_conf, app_conf):
     # Catch dead connections
     engine.pool.add_listener(ConnectionValidator())
 
+    # Asynchronous submission, if enabled
+    setup_spool(config)
+    setup_canceller(config)
+
     # Mako templating
     config['pylons.app_globals'].mako_lookup = TemplateLookup(
         directories=paths['templates'],
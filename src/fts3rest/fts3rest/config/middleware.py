@@ -25,6 +25,7 @@ from pylons.middleware import ErrorHandler
 from pylons.wsgiapp import PylonsApp
 from routes.middleware import RoutesMiddleware
 
+from fts3rest.lib.middleware.compression import Compression
 from fts3rest.lib.middleware.fts3auth import FTS3AuthMiddleware
 from fts3rest.lib.middleware.error_as_json import ErrorAsJson
 from fts3rest.lib.middleware.request_logger import RequestLogger
@@ -73,6 +74,9 @@ def make_app(global_conf, full_stack=True, static_files=True, **app_conf):
     # Request logging
     app = RequestLogger(app, config)
 
+    # Response compression
+    app = Compression(app, config)
+
     # Error handling
     if asbool(full_stack):
         # Handle Python exceptions
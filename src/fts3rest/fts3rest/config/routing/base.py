@@ -48,16 +48,28 @@ def do_connect(config, map):
                 conditions=dict(method=['GET']))
     map.connect('/jobs/', controller='jobs', action='index',
                 conditions=dict(method=['GET']))
-    map.connect('/jobs/{job_list}', controller='jobs', action='get',
+    map.connect('/jobs/events', controller='jobs', action='events',
                 conditions=dict(method=['GET']))
+    map.connect('/jobs/{job_list}', controller='jobs', action='get',
+                conditions=dict(method=['GET', 'HEAD']))
     map.connect('/jobs/{job_id}/files', controller='jobs', action='get_files',
                 conditions=dict(method=['GET']))
     map.connect('/jobs/{job_id}/files/{file_id}/retries', controller='jobs', action='get_file_retries',
                 conditions=dict(method=['GET']))
+    map.connect('/jobs/{job_id}/retries', controller='jobs', action='get_job_retries',
+                conditions=dict(method=['GET']))
+    map.connect('/jobs/{job_list}/summary', controller='jobs', action='get_summary',
+                conditions=dict(method=['GET']))
+    map.connect('/jobs/{job_id}/cancellation', controller='jobs', action='get_cancellation',
+                conditions=dict(method=['GET']))
     map.connect('/jobs/{job_id}/{field}', controller='jobs', action='get_field',
                 conditions=dict(method=['GET']))
+    map.connect('/jobs/{job_id}/files/{file_ids}', controller='jobs', action='cancel_files',
+                conditions=dict(method=['DELETE']))
     map.connect('/jobs/{job_id_list}', controller='jobs', action='cancel',
                 conditions=dict(method=['DELETE']))
+    map.connect('/jobs', controller='jobs', action='cancel_matching',
+                conditions=dict(method=['DELETE']))
     map.connect('/jobs', controller='jobs', action='submit',
                 conditions=dict(method=['PUT', 'POST']))
 
@@ -82,8 +94,10 @@ def do_connect(config, map):
     map.connect('/api-docs', controller='api', action='api_docs')
     map.connect('/api-docs/{resource}', controller='api', action='resource_doc')
 
-    # Configuration audit
+    # Configuration audit and admission control
     map.connect('/config/audit', controller='config', action='audit')
+    map.connect('/config/throttling', controller='config', action='throttling',
+                conditions=dict(method=['GET']))
 
     # Optimizer
     map.connect('/optimizer', controller='optimizer', action='is_enabled')
@@ -21,6 +21,7 @@ from sqlalchemy import distinct, func
 
 from fts3.model import BannedDN, BannedSE, Job, File, JobActiveStates, FileActiveStates
 from fts3rest.lib.api import doc
+from fts3rest.lib.banned_ses import invalidate_bans
 from fts3rest.lib.base import BaseController, Session
 from fts3rest.lib.helpers import jsonify
 from fts3rest.lib.http_exceptions import *
@@ -51,6 +52,7 @@ def _ban_se(storage, vo_name, allow_submit, status, timeout):
     except Exception:
         Session.rollback()
         raise
+    invalidate_bans()
 
 
 def _ban_dn(dn):
@@ -311,6 +313,7 @@ class BanningController(BaseController):
                 Session.commit()
             except Exception:
                 Session.rollback()
+            invalidate_bans()
             log.warn("Storage %s unbanned" % storage)
         else:
             log.warn("Unban of storage %s without effect" % storage)
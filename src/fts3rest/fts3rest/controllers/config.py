@@ -21,11 +21,12 @@ from fts3rest.lib.base import BaseController, Session
 from fts3rest.lib.helpers import jsonify
 from fts3rest.lib.middleware.fts3auth import authorize
 from fts3rest.lib.middleware.fts3auth.constants import *
+from fts3rest.lib.throttling import get_throttle
 
 
 class ConfigController(BaseController):
     """
-    Operations on the config audit
+    Operations on the config audit, and the admission control
     """
 
     @doc.return_type(array_of=ConfigAudit)
@@ -36,3 +37,14 @@ class ConfigController(BaseController):
         Returns the last 100 entries of the config audit tables
         """
         return Session.query(ConfigAudit).limit(100).all()
+
+    @doc.response(403, 'The user is not allowed to query the configuration')
+    @doc.return_type('{"burst": <seconds>, "limits": [<limit>], "buckets": [<bucket state>]}')
+    @authorize(CONFIG)
+    @jsonify
+    def throttling(self):
+        """
+        Returns the submission limits, and the state of the token buckets of this server process.
+        The limits are applied per process, so they are not shared with other processes or servers
+        """
+        return get_throttle().state()
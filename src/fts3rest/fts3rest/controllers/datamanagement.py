@@ -28,9 +28,9 @@ import urllib
 import json
 import pylons
 
-from fts3.model import Credential
 from fts3rest.lib.api import doc
-from fts3rest.lib.base import BaseController, Session
+from fts3rest.lib.base import BaseController
+from fts3rest.lib.delegation_cache import get_credential
 from fts3rest.lib.helpers import jsonify
 from fts3rest.lib.http_exceptions import HTTPAuthenticationTimeout
 from fts3rest.lib.gfal2_wrapper import Gfal2Wrapper, Gfal2Error
@@ -48,7 +48,7 @@ def _get_valid_surl():
 
 def _get_proxy():
     user = request.environ['fts3.User.Credentials']
-    cred = Session.query(Credential).get((user.delegation_id, user.user_dn))
+    cred = get_credential(user.delegation_id, user.user_dn, with_proxy=True)
     if not cred:
         raise HTTPAuthenticationTimeout('No delegated proxy available')
 
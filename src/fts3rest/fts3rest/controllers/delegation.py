@@ -30,6 +30,7 @@ from pylons.templating import render_mako as render
 from fts3.model import CredentialCache, Credential
 from fts3rest.lib.api import doc
 from fts3rest.lib.base import BaseController, Session
+from fts3rest.lib.delegation_cache import invalidate_credential
 from fts3rest.lib.helpers import jsonify
 from fts3rest.lib.helpers import voms
 from fts3rest.lib.http_exceptions import HTTPMethodFailure
@@ -223,6 +224,7 @@ class DelegationController(BaseController):
             except Exception:
                 Session.rollback()
                 raise
+            invalidate_credential(user.delegation_id, user.user_dn)
             start_response('204 No Content', [])
             return ['']
 
@@ -311,6 +313,7 @@ class DelegationController(BaseController):
         except Exception:
             Session.rollback()
             raise
+        invalidate_credential(user.delegation_id, user.user_dn)
 
         start_response('201 Created', [])
         return ['']
@@ -364,6 +367,7 @@ class DelegationController(BaseController):
         except Exception:
             Session.rollback()
             raise
+        invalidate_credential(user.delegation_id, user.user_dn)
 
         start_response('203 Non-Authoritative Information', [('Content-Type', 'text/plain')])
         return [str(new_termination_time)]
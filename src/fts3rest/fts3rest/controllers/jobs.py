@@ -17,30 +17,60 @@
 
 from datetime import datetime, timedelta
 from pylons import request
+from sqlalchemy import func
 from sqlalchemy.orm import noload
+from StringIO import StringIO
+import base64
 import hashlib
+import itertools
 import json
 import logging
+import math
 import pylons
+import Queue
 import socket
+import time
 import types
 import urllib
-import urlparse
 import uuid
 
 from fts3.model import Job, File, JobActiveStates, FileActiveStates
 from fts3.model import DataManagement, DataManagementActiveStates
-from fts3.model import Credential, OptimizerActive, BannedSE, FileRetryLog
+from fts3.model import FileRetryLog, JobCancellation
 from fts3rest.lib.api import doc
+from fts3rest.lib.api.submit_validator import SubmissionErrors, validate_transfer, validate_deletion
+from fts3rest.lib.banned_ses import get_bans
 from fts3rest.lib.base import BaseController, Session
+from fts3rest.lib.bulk_insert import bulk_insert
+from fts3rest.lib.cancellation import CancellableFileStates, get_canceller, get_progress
+from fts3rest.lib.delegation_cache import get_credential
 from fts3rest.lib.helpers import jsonify
+from fts3rest.lib.helpers.misc import IN_CHUNK_SIZE, chunked
+from fts3rest.lib.helpers.json_stream import JsonObjectReader, MalformedJson
 from fts3rest.lib.http_exceptions import *
+from fts3rest.lib.job_events import Subscriber, get_watcher
+from fts3rest.lib.job_poller import WAIT_CONDITIONS, get_poller, is_condition_met
 from fts3rest.lib.middleware.fts3auth import authorize, authorized
 from fts3rest.lib.middleware.fts3auth.constants import *
+from fts3rest.lib.optimizer_active import ensure_pairs, remember_pairs
+from fts3rest.lib.projection import get_columns, parse_fields, project, to_dict, iter_projected
+from fts3rest.lib.spool import get_spool
+from fts3rest.lib.surl import parse_surl
+from fts3rest.lib.throttling import get_throttle
 
 
 log = logging.getLogger(__name__)
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# Rows fetched at a time when the answer is streamed
+STREAM_YIELD_PER = 1000
+# Long polling timeouts, in seconds
+DEFAULT_WAIT_TIMEOUT = 60
+MAX_WAIT_TIMEOUT = 300
+# Seconds between keepalives in the event streams
+EVENTS_KEEPALIVE = 15
+
 DEFAULT_PARAMS = {
     'bring_online': -1,
     'verify_checksum': False,
@@ -56,32 +86,21 @@ DEFAULT_PARAMS = {
 }
 
 
-def _set_job_source_and_destination(job, files):
+def _update_job_source_and_destination(job, f, first):
     """
-    Iterates through the files that belong to the job, and determines the
-    'overall' job source and destination Storage Elements
+    Updates the 'overall' job source and destination Storage Elements
+    with the transfer f. first must be True for the first transfer of the job
     """
-    if job['reuse_job'] == 'H':
-        job['source_se'] = files[0]['source_se']
-        job['dest_se'] = files[-1]['dest_se']
+    if first:
+        job['source_se'] = f['source_se']
+        job['dest_se'] = f['dest_se']
+    elif job['reuse_job'] == 'H':
+        job['dest_se'] = f['dest_se']
     else:
-        job['source_se'] = files[0]['source_se']
-        job['dest_se'] = files[0]['dest_se']
-        for f in files:
-            if f['source_se'] != job['source_se']:
-                job['source_se'] = None
-            if f['dest_se'] != job['dest_se']:
-                job['dest_se'] = None
-
-
-def _get_storage_element(uri):
-    """
-    Returns the storage element of the given uri, which is the scheme + hostname without the port
-
-    Args:
-        uri: An urlparse instance
-    """
-    return "%s://%s" % (uri.scheme, uri.hostname)
+        if f['source_se'] != job['source_se']:
+            job['source_se'] = None
+        if f['dest_se'] != job['dest_se']:
+            job['dest_se'] = None
 
 
 def _yes_or_no(value):
@@ -93,18 +112,6 @@ def _yes_or_no(value):
         return False
 
 
-def _has_multiple_options(files):
-    """
-    Returns True if the set of transfers defines different options
-    for the same destination.
-    This sort of transfers can not be accepted when reuse is enabled
-    """
-    ids = map(lambda f: f['file_index'], files)
-    id_count = len(ids)
-    unique_id_count = len(set(ids))
-    return unique_id_count != id_count
-
-
 def _valid_third_party_transfer(src_scheme, dst_scheme):
     """
     Return True if the source scheme and the destination scheme define a
@@ -118,18 +125,13 @@ def _valid_third_party_transfer(src_scheme, dst_scheme):
          dst_scheme in ['srm', 'lfc'])
 
 
-def _validate_url(url):
+def _surl_digest(url):
     """
-    Validates the format and content of the url
+    Returns a digest of the normalized url, so duplicates can be found keeping in memory
+    only a few bytes per url. The host name is case insensitive
     """
-    if not url.scheme:
-        raise ValueError('Missing scheme (%s)' % url.geturl())
-    if url.scheme == 'file':
-        raise ValueError('Can not transfer local files (%s)' % url.geturl())
-    if not url.path or (url.path == '/' and not url.query):
-        raise ValueError('Missing path (%s)' % url.geturl())
-    if not url.hostname or url.hostname == '':
-        raise ValueError('Missing host (%s)' % url.geturl())
+    normalized = u'\0'.join((url.scheme, url.netloc.lower(), url.path, url.params, url.query, url.fragment))
+    return hashlib.md5(normalized.encode('utf-8')).digest()
 
 
 def _valid_filesize(value):
@@ -149,20 +151,36 @@ def _generate_hashed_id(job_id, f_index):
     return int(hashlib.md5(concat).hexdigest()[-4:], 16)
 
 
-def _populate_files(files_dict, job_id, f_index, vo_name, shared_hashed_id=None):
+def _parse_urls(urls, position, errors):
+    """
+    Parses and validates the urls, adding to errors those that are not valid
+    """
+    parsed = []
+    for (index, url) in enumerate(urls):
+        try:
+            parsed.append(parse_surl(url.strip()))
+        except ValueError, e:
+            errors.add('%s[%d]' % (position, index), 'Invalid value within the request: %s' % str(e))
+    return parsed
+
+
+def _populate_files(files_dict, job_id, f_index, vo_name, shared_hashed_id, errors):
     """
     From the dictionary files_dict, generate a list of transfers for a job
+    If any url is not valid, the errors are added to errors, and nothing is returned
     """
     files = []
 
     # Extract matching pairs
+    position = 'files[%d]' % f_index
+    sources = _parse_urls(files_dict['sources'], position + '.sources', errors)
+    destinations = _parse_urls(files_dict['destinations'], position + '.destinations', errors)
+    if len(sources) != len(files_dict['sources']) or len(destinations) != len(files_dict['destinations']):
+        return files
+
     pairs = []
-    for s in files_dict['sources']:
-        source_url = urlparse.urlparse(s.strip())
-        _validate_url(source_url)
-        for d in files_dict['destinations']:
-            dest_url = urlparse.urlparse(d.strip())
-            _validate_url(dest_url)
+    for source_url in sources:
+        for dest_url in destinations:
             pairs.append((source_url, dest_url))
 
     # Create one File entry per matching pair
@@ -177,10 +195,10 @@ def _populate_files(files_dict, job_id, f_index, vo_name, shared_hashed_id=None)
             job_id=job_id,
             file_index=f_index,
             file_state=initial_state,
-            source_surl=s.geturl(),
-            dest_surl=d.geturl(),
-            source_se=_get_storage_element(s),
-            dest_se=_get_storage_element(d),
+            source_surl=s.url,
+            dest_surl=d.url,
+            source_se=s.storage,
+            dest_se=d.storage,
             vo_name=vo_name,
             user_filesize=_valid_filesize(files_dict.get('filesize', 0)),
             selection_strategy=files_dict.get('selection_strategy', None),
@@ -219,7 +237,11 @@ def _build_internal_job_params(params):
 def _submit_transfer(user, job_dict, params):
     """
     Submit a transfer job
-    Returns a pair job, array of File
+    Returns a pair job, generator of File
+
+    The transfers are expanded while the generator is consumed. Once it is exhausted,
+    the job fields that depend on all the transfers (source_se, dest_se, reuse_job and
+    checksum_method) are up to date
     """
     reuse_flag = 'N'
     if params['multihop']:
@@ -257,51 +279,75 @@ def _submit_transfer(user, job_dict, params):
         job['user_cred'] = params['credentials']
     job['cred_id'] = user.delegation_id
 
+    # If copy_pin_lifetime OR bring_online are specified, go to staging directly
+    staging = job['copy_pin_lifetime'] > 0 or job['bring_online'] > 0
+    if staging:
+        job['job_state'] = 'STAGING'
+
     # If reuse is enabled, or it is a bring online job, generate one single "hash" for all files
-    if reuse_flag in ('H', 'Y') or job['copy_pin_lifetime'] > 0 or job['bring_online'] > 0:
+    if reuse_flag in ('H', 'Y') or staging:
         shared_hashed_id = _generate_hashed_id(job_id, 0)
     else:
         shared_hashed_id = None
 
-    # Files
-    files = []
-    f_index = 0
-    for t in job_dict['files']:
-        files.extend(_populate_files(t, job_id, f_index, job['vo_name'], shared_hashed_id))
-        f_index += 1
-
-    if len(files) == 0:
-        raise HTTPBadRequest('No valid pairs available')
-
-    # If copy_pin_lifetime OR bring_online are specified, go to staging directly
-    if job['copy_pin_lifetime'] > 0 or job['bring_online'] > 0:
-        n_not_srm = len(filter(lambda f: not f['source_surl'].startswith('srm://'), files))
-        if n_not_srm > 0:
-            raise HTTPBadRequest('Staging operations can only be used with the SRM protocol')
-
-        job['job_state'] = 'STAGING'
-        for t in files:
-            t['file_state'] = 'STAGING'
-
-    # If a checksum is provided, but no checksum is available, 'relaxed' comparison
-    # (Not nice, but need to keep functionality!)
-    has_checksum = False
-    for f in files:
-        if f['checksum'] is not None:
-            has_checksum = len(f['checksum']) > 0
-            break
-    if not job['checksum_method'] and has_checksum:
-        job['checksum_method'] = 'r'
+    def _expand_files():
+        n_files = 0
+        has_checksum = None
+        multiple_options = False
+        errors = SubmissionErrors()
+
+        # All the transfers are validated, even after an error, so all of them can be reported
+        # Once there is an error, though, nothing else is yielded
+        for f_index, t in enumerate(job_dict['files']):
+            position = 'files[%d]' % f_index
+            if not validate_transfer(t, position, errors):
+                continue
+            files = _populate_files(t, job_id, f_index, job['vo_name'], shared_hashed_id, errors)
+
+            # Different options for the same destination can not be accepted when reuse is enabled
+            if len(files) > 1:
+                if reuse_flag == 'Y':
+                    errors.add(position, 'Can not specify reuse and multiple replicas at the same time')
+                    continue
+                multiple_options = True
+
+            if staging:
+                for f in files:
+                    if not f['source_surl'].startswith('srm://'):
+                        errors.add(
+                            position + '.sources', 'Staging operations can only be used with the SRM protocol'
+                        )
+                        break
+                    f['file_state'] = 'STAGING'
+
+            if len(errors):
+                continue
 
-    _set_job_source_and_destination(job, files)
+            for f in files:
+                if has_checksum is None and f['checksum'] is not None:
+                    has_checksum = len(f['checksum']) > 0
+                _update_job_source_and_destination(job, f, n_files == 0)
+                n_files += 1
+                yield f
+
+        errors.check()
+        if n_files == 0:
+            raise HTTPBadRequest('No valid pairs available')
+
+        # If a checksum is provided, but no checksum is available, 'relaxed' comparison
+        # (Not nice, but need to keep functionality!)
+        if not job['checksum_method'] and has_checksum:
+            job['checksum_method'] = 'r'
+        if multiple_options:
+            job['reuse_job'] = 'R'
 
-    return job, files
+    return job, _expand_files()
 
 
 def _submit_deletion(user, job_dict, params):
     """
     Submit a deletion job.
-    Returns a pair job, array of DataManagement
+    Returns a pair job, generator of DataManagement
     """
     job_id = str(uuid.uuid1())
     job = dict(
@@ -335,41 +381,186 @@ def _submit_deletion(user, job_dict, params):
 
     shared_hashed_id = _generate_hashed_id(job_id, 0)
 
-    datamanagement = []
-    unique_surls = []  # Avoid surl duplication
-    for dm in job_dict['delete']:
-        if isinstance(dm, dict):
-            entry = dm
-        elif isinstance(dm, str) or isinstance(dm, unicode):
-            entry = dict(surl=dm)
+    def _expand_deletion():
+        n_entries = 0
+        unique_surls = set()  # Avoid surl duplication
+        errors = SubmissionErrors()
+        for (index, dm) in enumerate(job_dict['delete']):
+            position = 'delete[%d]' % index
+            if not validate_deletion(dm, position, errors):
+                continue
+            if isinstance(dm, dict):
+                entry = dm
+            else:
+                entry = dict(surl=dm)
+            try:
+                surl = parse_surl(entry['surl'])
+            except ValueError, e:
+                errors.add(position, 'Invalid value within the request: %s' % str(e))
+                continue
+
+            digest = _surl_digest(surl.parsed)
+            if not len(errors) and digest not in unique_surls:
+                unique_surls.add(digest)
+                row = dict(
+                    job_id=job_id,
+                    vo_name=user.vos[0],
+                    file_state='DELETE',
+                    source_surl=entry['surl'],
+                    source_se=surl.storage,
+                    dest_surl=None,
+                    dest_se=None,
+                    hashed_id=shared_hashed_id,
+                    file_metadata=entry.get('metadata', None)
+                )
+                _update_job_source_and_destination(job, row, n_entries == 0)
+                n_entries += 1
+                yield row
+
+        errors.check()
+
+    return job, _expand_deletion()
+
+
+def _bad_request_from(e):
+    """
+    Translates an error raised while processing the submission into a HTTPBadRequest
+    """
+    if isinstance(e, MalformedJson):
+        return HTTPBadRequest('Badly formatted JSON request (%s)' % str(e))
+    elif isinstance(e, ValueError):
+        return HTTPBadRequest('Invalid value within the request: %s' % str(e))
+    elif isinstance(e, TypeError):
+        return HTTPBadRequest('Malformed request: %s' % str(e))
+    else:
+        return HTTPBadRequest('Missing parameter: %s' % str(e))
+
+
+def _translate_errors(iterable):
+    """
+    Wraps the generators that expand the submission, so the errors they raise
+    while being consumed are translated too
+    """
+    try:
+        for item in iterable:
+            yield item
+    except (ValueError, TypeError, KeyError), e:
+        raise _bad_request_from(e)
+
+
+def _not_empty(value):
+    """
+    Returns None if value is empty. Otherwise, returns something equivalent to value.
+    Generators are accepted, so streamed members can be checked without consuming them
+    """
+    if isinstance(value, types.GeneratorType):
+        try:
+            first = value.next()
+        except StopIteration:
+            return None
+        return itertools.chain([first], value)
+    elif value:
+        return value
+    return None
+
+
+def _read_submission(body):
+    """
+    Reads the members of the submission from body until 'files' or 'delete' are found.
+    If 'params' came before, they are left as generators, so the transfers can be expanded
+    and inserted while they are being read. Otherwise, they need to be loaded in memory.
+    Returns a pair submitted dictionary, iterator over the members that remain to be read
+    """
+    members = iter(JsonObjectReader(body, streamed=('files', 'delete')))
+    submitted = dict()
+    for (key, value) in members:
+        if isinstance(value, types.GeneratorType):
+            if 'params' in submitted:
+                submitted[key] = value
+                break
+            value = list(value)
+        submitted[key] = value
+    return submitted, members
+
+
+def _check_remaining_members(members):
+    """
+    Reads whatever remains of the submission after the streamed member
+    """
+    try:
+        for (key, value) in members:
+            if key in ('files', 'delete') and _not_empty(value):
+                raise HTTPBadRequest('Transfer and metadata simultaneous operations not supported')
+    except MalformedJson, e:
+        raise _bad_request_from(e)
+
+
+def _throttle_submission(throttle, user):
+    """
+    Raise 429 if the user, or its VO, is over the configured submission rate
+    """
+    rejected = throttle.admit(user.vos[0], user.user_dn)
+    if rejected is not None:
+        scope, unit, wait = rejected
+        if scope == 'vo':
+            who = user.vos[0]
         else:
-            raise ValueError("Invalid type for the deletion item (%s)" % type(dm))
-        surl = urlparse.urlparse(entry['surl'])
-        _validate_url(surl)
+            who = user.user_dn
+        retry_after = int(math.ceil(wait))
+        raise HTTPTooManyRequests(
+            'Too many %s submitted by %s, retry in %d seconds' % (unit, who, retry_after),
+            headers=[('Retry-After', str(retry_after))]
+        )
 
-        if surl not in unique_surls:
-            datamanagement.append(dict(
-                job_id=job_id,
-                vo_name=user.vos[0],
-                file_state='DELETE',
-                source_surl=entry['surl'],
-                source_se=_get_storage_element(surl),
-                dest_surl=None,
-                dest_se=None,
-                hashed_id=shared_hashed_id,
-                file_metadata=entry.get('metadata', None)
-            ))
-            unique_surls.append(surl)
 
-    _set_job_source_and_destination(job, datamanagement)
+def _encode_cursor(job):
+    """
+    Opaque token with the position of job within the ordering (submit_time, job_id)
+    """
+    position = [job.submit_time.strftime('%Y-%m-%dT%H:%M:%S.%f'), job.job_id]
+    return base64.urlsafe_b64encode(json.dumps(position))
 
-    return job, datamanagement
+
+def _decode_cursor(cursor):
+    """
+    Returns the tuple (submit_time, job_id) encoded in the cursor
+    """
+    try:
+        submit_time, job_id = json.loads(base64.urlsafe_b64decode(str(cursor)))
+        return datetime.strptime(submit_time, '%Y-%m-%dT%H:%M:%S.%f'), str(job_id)
+    except Exception:
+        raise HTTPBadRequest('Invalid cursor')
+
+
+def _get_page(jobs, page_size, cursor, fields=None):
+    """
+    Keyset pagination of the jobs query over (submit_time, job_id), so each page
+    costs the same no matter how deep it is.
+    If fields is given, only those are retrieved, and the jobs are returned as dictionaries
+    """
+    if cursor:
+        submit_time, job_id = _decode_cursor(cursor)
+        jobs = jobs.filter(
+            (Job.submit_time > submit_time) | ((Job.submit_time == submit_time) & (Job.job_id > job_id))
+        )
+    if fields:
+        jobs = project(jobs, Job, fields, extra=['submit_time', 'job_id'])
+    page = jobs.order_by(Job.submit_time, Job.job_id)[:page_size + 1]
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = _encode_cursor(page[-1])
+    else:
+        next_cursor = None
+    if fields:
+        page = map(lambda row: to_dict(row, fields), page)
+    return {'jobs': page, 'next': next_cursor}
 
 
 def _setup_job_from_dict(job_dict, user):
     """
     From the submitted dictionary, create and populate dictionaries
     suitable for insertion
+    Returns a tuple job, generator of File, generator of DataManagement
     """
     try:
         # Initialize defaults
@@ -383,64 +574,427 @@ def _setup_job_from_dict(job_dict, user):
                 if v is None and k in DEFAULT_PARAMS:
                     params[k] = DEFAULT_PARAMS[k]
 
-        if job_dict.get('files', None) and job_dict.get('delete', None):
+        job_dict['files'] = _not_empty(job_dict.get('files', None))
+        job_dict['delete'] = _not_empty(job_dict.get('delete', None))
+
+        if job_dict['files'] and job_dict['delete']:
             raise HTTPBadRequest('Transfer and metadata simultaneous operations not supported')
-        elif job_dict.get('files', None):
+        elif job_dict['files']:
             job, files = _submit_transfer(user, job_dict, params)
             datamanagement = list()
-        elif job_dict.get('delete', None):
+        elif job_dict['delete']:
             job, datamanagement = _submit_deletion(user, job_dict, params)
             files = list()
         else:
             raise HTTPBadRequest('No transfers specified')
 
-        return job, files, datamanagement
+        return job, _translate_errors(files), _translate_errors(datamanagement)
+
+    except (ValueError, TypeError, KeyError), e:
+        raise _bad_request_from(e)
 
-    except ValueError, e:
-        raise HTTPBadRequest('Invalid value within the request: %s' % str(e))
-    except TypeError, e:
-        raise HTTPBadRequest('Malformed request: %s' % str(e))
-    except KeyError, e:
-        raise HTTPBadRequest('Missing parameter: %s' % str(e))
+
+def _collect_pairs(files, pairs):
+    """
+    Adds the pair (source_se, dest_se) of each transfer to pairs as they go through
+    """
+    for f in files:
+        pairs.add((f['source_se'], f['dest_se']))
+        yield f
 
 
-def _apply_banning(files):
+def _apply_banning(files, bans):
     """
-    Query the banning information for all pairs, reject the job
+    Check the banning information for all pairs, reject the job
     as soon as one SE can not submit.
     Update wait_timeout and wait_timestamp is there is a hit
+    This is a generator, so it can be chained with the expansion of the transfers
     """
-    # Usually, banned SES will be in the order of ~100 max
-    # Files may be several thousands
-    # We get all banned in memory so we avoid querying too many times the DB
-    # We then build a dictionary to make look up easy
-    banned_ses = dict()
-    for b in Session.query(BannedSE):
-        banned_ses[str(b.se)] = (b.vo, b.status, b.wait_timeout)
-
     now = datetime.utcnow()
     for f in files:
-        source_banned = banned_ses.get(str(f['source_se']), None)
-        dest_banned = banned_ses.get(str(f['dest_se']), None)
+        source_banned = bans.get(f['source_se'], f['vo_name'])
+        dest_banned = bans.get(f['dest_se'], f['vo_name'])
         timeout = None
 
-        if source_banned and (source_banned[0] == f['vo_name'] or source_banned[0] is None):
-            if source_banned[1] != 'WAIT_AS':
+        if source_banned:
+            if source_banned[0] != 'WAIT_AS':
                 raise HTTPForbidden("%s is banned" % f['source_se'])
-            timeout = source_banned[2]
+            timeout = source_banned[1]
 
-        if dest_banned and (dest_banned[0] == f['vo_name'] or dest_banned[0] is None):
-            if dest_banned[1] != 'WAIT_AS':
+        if dest_banned:
+            if dest_banned[0] != 'WAIT_AS':
                 raise HTTPForbidden("%s is banned" % f['dest_se'])
             if not timeout:
-                timeout = dest_banned[2]
+                timeout = dest_banned[1]
             else:
-                timeout = max(timeout, dest_banned[2])
+                timeout = max(timeout, dest_banned[1])
 
         if timeout is not None:
             f['wait_timestamp'] = now
             f['wait_timeout'] = timeout
 
+        yield f
+
+
+def _get_jobs(job_ids, fields=None):
+    """
+    Get the jobs with the given ids, with a query per IN_CHUNK_SIZE ids.
+    If fields is given, only those (plus what is needed for the authorization) are retrieved
+    Returns a dictionary job_id => job
+    """
+    query = Session.query(Job)
+    if fields:
+        query = project(query, Job, fields, extra=['job_id', 'user_dn', 'vo_name'])
+    jobs = dict()
+    for chunk in chunked(set(job_ids), IN_CHUNK_SIZE):
+        for job in query.filter(Job.job_id.in_(chunk)):
+            jobs[job.job_id] = job
+    return jobs
+
+
+def _get_files_fields(job_ids, fields):
+    """
+    Get only the given fields (comma separated) of the files belonging to the jobs.
+    Besides the columns of File, retries can be asked for, and they are read with one query per
+    IN_CHUNK_SIZE files. Other attributes of File raise HTTPBadRequest, and unknown names are ignored
+    Returns a dictionary job_id => list of dictionaries with the fields
+    """
+    requested = map(lambda f: f.strip(), fields.split(','))
+    columns = get_columns(File)
+    for field in requested:
+        if field != 'retries' and field not in columns and hasattr(File, field):
+            raise HTTPBadRequest('The field %s can not be requested for the files' % field)
+    with_retries = 'retries' in requested
+    fields = parse_fields(File, fields, strict=False)
+
+    files = dict((job_id, list()) for job_id in job_ids)
+    by_file_id = dict()
+    for chunk in chunked(job_ids, IN_CHUNK_SIZE):
+        query = project(Session.query(File), File, fields, extra=['job_id', 'file_id'])\
+            .filter(File.job_id.in_(chunk)).order_by(File.file_id)
+        for row in query:
+            f = to_dict(row, fields)
+            files[row.job_id].append(f)
+            if with_retries:
+                f['retries'] = list()
+                by_file_id[row.file_id] = f
+
+    for chunk in chunked(by_file_id.keys(), IN_CHUNK_SIZE):
+        retries = Session.query(FileRetryLog.file_id, FileRetryLog.attempt, FileRetryLog.datetime, FileRetryLog.reason)\
+            .filter(FileRetryLog.file_id.in_(chunk)).order_by(FileRetryLog.file_id, FileRetryLog.attempt)
+        for r in retries:
+            by_file_id[r.file_id]['retries'].append(
+                dict(file_id=r.file_id, attempt=r.attempt, datetime=r.datetime, reason=r.reason)
+            )
+    return files
+
+
+def _get_job_etag(job_id):
+    """
+    Fingerprint of the state of the job: the job state, how many files (or data management
+    operations) are in each state, and when the last one finished.
+    The request query, and the accepted types and encodings are part of it too, since they change the answer.
+    Raises 404 or 403 if the job does not exist, or can not be accessed
+    """
+    job = Session.query(Job.job_state, Job.user_dn, Job.vo_name).filter(Job.job_id == job_id).first()
+    if job is None:
+        raise HTTPNotFound('No job with the id "%s" has been found' % job_id)
+    if not authorized(TRANSFER, resource_owner=job.user_dn, resource_vo=job.vo_name):
+        raise HTTPForbidden('Not enough permissions to check the job "%s"' % job_id)
+
+    fingerprint = [job.job_state]
+    for model in (File, DataManagement):
+        counts = Session.query(model.file_state, func.count(model.file_id), func.max(model.finish_time))\
+            .filter(model.job_id == job_id).group_by(model.file_state).order_by(model.file_state)
+        for (state, count, last_finish) in counts:
+            fingerprint.append('%s:%d:%s' % (state, count, last_finish))
+    fingerprint.append(request.query_string)
+    fingerprint.append(request.headers.get('Accept', ''))
+    fingerprint.append(request.headers.get('Accept-Encoding', ''))
+    return hashlib.md5('|'.join(map(str, fingerprint))).hexdigest()
+
+
+def _wait_for_job(job_id, until, timeout):
+    """
+    Block until the job satisfies the condition 'until', or timeout expires
+    """
+    if until not in WAIT_CONDITIONS:
+        raise HTTPBadRequest('wait_until must be one of %s' % ', '.join(WAIT_CONDITIONS))
+    try:
+        timeout = int(timeout)
+    except (TypeError, ValueError):
+        raise HTTPBadRequest('Invalid timeout')
+    if timeout <= 0 or timeout > MAX_WAIT_TIMEOUT:
+        raise HTTPBadRequest('The timeout must be positive and less or equal than %d' % MAX_WAIT_TIMEOUT)
+
+    job = Session.query(Job.job_state, Job.user_dn, Job.vo_name).filter(Job.job_id == job_id).first()
+    if job is None:
+        raise HTTPNotFound('No job with the id "%s" has been found' % job_id)
+    if not authorized(TRANSFER, resource_owner=job.user_dn, resource_vo=job.vo_name):
+        raise HTTPForbidden('Not enough permissions to check the job "%s"' % job_id)
+    if until == 'terminal' and is_condition_met(until, job.job_state, job.job_state):
+        return
+
+    # Do not keep the connection while waiting
+    Session.remove()
+    get_poller().wait(job_id, until, job.job_state, timeout)
+
+
+def _event_stream(watcher, subscriber, timeout):
+    """
+    Generator of the events sent to subscriber, formatted as server-sent events.
+    The subscription starts with the first read, and ends after timeout seconds, if given,
+    or when the client goes away
+    """
+    if timeout:
+        deadline = time.time() + timeout
+    else:
+        deadline = None
+    watcher.subscribe(subscriber)
+    try:
+        while True:
+            wait = EVENTS_KEEPALIVE
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                wait = min(wait, remaining)
+            try:
+                event, data = subscriber.queue.get(timeout=wait)
+                yield 'event: %s\ndata: %s\n\n' % (event, json.dumps(data))
+            except Queue.Empty:
+                yield ': keepalive\n\n'
+    finally:
+        watcher.unsubscribe(subscriber)
+
+
+def _iter_retries(retries):
+    """
+    Groups the retries, ordered by file_id, into one entry per file.
+    The session is closed once done, since the answer is streamed
+    """
+    try:
+        for (file_id, rows) in itertools.groupby(retries, lambda r: r.file_id):
+            yield dict(
+                file_id=file_id,
+                retries=map(lambda r: dict(attempt=r.attempt, datetime=r.datetime, reason=r.reason), rows)
+            )
+    finally:
+        retries.session.close()
+
+
+def _get_summaries(job_ids):
+    """
+    Aggregate the files of the jobs by state: how many, total bytes, and average
+    throughput and duration. Done by the database, with one GROUP BY per IN_CHUNK_SIZE jobs
+    Returns a dictionary job_id => summary
+    """
+    summaries = dict()
+    sums = dict()
+    for job_id in job_ids:
+        summaries[job_id] = dict(job_id=job_id, states=dict(), total=0, bytes=0, throughput=None, duration=None)
+        sums[job_id] = [0.0, 0, 0.0, 0]
+    for chunk in chunked(job_ids, IN_CHUNK_SIZE):
+        query = Session.query(
+            File.job_id, File.file_state, func.count(File.file_id), func.sum(File.filesize),
+            func.sum(File.throughput), func.count(File.throughput),
+            func.sum(File.tx_duration), func.count(File.tx_duration)
+        ).filter(File.job_id.in_(chunk)).group_by(File.job_id, File.file_state)
+        for (job_id, state, count, size, throughput, n_throughput, duration, n_duration) in query:
+            summary = summaries[job_id]
+            summary['states'][state] = count
+            summary['total'] += count
+            summary['bytes'] += size or 0
+            job_sums = sums[job_id]
+            job_sums[0] += throughput or 0
+            job_sums[1] += n_throughput
+            job_sums[2] += duration or 0
+            job_sums[3] += n_duration
+        # Deletion jobs
+        query = Session.query(DataManagement.job_id, DataManagement.file_state, func.count(DataManagement.file_id))\
+            .filter(DataManagement.job_id.in_(chunk)).group_by(DataManagement.job_id, DataManagement.file_state)
+        for (job_id, state, count) in query:
+            summary = summaries[job_id]
+            summary['states'][state] = summary['states'].get(state, 0) + count
+            summary['total'] += count
+    for (job_id, (throughput, n_throughput, duration, n_duration)) in sums.iteritems():
+        if n_throughput:
+            summaries[job_id]['throughput'] = throughput / n_throughput
+        if n_duration:
+            summaries[job_id]['duration'] = duration / n_duration
+    return summaries
+
+
+def _cancel_jobs(job_ids, reason):
+    """
+    Cancel the jobs, their active transfers (and unused alternatives) and data management operations, with
+    three set-based UPDATEs per IN_CHUNK_SIZE jobs. Each chunk is committed on its own,
+    so the locks are held only briefly. Only jobs still active are modified
+    """
+    now = datetime.utcnow()
+    values = {'reason': reason, 'job_finished': now, 'finish_time': now}
+    for chunk in chunked(job_ids, IN_CHUNK_SIZE):
+        try:
+            Session.query(Job).filter(Job.job_id.in_(chunk)).filter(Job.job_state.in_(JobActiveStates))\
+                .update(dict(values, job_state='CANCELED'), synchronize_session=False)
+            Session.query(File).filter(File.job_id.in_(chunk)).filter(File.file_state.in_(CancellableFileStates))\
+                .update(dict(values, file_state='CANCELED'), synchronize_session=False)
+            Session.query(DataManagement).filter(DataManagement.job_id.in_(chunk))\
+                .filter(DataManagement.file_state.in_(DataManagementActiveStates))\
+                .update(dict(values, file_state='CANCELED'), synchronize_session=False)
+            Session.commit()
+        except:
+            Session.rollback()
+            raise
+    Session.expire_all()
+
+
+def _count_files(job_ids, states=None):
+    """
+    Count the files (or data management operations) of the jobs, optionally only those in the given states
+    Returns a dictionary job_id => count
+    """
+    counts = dict()
+    for chunk in chunked(job_ids, IN_CHUNK_SIZE):
+        for model in (File, DataManagement):
+            query = Session.query(model.job_id, func.count(model.file_id)).filter(model.job_id.in_(chunk))
+            if states:
+                query = query.filter(model.file_state.in_(states))
+            for (job_id, count) in query.group_by(model.job_id):
+                counts[job_id] = counts.get(job_id, 0) + count
+    return counts
+
+
+def _mark_canceled(job_ids, reason, sizes):
+    """
+    Mark the jobs as canceled, without touching their files, which are canceled in the background.
+    Their cancellation is recorded in the same transaction, so it is resumed if this process dies.
+    The job finish time is set once they are all done
+    """
+    try:
+        for chunk in chunked(job_ids, IN_CHUNK_SIZE):
+            Session.query(Job).filter(Job.job_id.in_(chunk)).filter(Job.job_state.in_(JobActiveStates))\
+                .update({'job_state': 'CANCELED', 'cancel_job': True, 'reason': reason}, synchronize_session=False)
+            for job_id in chunk:
+                Session.merge(JobCancellation(
+                    job_id=job_id, reason=reason, state='PENDING', total=sizes.get(job_id, 0), canceled=0
+                ))
+        Session.commit()
+    except:
+        Session.rollback()
+        raise
+    Session.expire_all()
+
+
+def _cancel_or_defer(job_ids, reason):
+    """
+    Cancel the jobs. Those with more files than the canceller threshold are only marked as canceled,
+    and their files are canceled in the background, so the request is not blocked by them.
+    Returns the set of ids of the jobs canceled in the background
+    """
+    canceller = get_canceller()
+    sizes = _count_files(job_ids)
+    background_ids = set(filter(lambda job_id: sizes.get(job_id, 0) > canceller.threshold, job_ids))
+    _cancel_jobs(filter(lambda job_id: job_id not in background_ids, job_ids), reason)
+    _mark_canceled(list(background_ids), reason, sizes)
+    for job_id in background_ids:
+        canceller.submit(job_id)
+    return background_ids
+
+
+def _cancel_files(job_id, file_ids, reason):
+    """
+    Cancel the given files of the job with one UPDATE per IN_CHUNK_SIZE files, and enable
+    the alternatives (NOT_USED) of the canceled transfers.
+    If no transfer of the job is left active, it is moved to CANCELED, and the alternatives
+    that were never used (i.e. another replica of the same file finished) are canceled too.
+    Returns the ids of the canceled files
+    """
+    cancellable_states = CancellableFileStates
+    now = datetime.utcnow()
+    canceled = list()
+    try:
+        for chunk in chunked(file_ids, IN_CHUNK_SIZE):
+            affected = Session.query(File.file_id, File.file_index, File.file_state)\
+                .filter(File.job_id == job_id).filter(File.file_id.in_(chunk))\
+                .filter(File.file_state.in_(cancellable_states)).all()
+            if not affected:
+                continue
+            affected_ids = map(lambda f: f.file_id, affected)
+            Session.query(File).filter(File.file_id.in_(affected_ids))\
+                .filter(File.file_state.in_(cancellable_states))\
+                .update({'file_state': 'CANCELED', 'reason': reason, 'finish_time': now}, synchronize_session=False)
+            # If there are alternatives to the transfers that were going on, enable them
+            indexes = set(map(lambda f: f.file_index, filter(lambda f: f.file_state != 'NOT_USED', affected)))
+            if indexes:
+                Session.query(File).filter(File.job_id == job_id)\
+                    .filter(File.file_index.in_(indexes)).filter(File.file_state == 'NOT_USED')\
+                    .update({'file_state': 'SUBMITTED'}, synchronize_session=False)
+            canceled.extend(affected_ids)
+
+        # Set the job terminal state if nothing is left. NOT_USED entries are not counted,
+        # since they stay so forever once another replica of the same file has finished
+        n_left = Session.query(func.count(File.file_id))\
+            .filter(File.job_id == job_id).filter(File.file_state.in_(FileActiveStates)).scalar()
+        if canceled and n_left == 0:
+            Session.query(File).filter(File.job_id == job_id).filter(File.file_state == 'NOT_USED')\
+                .update({'file_state': 'CANCELED', 'reason': reason, 'finish_time': now}, synchronize_session=False)
+            Session.query(Job).filter(Job.job_id == job_id).filter(Job.job_state.in_(JobActiveStates))\
+                .update({
+                    'job_state': 'CANCELED', 'reason': reason, 'job_finished': now, 'finish_time': now
+                }, synchronize_session=False)
+            Session.query(File).filter(File.job_id == job_id)\
+                .update({'job_finished': now}, synchronize_session=False)
+        Session.commit()
+    except:
+        Session.rollback()
+        raise
+    Session.expire_all()
+    return canceled
+
+
+def _get_spooled_jobs(job_ids):
+    """
+    Return a dictionary job_id => SpooledJob with the jobs that have been accepted,
+    but are not in the database yet
+    """
+    spool = get_spool()
+    if spool is None:
+        return dict()
+    # Jobs are removed from the spool only after they are committed into the database,
+    # so if it is not here, it is there
+    spooled_jobs = dict()
+    for job_id in job_ids:
+        spooled = spool.get(job_id, with_files='files' in request.GET)
+        if spooled is not None:
+            spooled_jobs[job_id] = spooled
+    return spooled_jobs
+
+
+def _spooled_job_status(job_id, spooled, fields=None):
+    """
+    Return the spooled job with the state ACCEPTED (or FAILED if it could not be persisted).
+    If fields is given, only those are returned
+    """
+    job = dict(spooled.job)
+    if not authorized(TRANSFER, resource_owner=job['user_dn'], resource_vo=job['vo_name']):
+        raise HTTPForbidden('Not enough permissions to check the job "%s"' % job_id)
+    if spooled.error:
+        job['job_state'] = 'FAILED'
+        job['reason'] = 'The job could not be persisted: %s' % spooled.error
+    else:
+        job['job_state'] = 'ACCEPTED'
+    if fields:
+        job = dict((field, job.get(field, None)) for field in fields)
+    if 'files' in request.GET:
+        fields = request.GET['files'].split(',')
+        job['files'] = map(
+            lambda f: dict((k, v) for (k, v) in f.iteritems() if k in fields),
+            spooled.files
+        )
+    job['http_status'] = '200 Ok'
+    return job
+
 
 class JobsController(BaseController):
     """
@@ -461,14 +1015,14 @@ class JobsController(BaseController):
         """
         Answer the OPTIONS method over /jobs
         """
-        pylons.response.headers['Allow'] = 'PUT, POST, GET, OPTIONS'
+        pylons.response.headers['Allow'] = 'PUT, POST, GET, DELETE, OPTIONS'
         return []
 
     def job_options(self, job_id):
         """
         Answers the OPTIONS method over /jobs/job-id
         """
-        pylons.response.headers['Allow'] = 'GET, DELETE'
+        pylons.response.headers['Allow'] = 'GET, HEAD, DELETE'
         return []
 
     @doc.query_arg('user_dn', 'Filter by user DN')
@@ -478,8 +1032,11 @@ class JobsController(BaseController):
     @doc.query_arg('source_se', 'Source storage element')
     @doc.query_arg('dest_se', 'Destination storage element')
     @doc.query_arg('limit', 'Limit the number of results')
+    @doc.query_arg('page_size', 'Return the jobs by pages of this size, with a cursor to the next one')
+    @doc.query_arg('cursor', 'Return the page that follows the one that gave this cursor')
+    @doc.query_arg('fields', 'Comma separated list of job fields to retrieve')
     @doc.response(403, 'Operation forbidden')
-    @doc.response(400, 'DN and delegation ID do not match')
+    @doc.response(400, 'DN and delegation ID do not match, or invalid cursor')
     @doc.return_type(array_of=Job)
     @authorize(TRANSFER)
     @jsonify
@@ -501,6 +1058,13 @@ class JobsController(BaseController):
             filter_limit = int(request.params.get('limit', 0))
         except:
             filter_limit = 0
+        cursor = request.params.get('cursor', None)
+        fields = parse_fields(Job, request.params.get('fields', ''))
+        paginated = 'page_size' in request.params or cursor is not None
+        try:
+            page_size = int(request.params.get('page_size', DEFAULT_PAGE_SIZE))
+        except:
+            raise HTTPBadRequest('Invalid page size')
 
         if filter_dlg_id and filter_dlg_id != user.delegation_id:
             raise HTTPForbidden('The provided delegation id does not match your delegation id')
@@ -510,6 +1074,8 @@ class JobsController(BaseController):
             raise HTTPForbidden('To filter by state, you need to provide dlg_id')
         if filter_limit < 0 or filter_limit > 500:
             raise HTTPBadRequest('The limit must be positive and less or equal than 500')
+        if page_size <= 0 or page_size > MAX_PAGE_SIZE:
+            raise HTTPBadRequest('The page size must be positive and less or equal than %d' % MAX_PAGE_SIZE)
 
         if filter_state:
             filter_state = filter_state.split(',')
@@ -531,14 +1097,25 @@ class JobsController(BaseController):
         if filter_dest:
             jobs = jobs.filter(Job.dest_se == filter_dest)
 
-        if filter_limit:
+        if paginated:
+            return _get_page(jobs, page_size, cursor, fields)
+        elif fields:
+            jobs = project(jobs, Job, fields)
+            if filter_limit:
+                return map(lambda row: to_dict(row, fields), jobs[:filter_limit])
+            return iter_projected(jobs.yield_per(STREAM_YIELD_PER), fields)
+        elif filter_limit:
             return jobs[:filter_limit]
         else:
-            return jobs.all()
+            return jobs.yield_per(STREAM_YIELD_PER)
 
     @doc.query_arg('files', 'Comma separated list of file fields to retrieve in this query')
+    @doc.query_arg('fields', 'Comma separated list of job fields to retrieve')
+    @doc.query_arg('wait_until', 'Hold the answer until the job is terminal, or its state changes (terminal or change)')
+    @doc.query_arg('timeout', 'Maximum number of seconds to wait for wait_until. 60 by default')
     @doc.response(200, 'The jobs exist')
     @doc.response(207, 'Some job had an error')
+    @doc.response(304, 'The job has not changed since the given ETag')
     @doc.response(403, 'The user doesn\'t have enough privileges')
     @doc.response(404, 'The job doesn\'t exist')
     @doc.return_type(Job)
@@ -546,27 +1123,63 @@ class JobsController(BaseController):
     def get(self, job_list, start_response):
         """
         Get the job with the given ID
+
+        A single job has an ETag that changes with its state, so it can be polled with If-None-Match.
+        With wait_until, the answer is held until the job reaches the condition, or the timeout expires
         """
         job_ids = job_list.split(',')
         multistatus = False
         statuses = list()
+        spooled_jobs = _get_spooled_jobs(filter(len, job_ids))
+
+        if 'wait_until' in request.GET:
+            if len(job_ids) != 1:
+                raise HTTPBadRequest('wait_until can only be used with a single job')
+            if job_ids[0] not in spooled_jobs:
+                _wait_for_job(job_ids[0], request.GET['wait_until'], request.GET.get('timeout', DEFAULT_WAIT_TIMEOUT))
+
+        # Cheap check of a single job before building the answer
+        if len(job_ids) == 1 and job_ids[0] not in spooled_jobs:
+            etag = _get_job_etag(job_ids[0])
+            if etag in request.if_none_match:
+                # Pylons would merge the Content-Type set by jsonify, but 304 has no content
+                pylons.response.headers.pop('Content-Type', None)
+                raise HTTPNotModified(headers=[('ETag', '"%s"' % etag)])
+            pylons.response.headers['ETag'] = '"%s"' % etag
+            if request.method == 'HEAD':
+                return None
+
+        fields = parse_fields(Job, request.GET.get('fields', ''))
+
+        # One query for all the jobs, and another one for all their files
+        jobs = _get_jobs(filter(len, job_ids), fields)
+        allowed_ids = set()
+        for job in jobs.itervalues():
+            if authorized(TRANSFER, resource_owner=job.user_dn, resource_vo=job.vo_name):
+                allowed_ids.add(job.job_id)
+        files = None
+        if 'files' in request.GET:
+            files = _get_files_fields(allowed_ids, request.GET['files'])
 
         for job_id in filter(len, job_ids):
             try:
-                job = JobsController._get_job(job_id)
-                if 'files' in request.GET:
-                    fields = request.GET['files'].split(',')
-                    files = list()
-                    for f in Session.query(File).filter(File.job_id == job.job_id).all():
-                        fd = dict()
-                        for field in fields:
-                            try:
-                                fd[field] = getattr(f, field)
-                            except:
-                                pass
-                        files.append(fd)
-                    job.__dict__['files'] = files
-                setattr(job, 'http_status', '200 Ok')
+                if job_id in spooled_jobs:
+                    statuses.append(_spooled_job_status(job_id, spooled_jobs[job_id], fields))
+                    continue
+                job = jobs.get(job_id, None)
+                if job is None:
+                    raise HTTPNotFound('No job with the id "%s" has been found' % job_id)
+                if job_id not in allowed_ids:
+                    raise HTTPForbidden('Not enough permissions to check the job "%s"' % job_id)
+                if fields:
+                    job = to_dict(job, fields)
+                    if files is not None:
+                        job['files'] = files[job_id]
+                    job['http_status'] = '200 Ok'
+                else:
+                    if files is not None:
+                        job.__dict__['files'] = files[job_id]
+                    setattr(job, 'http_status', '200 Ok')
                 statuses.append(job)
             except HTTPError, e:
                 if len(job_ids) == 1:
@@ -582,9 +1195,50 @@ class JobsController(BaseController):
             return statuses[0]
 
         if multistatus:
-            start_response("207 Multi-Status", [('Content-Type', 'application/json')])
+            start_response("207 Multi-Status", [('Content-Type', pylons.response.content_type)])
         return statuses
 
+    @doc.query_arg('job_id', 'Comma separated list of jobs to follow')
+    @doc.query_arg('vo_name', 'Follow the jobs of this VO')
+    @doc.query_arg('dlg_id', 'Follow the jobs of this delegation ID')
+    @doc.query_arg('timeout', 'Close the stream after this many seconds')
+    @doc.response(400, 'Nothing to follow, or invalid timeout')
+    @doc.response(403, 'The user doesn\'t have enough privileges')
+    @doc.response(404, 'The job doesn\'t exist')
+    @authorize(TRANSFER)
+    def events(self, start_response):
+        """
+        Stream of the state changes of the jobs and their files, as server-sent events
+
+        The stream starts with the current state of the followed jobs, and then
+        sends an event each time a job or a file changes its state
+        """
+        user = request.environ['fts3.User.Credentials']
+
+        job_ids = filter(len, request.GET.get('job_id', '').split(','))
+        vo_name = request.GET.get('vo_name', None)
+        dlg_id = request.GET.get('dlg_id', None)
+        if not job_ids and not vo_name and not dlg_id:
+            raise HTTPBadRequest('Specify at least one of job_id, vo_name or dlg_id')
+        if dlg_id and dlg_id != user.delegation_id:
+            raise HTTPForbidden('The provided delegation id does not match your delegation id')
+        try:
+            timeout = float(request.GET.get('timeout', 0))
+        except ValueError:
+            raise HTTPBadRequest('Invalid timeout')
+
+        jobs = _get_jobs(job_ids, ['job_id', 'user_dn', 'vo_name'])
+        for job_id in job_ids:
+            if job_id not in jobs:
+                raise HTTPNotFound('No job with the id "%s" has been found' % job_id)
+            job = jobs[job_id]
+            if not authorized(TRANSFER, resource_owner=job.user_dn, resource_vo=job.vo_name):
+                raise HTTPForbidden('Not enough permissions to check the job "%s"' % job_id)
+
+        subscriber = Subscriber(user, job_ids, vo_name, dlg_id)
+        start_response('200 OK', [('Content-Type', 'text/event-stream'), ('Cache-Control', 'no-cache')])
+        return _event_stream(get_watcher(), subscriber, timeout)
+
     @doc.response(403, 'The user doesn\'t have enough privileges')
     @doc.response(404, 'The job or the field doesn\'t exist')
     @jsonify
@@ -598,6 +1252,7 @@ class JobsController(BaseController):
         else:
             raise HTTPNotFound('No such field')
 
+    @doc.query_arg('fields', 'Comma separated list of file fields to retrieve')
     @doc.response(403, 'The user doesn\'t have enough privileges')
     @doc.response(404, 'The job doesn\'t exist')
     @doc.return_type(array_of=File)
@@ -611,8 +1266,12 @@ class JobsController(BaseController):
             raise HTTPNotFound('No job with the id "%s" has been found' % job_id)
         if not authorized(TRANSFER, resource_owner=owner[0], resource_vo=owner[1]):
             raise HTTPForbidden('Not enough permissions to check the job "%s"' % job_id)
+        fields = parse_fields(File, request.GET.get('fields', ''))
+        if fields:
+            files = project(Session.query(File), File, fields).filter(File.job_id == job_id)
+            return iter_projected(files.yield_per(STREAM_YIELD_PER), fields)
         files = Session.query(File).filter(File.job_id == job_id).options(noload(File.retries))
-        return files.all()
+        return files.yield_per(STREAM_YIELD_PER)
 
     @doc.response(403, 'The user doesn\'t have enough privileges')
     @doc.response(404, 'The job or the file don\'t exist')
@@ -633,6 +1292,69 @@ class JobsController(BaseController):
         retries = Session.query(FileRetryLog).filter(FileRetryLog.file_id == file_id)
         return retries.all()
 
+    @doc.response(207, 'Some job had an error')
+    @doc.response(403, 'The user doesn\'t have enough privileges')
+    @doc.response(404, 'The job doesn\'t exist')
+    @jsonify
+    def get_summary(self, job_list, start_response):
+        """
+        Get how many files of the job are in each state, how many bytes they are,
+        and their average throughput and duration. Several jobs can be given, separated by commas
+        """
+        job_ids = filter(len, job_list.split(','))
+        jobs = _get_jobs(job_ids, ['job_id', 'job_state', 'user_dn', 'vo_name'])
+        allowed_ids = filter(
+            lambda job_id: authorized(TRANSFER, resource_owner=jobs[job_id].user_dn, resource_vo=jobs[job_id].vo_name),
+            jobs.iterkeys()
+        )
+        summaries = _get_summaries(allowed_ids)
+
+        multistatus = False
+        statuses = list()
+        for job_id in job_ids:
+            try:
+                if job_id not in jobs:
+                    raise HTTPNotFound('No job with the id "%s" has been found' % job_id)
+                if job_id not in summaries:
+                    raise HTTPForbidden('Not enough permissions to check the job "%s"' % job_id)
+                summary = summaries[job_id]
+                summary['job_state'] = jobs[job_id].job_state
+                statuses.append(summary)
+            except HTTPError, e:
+                if len(job_ids) == 1:
+                    raise
+                statuses.append(dict(
+                    job_id=job_id,
+                    http_status="%s %s" % (e.code, e.title),
+                    http_message=e.detail
+                ))
+                multistatus = True
+
+        if len(job_ids) == 1:
+            return statuses[0]
+        if multistatus:
+            start_response("207 Multi-Status", [('Content-Type', pylons.response.content_type)])
+        return statuses
+
+    @doc.response(403, 'The user doesn\'t have enough privileges')
+    @doc.response(404, 'The job doesn\'t exist')
+    @jsonify
+    def get_job_retries(self, job_id):
+        """
+        Get the retries of all the files of a job, grouped by file
+        """
+        owner = Session.query(Job.user_dn, Job.vo_name).filter(Job.job_id == job_id).first()
+        if owner is None:
+            raise HTTPNotFound('No job with the id "%s" has been found' % job_id)
+        if not authorized(TRANSFER, resource_owner=owner[0], resource_vo=owner[1]):
+            raise HTTPForbidden('Not enough permissions to check the job "%s"' % job_id)
+        retries = Session.query(FileRetryLog.file_id, FileRetryLog.attempt, FileRetryLog.datetime, FileRetryLog.reason)\
+            .join(File, File.file_id == FileRetryLog.file_id)\
+            .filter(File.job_id == job_id)\
+            .order_by(FileRetryLog.file_id, FileRetryLog.attempt)
+        return _iter_retries(retries.yield_per(STREAM_YIELD_PER))
+
+    @doc.response(202, 'The job is big, and its files are being canceled in the background')
     @doc.response(207, 'For multiple job requests if there has been any error')
     @doc.response(403, 'The user doesn\'t have enough privileges')
     @doc.response(404, 'The job doesn\'t exist')
@@ -643,21 +1365,27 @@ class JobsController(BaseController):
         Cancel the given job
 
         Returns the canceled job with its current status. CANCELED if it was canceled,
-        its final status otherwise
+        its final status otherwise. Big jobs are marked as CANCELED at once, but their files
+        are canceled in the background, and the progress can be followed in /jobs/{id}/cancellation
         """
         requested_job_ids = job_id_list.split(',')
-        cancellable_jobs = list()
+        cancellable_ids = list()
         response = list()
         multistatus = False
 
         # First, check which job ids exist and can be accessed
+        jobs = _get_jobs(filter(len, requested_job_ids))
         for job_id in requested_job_ids:
             if not job_id:  # Skip empty
                 continue
             try:
-                job = JobsController._get_job(job_id)
+                job = jobs.get(job_id, None)
+                if job is None:
+                    raise HTTPNotFound('No job with the id "%s" has been found' % job_id)
+                if not authorized(TRANSFER, resource_owner=job.user_dn, resource_vo=job.vo_name):
+                    raise HTTPForbidden('Not enough permissions to check the job "%s"' % job_id)
                 if job.job_state in JobActiveStates:
-                    cancellable_jobs.append(job)
+                    cancellable_ids.append(job_id)
                 else:
                     setattr(job, 'http_status', '304 Not Modified')
                     setattr(job, 'http_message', 'The job is in a terminal state')
@@ -672,37 +1400,22 @@ class JobsController(BaseController):
                 ))
                 multistatus = True
 
-        # Now, cancel those that can be canceled
-        now = datetime.utcnow()
-        try:
-            for job in cancellable_jobs:
-                job.job_state = 'CANCELED'
-                job.finish_time = now
-                job.job_finished = now
-                job.reason = 'Job canceled by the user'
-
-                Session.query(File).filter(File.job_id == job.job_id).filter(File.file_state.in_(FileActiveStates))\
-                    .update({
-                        'file_state': 'CANCELED', 'reason': 'Job canceled by the user',
-                        'job_finished': now, 'finish_time': now
-                    }, synchronize_session=False)
-                Session.query(DataManagement).filter(DataManagement.job_id == job.job_id)\
-                    .filter(DataManagement.file_state.in_(DataManagementActiveStates))\
-                    .update({
-                        'file_state': 'CANCELED', 'reason': 'Job canceled by the user',
-                        'job_finished': now, 'finish_time': now
-                    }, synchronize_session=False)
-                job = Session.merge(job)
-
-                log.info("Job %s canceled" % job.job_id)
+        # Now, cancel those that can be canceled. The big ones, in the background
+        background_ids = _cancel_or_defer(cancellable_ids, 'Job canceled by the user')
+
+        canceled = _get_jobs(cancellable_ids)
+        for job_id in cancellable_ids:
+            job = canceled[job_id]
+            if job_id in background_ids:
+                log.info("Job %s being canceled in the background" % job_id)
+                setattr(job, 'http_status', "202 Accepted")
+                setattr(job, 'http_message', 'The files are being canceled, see /jobs/%s/cancellation' % job_id)
+                multistatus = True
+            else:
+                log.info("Job %s canceled" % job_id)
                 setattr(job, 'http_status', "200 Ok")
                 setattr(job, 'http_message', None)
-                response.append(job)
-            Session.commit()
-            Session.expire_all()
-        except:
-            Session.rollback()
-            raise
+            response.append(job)
 
         # Return 200 if everything is Ok, 207 if there is any errors,
         # and, if input was only one, do not return an array
@@ -710,50 +1423,189 @@ class JobsController(BaseController):
             single = response[0]
             if isinstance(single, Job):
                 if single.http_status not in ('200 Ok', '304 Not Modified'):
-                    start_response(single.http_status, [('Content-Type', 'application/json')])
+                    start_response(single.http_status, [('Content-Type', pylons.response.content_type)])
             elif single['http_status'] not in ('200 Ok', '304 Not Modified'):
-                start_response(single['http_status'], [('Content-Type', 'application/json')])
+                start_response(single['http_status'], [('Content-Type', pylons.response.content_type)])
             return single
 
         if multistatus:
-            start_response("207 Multi-Status", [('Content-Type', 'application/json')])
+            start_response("207 Multi-Status", [('Content-Type', pylons.response.content_type)])
         return response
 
+    @doc.response(403, 'The user doesn\'t have enough privileges')
+    @doc.response(404, 'The job doesn\'t exist, or it is not being canceled')
+    @jsonify
+    def get_cancellation(self, job_id):
+        """
+        Get the progress of the cancellation of a job: how many files are left, and, if it
+        runs in the background, how many have been canceled already.
+        The progress is shared by all the servers, whichever is doing the cancellation
+        """
+        job = Session.query(Job.job_state, Job.user_dn, Job.vo_name).filter(Job.job_id == job_id).first()
+        if job is None:
+            raise HTTPNotFound('No job with the id "%s" has been found' % job_id)
+        if not authorized(TRANSFER, resource_owner=job.user_dn, resource_vo=job.vo_name):
+            raise HTTPForbidden('Not enough permissions to check the job "%s"' % job_id)
+
+        remaining = _count_files([job_id], CancellableFileStates + DataManagementActiveStates)
+        remaining = remaining.get(job_id, 0)
+        cancellation = Session.query(JobCancellation).get(job_id)
+        if cancellation is not None:
+            progress = get_progress(cancellation)
+        elif job.job_state == 'CANCELED':
+            progress = dict(
+                job_id=job_id, state='DONE' if not remaining else 'PENDING', total=None, canceled=None,
+                error=None, started=None, finished=None
+            )
+        else:
+            raise HTTPNotFound('The job "%s" is not being canceled' % job_id)
+        progress['job_state'] = job.job_state
+        progress['remaining'] = remaining
+        return progress
+
+    @doc.response(207, 'For multiple files if there has been any error')
+    @doc.response(400, 'The file ids are not valid')
+    @doc.response(403, 'The user doesn\'t have enough privileges')
+    @doc.response(404, 'The job doesn\'t exist')
+    @doc.return_type('[{"file_id": <file id>, "file_state": <state>, "http_status": <status>}]')
+    @jsonify
+    def cancel_files(self, job_id, file_ids, start_response):
+        """
+        Cancel some files of a job. Several file ids can be given, separated by commas.
+        The alternatives of the canceled transfers, if any, are enabled,
+        and the job is canceled once none of its files is left
+
+        Returns the state of each file. CANCELED if it was canceled,
+        its final state otherwise
+        """
+        JobsController._get_job(job_id)
+        try:
+            requested_ids = map(int, filter(len, file_ids.split(',')))
+        except ValueError:
+            raise HTTPBadRequest('Invalid file id')
+
+        canceled = set(_cancel_files(job_id, requested_ids, 'File canceled by the user'))
+
+        states = dict()
+        for chunk in chunked(requested_ids, IN_CHUNK_SIZE):
+            query = Session.query(File.file_id, File.file_state)\
+                .filter(File.job_id == job_id).filter(File.file_id.in_(chunk))
+            for (file_id, file_state) in query:
+                states[file_id] = file_state
+
+        multistatus = False
+        response = list()
+        for file_id in requested_ids:
+            if file_id in canceled:
+                log.info("File %d of the job %s canceled" % (file_id, job_id))
+                response.append(dict(
+                    file_id=file_id, file_state=states[file_id], http_status='200 Ok', http_message=None
+                ))
+            elif file_id in states:
+                response.append(dict(
+                    file_id=file_id, file_state=states[file_id],
+                    http_status='304 Not Modified', http_message='The file is in a terminal state'
+                ))
+                multistatus = True
+            else:
+                response.append(dict(
+                    file_id=file_id, http_status='404 Not Found',
+                    http_message='No file with the id "%d" has been found in the job' % file_id
+                ))
+                multistatus = True
+
+        if len(requested_ids) == 1:
+            single = response[0]
+            if single['http_status'] not in ('200 Ok', '304 Not Modified'):
+                start_response(single['http_status'], [('Content-Type', pylons.response.content_type)])
+            return single
+
+        if multistatus:
+            start_response("207 Multi-Status", [('Content-Type', pylons.response.content_type)])
+        return response
+
+    @doc.query_arg('user_dn', 'Cancel the jobs of this user DN')
+    @doc.query_arg('vo_name', 'Cancel the jobs of this VO')
+    @doc.query_arg('dlg_id', 'Cancel the jobs of this delegation ID')
+    @doc.query_arg('source_se', 'Cancel the jobs from this source storage element')
+    @doc.query_arg('dest_se', 'Cancel the jobs to this destination storage element')
+    @doc.response(202, 'Some of the jobs are big, and their files are being canceled in the background')
+    @doc.response(400, 'No filter has been given')
+    @doc.response(403, 'The user doesn\'t have enough privileges')
+    @doc.return_type('[job ids]')
+    @authorize(CONFIG)
+    @jsonify
+    def cancel_matching(self, start_response):
+        """
+        Cancel all the active jobs that match the filter. At least one filter must be given
+
+        Returns the ids of the canceled jobs. As with single jobs, the big ones are marked as CANCELED
+        at once, but their files are canceled in the background. If there is any, 202 is returned
+        """
+        filters = (
+            ('user_dn', Job.user_dn), ('vo_name', Job.vo_name), ('dlg_id', Job.cred_id),
+            ('source_se', Job.source_se), ('dest_se', Job.dest_se)
+        )
+        query = Session.query(Job.job_id).filter(Job.job_state.in_(JobActiveStates))
+        filtered = False
+        for (param, column) in filters:
+            value = request.params.get(param, None)
+            if value:
+                query = query.filter(column == value)
+                filtered = True
+        if not filtered:
+            raise HTTPBadRequest('At least one of %s must be given' % ', '.join(map(lambda f: f[0], filters)))
+
+        job_ids = map(lambda row: row[0], query)
+        background_ids = _cancel_or_defer(job_ids, 'Job canceled by the administrator')
+        log.info("%d jobs canceled by filter (%s), %d of them in the background" % (
+            len(job_ids), request.query_string, len(background_ids)
+        ))
+        if background_ids:
+            start_response('202 Accepted', [('Content-Type', pylons.response.content_type)])
+        return job_ids
+
     @doc.input('Submission description', 'SubmitSchema')
     @doc.response(400, 'The submission request could not be understood')
     @doc.response(403, 'The user doesn\'t have enough permissions to submit')
     @doc.response(419, 'The credentials need to be re-delegated')
+    @doc.response(202, 'The job has been accepted, and it will be persisted shortly')
     @doc.return_type('{"job_id": <job id>}')
     @authorize(TRANSFER)
     @jsonify
-    def submit(self):
+    def submit(self, start_response):
         """
         Submits a new job
 
         It returns the information about the new submitted job. To know the format for the
         submission, /api-docs/schema/submit gives the expected format encoded as a JSON-schema.
         It can be used to validate (i.e in Python, jsonschema.validate)
+        If the submission is asynchronous, 202 is returned, and the job is persisted shortly after
         """
+        # Admission control, before even reading the body
+        user = request.environ['fts3.User.Credentials']
+        throttle = get_throttle()
+        _throttle_submission(throttle, user)
+
         # First, the request has to be valid JSON
         try:
             if request.method == 'PUT':
-                unencoded_body = request.body
+                body = request.body_file
             elif request.method == 'POST':
                 if request.content_type == 'application/json':
-                    unencoded_body = request.body
+                    body = request.body_file
                 else:
-                    unencoded_body = urllib.unquote_plus(request.body)
+                    body = StringIO(urllib.unquote_plus(request.body))
             else:
                 raise HTTPBadRequest('Unsupported method %s' % request.method)
 
-            submitted_dict = json.loads(unencoded_body)
+            submitted_dict, remaining_members = _read_submission(body)
 
-        except ValueError, e:
+        except MalformedJson, e:
             raise HTTPBadRequest('Badly formatted JSON request (%s)' % str(e))
 
         # The auto-generated delegation id must be valid
-        user = request.environ['fts3.User.Credentials']
-        credential = Session.query(Credential).get((user.delegation_id, user.user_dn))
+        credential = get_credential(user.delegation_id, user.user_dn)
         if credential is None:
             raise HTTPAuthenticationTimeout('No delegation found for "%s"' % user.user_dn)
         if credential.expired():
@@ -773,40 +1625,61 @@ class JobsController(BaseController):
         # Reject for SE banning
         # If any SE does not accept submissions, reject the whole job
         # Update wait_timeout and wait_timestamp if WAIT_AS is set
-        _apply_banning(files)
-        _apply_banning(datamanagement)
-
-        # Validate that there are no bad combinations
-        if _has_multiple_options(files):
-            if job['reuse_job'] == 'Y':
-                raise HTTPBadRequest('Can not specify reuse and multiple replicas at the same time')
-            job['reuse_job'] = 'R'
-
-        # Update the optimizer
-        unique_pairs = set(map(lambda f: (f['source_se'], f['dest_se']), files))
-        for (source_se, dest_se) in unique_pairs:
-            optimizer_active = OptimizerActive()
-            optimizer_active.source_se = source_se
-            optimizer_active.dest_se = dest_se
-            optimizer_active.ema = 0
-            optimizer_active.datetime = datetime.utcnow()
-            Session.merge(optimizer_active)
+        # Bans are cached, and most of the time there are none
+        bans = get_bans()
+        if len(bans):
+            files = _apply_banning(files, bans)
+            datamanagement = _apply_banning(datamanagement, bans)
+
+        # Asynchronous submission: validate everything, and leave it in the spool
+        spool = get_spool()
+        if spool is not None:
+            files = list(files)
+            datamanagement = list(datamanagement)
+            _check_remaining_members(remaining_members)
+            spool.append(job, files, datamanagement)
+            throttle.charge_files(job['vo_name'], user.user_dn, len(files) + len(datamanagement))
+            if files:
+                log.info("Job %s accepted with %d transfers" % (job['job_id'], len(files)))
+            else:
+                log.info("Job %s accepted with %d data management operations" % (job['job_id'], len(datamanagement)))
+            start_response('202 Accepted', [('Content-Type', pylons.response.content_type)])
+            return {'job_id': job['job_id']}
 
         # Update the database
+        # The transfers are expanded, validated and inserted by chunks, so no matter how big
+        # the job is, only one chunk is in memory at a time
+        unique_pairs = set()
         try:
             Session.execute(Job.__table__.insert(), [job])
-            if len(files):
-                Session.execute(File.__table__.insert(), files)
-            if len(datamanagement):
-                Session.execute(DataManagement.__table__.insert(), datamanagement)
+            n_files = bulk_insert(File.__table__, _collect_pairs(files, unique_pairs))
+            n_datamanagement = bulk_insert(DataManagement.__table__, datamanagement)
+
+            _check_remaining_members(remaining_members)
+
+            # Now that all the transfers are known, set the fields that depend on them
+            Session.execute(
+                Job.__table__.update().where(Job.__table__.c.job_id == job['job_id']).values(
+                    source_se=job['source_se'],
+                    dest_se=job['dest_se'],
+                    reuse_job=job['reuse_job'],
+                    checksum_method=job['checksum_method']
+                )
+            )
+
+            # Make sure the optimizer knows about the pairs
+            new_pairs = ensure_pairs(unique_pairs)
+
             Session.commit()
         except:
             Session.rollback()
             raise
+        remember_pairs(new_pairs)
+        throttle.charge_files(job['vo_name'], user.user_dn, n_files + n_datamanagement)
 
-        if len(files):
-            log.info("Job %s submitted with %d transfers" % (job['job_id'], len(files)))
+        if n_files:
+            log.info("Job %s submitted with %d transfers" % (job['job_id'], n_files))
         else:
-            log.info("Job %s submitted with %d data management operations" % (job['job_id'], len(datamanagement)))
+            log.info("Job %s submitted with %d data management operations" % (job['job_id'], n_datamanagement))
 
         return {'job_id': job['job_id']}
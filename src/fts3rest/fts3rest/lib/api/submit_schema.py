@@ -27,8 +27,13 @@ fileSchema = {
     'properties': {
         'sources':      {'type': 'array', 'items': urlSchema, 'minItems': 1},
         'destinations': {'type': 'array', 'items': urlSchema, 'minItems': 1},
-        'metadata':     {'type': ['object', 'null']},
-        'filesize':     {'type': ['integer', 'null'], 'minimum': 0},
+        'metadata':     {'type': ['object', 'string', 'null']},
+        'filesize':     {
+            'type': ['number', 'string', 'null'],
+            'minimum': 0,
+            'pattern': '^[0-9]+(\\.[0-9]*)?$',
+            'title': 'File size in bytes. Numeric strings are accepted too'
+        },
         'checksum':     {
             'type': ['string', 'null'],
             'title': 'User defined checksum in the form algorithm:value'
@@ -101,7 +106,13 @@ paramSchema = {
 }
 
 deleteSchema = {
-    'type': ['object', 'string']
+    'title': 'Deletion',
+    'type': ['object', 'string'],
+    'required': ['surl'],
+    'properties': {
+        'surl':     urlSchema,
+        'metadata': {'type': ['object', 'string', 'null']}
+    }
 }
 
 SubmitSchema = {
@@ -0,0 +1,212 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Validation of the submitted transfers and deletions against SubmitSchema.
+The schema is compiled once into plain functions, and the errors are collected
+with their position, so all of them can be reported at once
+"""
+
+import re
+
+from fts3rest.lib.http_exceptions import HTTPBadRequest
+from submit_schema import SubmitSchema
+
+
+# Only this many errors are reported, but all of them are counted
+MAX_REPORTED_ERRORS = 100
+
+_TYPES = {
+    'string':  lambda v: isinstance(v, basestring),
+    'integer': lambda v: isinstance(v, (int, long)) and not isinstance(v, bool),
+    'number':  lambda v: isinstance(v, (int, long, float)) and not isinstance(v, bool),
+    'boolean': lambda v: isinstance(v, bool),
+    'object':  lambda v: isinstance(v, dict),
+    'array':   lambda v: isinstance(v, list),
+    'null':    lambda v: v is None,
+}
+
+
+class HTTPInvalidSubmission(HTTPBadRequest):
+    """
+    Bad request with the list of errors found within the submission.
+    The message is the one of the first error
+    """
+
+    def __init__(self, errors, count):
+        super(HTTPInvalidSubmission, self).__init__(errors[0]['message'])
+        self.errors = errors
+        self.error_count = count
+
+
+class SubmissionErrors(object):
+    """
+    Collects the errors found within a submission
+    """
+
+    def __init__(self, limit=MAX_REPORTED_ERRORS):
+        self.errors = list()
+        self.count = 0
+        self.limit = limit
+
+    def add(self, position, message):
+        """
+        Args:
+            position: Where the error is (i.e. files[3].sources[0]). None for the whole job
+            message:  What is wrong
+        """
+        self.count += 1
+        if len(self.errors) < self.limit:
+            self.errors.append(dict(position=position, message=message))
+
+    def __len__(self):
+        return self.count
+
+    def check(self):
+        """
+        Raise HTTPInvalidSubmission if there is any error
+        """
+        if self.count:
+            raise HTTPInvalidSubmission(self.errors, self.count)
+
+
+def _compile_type(types):
+    if not isinstance(types, list):
+        types = [types]
+    checks = map(lambda t: _TYPES[t], types)
+    expected = ' or '.join(types)
+
+    def check_type(value, position, errors):
+        for check in checks:
+            if check(value):
+                return True
+        errors.add(position, 'Invalid value within the request: %s must be %s' % (position, expected))
+        return False
+    return check_type
+
+
+def _compile_min_items(min_items):
+    def check_min_items(value, position, errors):
+        if isinstance(value, list) and len(value) < min_items:
+            errors.add(
+                position, 'Invalid value within the request: %s needs at least %d items' % (position, min_items)
+            )
+            return False
+        return True
+    return check_min_items
+
+
+def _compile_minimum(minimum):
+    def check_minimum(value, position, errors):
+        if _TYPES['number'](value) and value < minimum:
+            errors.add(
+                position, 'Invalid value within the request: %s must be at least %s' % (position, minimum)
+            )
+            return False
+        return True
+    return check_minimum
+
+
+def _compile_pattern(pattern):
+    regex = re.compile(pattern)
+
+    def check_pattern(value, position, errors):
+        if isinstance(value, basestring) and not regex.search(value):
+            errors.add(
+                position, 'Invalid value within the request: %s does not match %s' % (position, pattern)
+            )
+            return False
+        return True
+    return check_pattern
+
+
+def _compile_required(required):
+    def check_required(value, position, errors):
+        valid = True
+        if isinstance(value, dict):
+            for name in required:
+                if name not in value:
+                    errors.add(position, 'Missing parameter: %s.%s' % (position, name))
+                    valid = False
+        return valid
+    return check_required
+
+
+def _compile_properties(properties):
+    compiled = map(lambda (name, schema): (name, _compile(schema)), properties.iteritems())
+
+    def check_properties(value, position, errors):
+        valid = True
+        if isinstance(value, dict):
+            for (name, check) in compiled:
+                if name in value and not check(value[name], '%s.%s' % (position, name), errors):
+                    valid = False
+        return valid
+    return check_properties
+
+
+def _compile_items(items):
+    check_item = _compile(items)
+
+    def check_items(value, position, errors):
+        valid = True
+        if isinstance(value, list):
+            for (index, item) in enumerate(value):
+                if not check_item(item, '%s[%d]' % (position, index), errors):
+                    valid = False
+        return valid
+    return check_items
+
+
+_KEYWORDS = (
+    ('type', _compile_type),
+    ('required', _compile_required),
+    ('properties', _compile_properties),
+    ('minItems', _compile_min_items),
+    ('minimum', _compile_minimum),
+    ('pattern', _compile_pattern),
+    ('items', _compile_items),
+)
+
+
+def _compile(schema):
+    """
+    Compiles the schema into a function (value, position, errors) that adds to errors whatever
+    is wrong with value, and returns False if there is anything wrong.
+    Only the keywords used by SubmitSchema are understood. The others are ignored
+    """
+    checks = list()
+    for (keyword, compiler) in _KEYWORDS:
+        if keyword in schema:
+            checks.append(compiler(schema[keyword]))
+    # If the type is wrong, nothing else is checked
+    if checks and 'type' in schema:
+        check_type = checks.pop(0)
+    else:
+        check_type = None
+
+    def validate(value, position, errors):
+        if check_type and not check_type(value, position, errors):
+            return False
+        valid = True
+        for check in checks:
+            if not check(value, position, errors):
+                valid = False
+        return valid
+    return validate
+
+
+validate_transfer = _compile(SubmitSchema['properties']['files']['items'])
+validate_deletion = _compile(SubmitSchema['properties']['delete']['items'])
@@ -0,0 +1,99 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Process-wide cache of the banned storage elements.
+Bans change rarely, but they are checked for every submission, so t_bad_ses
+is loaded at most once every fts3.BannedSeCacheTTL seconds, or after a ban or unban
+done by this process
+"""
+
+import threading
+import time
+
+import pylons
+
+from fts3.model import BannedSE
+from fts3rest.model.meta import Session
+
+
+DEFAULT_BANNED_SE_CACHE_TTL = 30
+
+# Kept as a tuple (expiration, bans) so it can be swapped in one go
+_cache = (0, None)
+_cache_lock = threading.Lock()
+
+
+class Bans(object):
+    """
+    Lookup structure for the banned storages.
+    The entries are keyed by (se, vo), where vo is None when the ban applies to all VOs
+    """
+
+    def __init__(self, banned_ses):
+        self._bans = dict()
+        for b in banned_ses:
+            self._bans[(str(b.se), b.vo)] = (b.status, b.wait_timeout)
+
+    def __len__(self):
+        return len(self._bans)
+
+    def get(self, se, vo):
+        """
+        Returns a tuple (status, wait_timeout) if se is banned for vo, None otherwise
+        """
+        if not self._bans:
+            return None
+        ban = self._bans.get((se, vo), None)
+        if ban is None:
+            ban = self._bans.get((se, None), None)
+        return ban
+
+
+def _get_ttl():
+    return int(pylons.config.get('fts3.BannedSeCacheTTL', DEFAULT_BANNED_SE_CACHE_TTL))
+
+
+def get_bans(session=Session):
+    """
+    Returns the current bans, reloading them from the database if they are too old
+    """
+    global _cache
+    expiration, bans = _cache
+    if bans is not None and expiration > time.time():
+        return bans
+
+    _cache_lock.acquire()
+    try:
+        # Someone else may have reloaded meanwhile
+        expiration, bans = _cache
+        if bans is None or expiration <= time.time():
+            bans = Bans(session.query(BannedSE))
+            _cache = (time.time() + _get_ttl(), bans)
+        return bans
+    finally:
+        _cache_lock.release()
+
+
+def invalidate_bans():
+    """
+    Force a reload of the bans on the next lookup
+    """
+    global _cache
+    _cache_lock.acquire()
+    try:
+        _cache = (0, None)
+    finally:
+        _cache_lock.release()
@@ -0,0 +1,109 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Bulk insertion of rows, using the fastest strategy each database backend supports
+"""
+
+import pylons
+
+from fts3rest.lib.helpers.misc import chunked
+from fts3rest.model.meta import Session
+
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def _normalize(table, rows):
+    """
+    All rows in a bulk insert must have the same set of columns.
+    Missing values are filled with the column default, if any, or None.
+    Keys that are not columns of the table are dropped
+    """
+    keys = set()
+    for row in rows:
+        keys.update(row.iterkeys())
+    columns = filter(
+        lambda c: c.key in keys or (c.default is not None and c.default.is_scalar),
+        table.c
+    )
+
+    defaults = dict()
+    for column in columns:
+        if column.default is not None and column.default.is_scalar:
+            defaults[column.key] = column.default.arg
+        else:
+            defaults[column.key] = None
+
+    normalized = []
+    for row in rows:
+        normalized.append(dict(
+            (key, row.get(key, default)) for (key, default) in defaults.iteritems()
+        ))
+    return normalized
+
+
+def _multi_values(session, table, rows):
+    """
+    One single INSERT with multiple VALUES
+    """
+    session.execute(table.insert().values(_normalize(table, rows)))
+
+
+def _execute_many(session, table, rows):
+    """
+    One INSERT executed for many rows. The driver decides how to do it.
+    For cx_Oracle, this means array DML: the rows are bound as arrays and sent in one round trip.
+    """
+    session.execute(table.insert(), _normalize(table, rows))
+
+
+STRATEGIES = {
+    'mysql': _multi_values,
+    'oracle': _execute_many,
+    'sqlite': _execute_many,
+}
+
+
+def get_chunk_size():
+    """
+    Returns the configured number of rows to insert per statement
+    """
+    return int(pylons.config.get('fts3.InsertChunkSize', DEFAULT_CHUNK_SIZE))
+
+
+def bulk_insert(table, rows, chunk_size=None, session=Session):
+    """
+    Insert rows into table
+
+    Args:
+        table:      The table where to insert (i.e. File.__table__)
+        rows:       An iterable of dictionaries. It can be a generator, so all the rows
+                    do not need to be in memory at the same time
+        chunk_size: Maximum number of rows per statement. If None, fts3.InsertChunkSize is used
+        session:    The session to use
+
+    Returns:
+        The number of inserted rows
+    """
+    if chunk_size is None:
+        chunk_size = get_chunk_size()
+    strategy = STRATEGIES.get(session.get_bind().dialect.name, _execute_many)
+
+    count = 0
+    for chunk in chunked(rows, chunk_size):
+        strategy(session, table, chunk)
+        count += len(chunk)
+    return count
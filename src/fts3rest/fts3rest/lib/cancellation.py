@@ -0,0 +1,269 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Background cancellation of big jobs.
+The job is marked as CANCELED, with the cancel_job flag, at once, so no new transfer is picked,
+and its cancellation is recorded in t_job_cancellation, within the same transaction.
+Its files are canceled by a background thread in chunks, each one within its own short transaction,
+and the job gets its finish time once all of them are done.
+
+The server working on a cancellation claims it atomically, with a lease that is renewed after each
+chunk, so only one works on it. If the lease expires (i.e. the process died) the cancellation is
+resumed by the canceller of any process, when it starts. The progress is kept in the same table,
+so it can be followed from any server.
+"""
+
+from datetime import datetime, timedelta
+import logging
+import os
+import Queue
+import socket
+import threading
+
+import pylons
+
+from fts3.model import Job, File, FileActiveStates, DataManagement, DataManagementActiveStates
+from fts3.model import JobCancellation, JobCancellationActiveStates
+from fts3rest.model.meta import Session
+
+
+log = logging.getLogger(__name__)
+
+# Jobs with more files than this are canceled in the background
+DEFAULT_CANCEL_THRESHOLD = 10000
+# Files canceled per transaction
+DEFAULT_CANCEL_CHUNK_SIZE = 1000
+# Seconds a claim on a job is valid without progress
+DEFAULT_CANCEL_LEASE = 300
+
+# Files canceled together with their job, including the alternatives that were never used
+CancellableFileStates = FileActiveStates + ['NOT_USED']
+
+_canceller = None
+_canceller_lock = threading.Lock()
+
+
+def get_progress(cancellation):
+    """
+    Returns the progress of a JobCancellation as a dictionary
+    """
+    return dict(
+        job_id=cancellation.job_id, state=cancellation.state, total=cancellation.total,
+        canceled=cancellation.canceled, error=cancellation.error,
+        started=cancellation.started, finished=cancellation.finished
+    )
+
+
+class Canceller(threading.Thread):
+    """
+    Background thread that cancels the files of the queued jobs by chunks
+    """
+
+    def __init__(self, threshold=DEFAULT_CANCEL_THRESHOLD, chunk_size=DEFAULT_CANCEL_CHUNK_SIZE,
+                 lease=DEFAULT_CANCEL_LEASE):
+        super(Canceller, self).__init__(name='Canceller')
+        self.daemon = True
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+        self.lease = lease
+        # Identifies the holder of the leases
+        self.owner = '%s:%d:%x' % (socket.gethostname(), os.getpid(), id(self))
+        self._queue = Queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+
+    def submit(self, job_id):
+        """
+        Queue the cancellation of the files of the job, which must be already marked as CANCELED,
+        and recorded in t_job_cancellation
+        """
+        self._lock.acquire()
+        try:
+            if job_id in self._queued:
+                return
+            self._queued.add(job_id)
+        finally:
+            self._lock.release()
+        self._queue.put(job_id)
+
+    def _claim(self, job_id):
+        """
+        Take the cancellation with a conditional UPDATE, so no other process works on it at the same time.
+        Returns True if it has been claimed
+        """
+        now = datetime.utcnow()
+        try:
+            claimed = Session.query(JobCancellation).filter(JobCancellation.job_id == job_id)\
+                .filter(JobCancellation.state.in_(JobCancellationActiveStates))\
+                .filter((JobCancellation.lease == None) | (JobCancellation.lease < now))\
+                .update({
+                    'state': 'RUNNING', 'owner': self.owner, 'lease': now + timedelta(seconds=self.lease),
+                    'started': now, 'error': None
+                }, synchronize_session=False)
+            Session.commit()
+        except:
+            Session.rollback()
+            raise
+        return claimed == 1
+
+    def _update(self, job_id, values):
+        """
+        Update the cancellation, as long as it is still ours
+        """
+        Session.query(JobCancellation).filter(JobCancellation.job_id == job_id)\
+            .filter(JobCancellation.owner == self.owner)\
+            .update(values, synchronize_session=False)
+
+    def _cancel_chunks(self, job_id, reason, model, active_states, now):
+        """
+        Cancel the active entries of model belonging to the job, chunk_size per transaction
+        """
+        while True:
+            ids = Session.query(model.file_id)\
+                .filter(model.job_id == job_id).filter(model.file_state.in_(active_states))\
+                .limit(self.chunk_size).all()
+            if not ids:
+                break
+            try:
+                Session.query(model).filter(model.file_id.in_(map(lambda r: r[0], ids)))\
+                    .filter(model.file_state.in_(active_states))\
+                    .update({
+                        'file_state': 'CANCELED', 'reason': reason, 'job_finished': now, 'finish_time': now
+                    }, synchronize_session=False)
+                # Progress, and keep the claim
+                self._update(job_id, {
+                    'canceled': JobCancellation.canceled + len(ids),
+                    'lease': datetime.utcnow() + timedelta(seconds=self.lease)
+                })
+                Session.commit()
+            except:
+                Session.rollback()
+                raise
+
+    def process(self, job_id):
+        """
+        Cancel all the files of the job, unless another process is already doing it
+        """
+        self._lock.acquire()
+        try:
+            self._queued.discard(job_id)
+        finally:
+            self._lock.release()
+
+        try:
+            if not self._claim(job_id):
+                log.info("The job %s is being canceled by someone else" % job_id)
+                return
+            reason = Session.query(JobCancellation.reason).filter(JobCancellation.job_id == job_id).scalar()
+            started = datetime.utcnow()
+            self._cancel_chunks(job_id, reason, File, CancellableFileStates, started)
+            self._cancel_chunks(job_id, reason, DataManagement, DataManagementActiveStates, started)
+            now = datetime.utcnow()
+            Session.query(Job).filter(Job.job_id == job_id)\
+                .update({'job_finished': now, 'finish_time': now}, synchronize_session=False)
+            self._update(job_id, {'state': 'DONE', 'finished': now, 'lease': None})
+            Session.commit()
+            log.info("Job %s canceled in the background" % job_id)
+        except Exception, e:
+            Session.rollback()
+            log.error("Could not cancel the job %s: %s" % (job_id, str(e)))
+            try:
+                self._update(job_id, {'state': 'FAILED', 'error': str(e), 'lease': None})
+                Session.commit()
+            except Exception:
+                Session.rollback()
+
+    def work(self):
+        """
+        Process the queued jobs, without waiting for more
+        Returns how many have been processed
+        """
+        processed = 0
+        while True:
+            try:
+                job_id = self._queue.get_nowait()
+            except Queue.Empty:
+                return processed
+            try:
+                self.process(job_id)
+            finally:
+                Session.remove()
+            processed += 1
+
+    def resume(self):
+        """
+        Queue the cancellations that are not finished, and that nobody is working on
+        """
+        pending = Session.query(JobCancellation.job_id)\
+            .filter(JobCancellation.state.in_(JobCancellationActiveStates))\
+            .filter((JobCancellation.lease == None) | (JobCancellation.lease < datetime.utcnow()))
+        for (job_id,) in pending:
+            self.submit(job_id)
+
+    def run(self):
+        log.info("Canceller started")
+        try:
+            self.resume()
+        except Exception, e:
+            log.error("Could not resume the pending cancellations: %s" % str(e))
+        finally:
+            Session.remove()
+        while True:
+            job_id = self._queue.get()
+            try:
+                self.process(job_id)
+            finally:
+                Session.remove()
+
+
+def _new_canceller(config):
+    return Canceller(
+        threshold=int(config.get('fts3.CancelThreshold', DEFAULT_CANCEL_THRESHOLD)),
+        chunk_size=int(config.get('fts3.CancelChunkSize', DEFAULT_CANCEL_CHUNK_SIZE))
+    )
+
+
+def setup_canceller(config):
+    """
+    Start the canceller of this process, which resumes first the pending cancellations
+    """
+    global _canceller
+    _canceller_lock.acquire()
+    try:
+        if _canceller is None:
+            canceller = _new_canceller(config)
+            canceller.start()
+            _canceller = canceller
+    finally:
+        _canceller_lock.release()
+    return _canceller
+
+
+def get_canceller():
+    """
+    Returns the canceller of this process. It is started if setup_canceller has not been called
+    """
+    if _canceller is None:
+        return setup_canceller(pylons.config)
+    return _canceller
+
+
+def set_canceller(canceller):
+    """
+    Replace the canceller of this process (i.e. tests). If None, a new one will be started
+    """
+    global _canceller
+    _canceller = canceller
@@ -0,0 +1,153 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Process-wide cache of the delegated credentials, keyed by (dlg_id, dn).
+Only the termination time is kept, unless the proxy itself is asked for.
+An entry is kept for fts3.DelegationCacheTTL seconds at most, and never beyond the
+termination time of the credential.
+DelegationController invalidates the entries it modifies, but changes done by other
+processes may take up to fts3.DelegationCacheTTL seconds to be seen.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+import pylons
+from sqlalchemy import and_
+
+from fts3.model import Credential
+from fts3rest.model.meta import Session
+
+
+DEFAULT_DELEGATION_CACHE_TTL = 60
+# When the cache grows beyond this size, expired entries are purged
+MAX_DELEGATION_CACHE_SIZE = 10000
+
+_cache = dict()
+_cache_lock = threading.Lock()
+
+
+class CachedCredential(object):
+    """
+    Detached copy of the interesting fields of a Credential
+    """
+
+    def __init__(self, dlg_id, dn, termination_time, proxy=None):
+        self.dlg_id = dlg_id
+        self.dn = dn
+        self.termination_time = termination_time
+        self.proxy = proxy
+
+    def expired(self):
+        return self.termination_time <= datetime.utcnow()
+
+    def remaining(self):
+        return self.termination_time - datetime.utcnow()
+
+
+def _get_ttl():
+    return int(pylons.config.get('fts3.DelegationCacheTTL', DEFAULT_DELEGATION_CACHE_TTL))
+
+
+def _lookup(key):
+    now = time.time()
+    _cache_lock.acquire()
+    try:
+        entry = _cache.get(key, None)
+        if entry is None:
+            return None
+        expiration, cached = entry
+        if expiration <= now:
+            del _cache[key]
+            return None
+        return cached
+    finally:
+        _cache_lock.release()
+
+
+def _store(key, cached):
+    until_termination = (cached.termination_time - datetime.utcnow()).total_seconds()
+    lifetime = min(_get_ttl(), until_termination)
+    if lifetime <= 0:
+        return
+
+    now = time.time()
+    _cache_lock.acquire()
+    try:
+        if len(_cache) >= MAX_DELEGATION_CACHE_SIZE:
+            for k, (expiration, _) in _cache.items():
+                if expiration <= now:
+                    del _cache[k]
+            if len(_cache) >= MAX_DELEGATION_CACHE_SIZE:
+                _cache.clear()
+        _cache[key] = (now + lifetime, cached)
+    finally:
+        _cache_lock.release()
+
+
+def get_credential(dlg_id, dn, with_proxy=False, session=Session):
+    """
+    Returns the delegated credential for (dlg_id, dn), or None if there is none.
+
+    Args:
+        dlg_id:     The delegation id
+        dn:         The user dn
+        with_proxy: If True, the returned credential contains the proxy.
+                    Otherwise, only the termination time is loaded
+        session:    The session to use
+
+    Returns:
+        A CachedCredential, or None
+    """
+    key = (dlg_id, dn)
+    cached = _lookup(key)
+    if cached is not None and (cached.proxy is not None or not with_proxy):
+        return cached
+
+    if with_proxy:
+        row = session.query(Credential.termination_time, Credential.proxy)
+    else:
+        row = session.query(Credential.termination_time)
+    row = row.filter(and_(Credential.dlg_id == dlg_id, Credential.dn == dn)).first()
+    if row is None:
+        return None
+
+    cached = CachedCredential(dlg_id, dn, row[0], row[1] if with_proxy else None)
+    _store(key, cached)
+    return cached
+
+
+def invalidate_credential(dlg_id, dn):
+    """
+    Drop the cached entry for (dlg_id, dn)
+    """
+    _cache_lock.acquire()
+    try:
+        _cache.pop((dlg_id, dn), None)
+    finally:
+        _cache_lock.release()
+
+
+def clear_credentials():
+    """
+    Drop all the cached entries
+    """
+    _cache_lock.acquire()
+    try:
+        _cache.clear()
+    finally:
+        _cache_lock.release()
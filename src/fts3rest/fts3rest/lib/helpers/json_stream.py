@@ -0,0 +1,152 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import re
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class MalformedJson(ValueError):
+    """
+    Raised when the stream does not contain well-formed JSON
+    """
+    pass
+
+
+class JsonObjectReader(object):
+    """
+    Incrementally decodes a JSON object read from a file-like object.
+
+    Iterating over the reader gives the (key, value) pairs of the top level members in the
+    order they appear. If the key is in 'streamed' and the value is an array, the value
+    is a generator of the array items instead, so the array is never decoded as a whole.
+    This generator must be consumed before moving to the next member; otherwise,
+    the remaining items are skipped.
+
+    Anything that is not a JSON object is decoded in one go, so the errors are the same
+    as for json.loads
+    """
+
+    def __init__(self, fd, streamed=None, chunk_size=64 * 1024):
+        self.fd = fd
+        self.streamed = set(streamed or [])
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _read_more(self):
+        """
+        Reads more data into the buffer. Returns False if the stream is exhausted.
+        The read size grows with the buffer, so big values are not decoded too many times
+        """
+        if self._eof:
+            return False
+        if self._pos > 0:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        data = self.fd.read(max(self.chunk_size, len(self._buffer)))
+        if not data:
+            self._eof = True
+            return False
+        self._buffer += data
+        return True
+
+    def _peek(self):
+        """
+        Skips whitespaces, and returns the next character, or None at the end of the stream
+        """
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read_more():
+                return None
+
+    def _expect(self, *chars):
+        c = self._peek()
+        if c not in chars:
+            if c is None:
+                raise MalformedJson('Unexpected end of the stream')
+            raise MalformedJson("Expecting %s, got '%s'" % (' or '.join(map(repr, chars)), c))
+        self._pos += 1
+        return c
+
+    def _decode_value(self):
+        """
+        Decodes the next value. A value is only considered complete if it is followed by
+        something else, so truncated values (i.e. numbers) are not accepted by mistake
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self._buffer, self._pos)
+                end = _WHITESPACE.match(self._buffer, end).end()
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except ValueError, e:
+                if self._eof:
+                    raise MalformedJson(str(e))
+            self._read_more()
+
+    def _iter_array(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._decode_value()
+            if self._expect(',', ']') == ']':
+                return
+
+    def _load_all(self):
+        while self._read_more():
+            pass
+        try:
+            return json.loads(self._buffer[self._pos:])
+        except ValueError, e:
+            raise MalformedJson(str(e))
+
+    def __iter__(self):
+        if self._peek() != '{':
+            value = self._load_all()
+            if not isinstance(value, dict):
+                raise MalformedJson('Expecting an object')
+            for member in value.iteritems():
+                yield member
+            return
+
+        self._pos += 1
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            if self._peek() != '"':
+                raise MalformedJson('Expecting property name')
+            key = self._decode_value()
+            self._expect(':')
+            if key in self.streamed and self._peek() == '[':
+                items = self._iter_array()
+                yield key, items
+                for _ in items:
+                    pass
+            else:
+                yield key, self._decode_value()
+            if self._expect(',', '}') == '}':
+                return
@@ -19,31 +19,112 @@ from datetime import datetime
 from decorator import decorator
 from fts3.model.base import Base
 from pylons.decorators.util import get_pylons
+from sqlalchemy import DateTime
+from sqlalchemy.orm import Query, class_mapper
+from sqlalchemy.orm.attributes import instance_state
 import json
+import types
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Streamed responses are sent by chunks of, roughly, this size
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Output formats
+PRETTY = 'pretty'
+MINIFIED = 'minified'
+NDJSON = 'ndjson'
+MSGPACK = 'msgpack'
+
+
+def _format_datetime(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S%z')
+
+
+class ModelSerializer(object):
+    """
+    Serializes the instances of a mapped class. The columns, and how to convert them, are
+    taken once from the mapper. The values of Flag, TernaryFlag and Json columns are already
+    converted by SQLAlchemy, so only dates need to be formatted.
+    Only what is already loaded is serialized: no relationship is lazy loaded
+    """
+    __slots__ = ('columns', 'column_keys')
+
+    def __init__(self, model):
+        mapper = class_mapper(model)
+        columns = list()
+        for prop in mapper.column_attrs:
+            if isinstance(prop.columns[0].type, DateTime):
+                columns.append((prop.key, _format_datetime))
+            else:
+                columns.append((prop.key, None))
+        self.columns = tuple(columns)
+        self.column_keys = frozenset(map(lambda c: c[0], columns))
+
+    def serialize(self, obj, visited):
+        """
+        Returns a dictionary with the loaded attributes of obj. Other instances
+        already in visited (by id) are skipped, to break the cycles
+        """
+        if instance_state(obj).expired:
+            str(obj) # Let sqlalchemy refresh the instance
+        loaded = obj.__dict__
+        values = {}
+        for (key, convert) in self.columns:
+            if key in loaded:
+                value = loaded[key]
+                if convert is not None and value is not None:
+                    value = convert(value)
+                values[key] = value
+        # Relationships, and attributes set by the controllers
+        for (key, value) in loaded.iteritems():
+            if key in self.column_keys or key.startswith('_'):
+                continue
+            if isinstance(value, Base):
+                if id(value) in visited:
+                    continue
+                visited.add(id(value))
+            values[key] = value
+        return values
+
+
+# Mapped class => ModelSerializer, built the first time an instance is serialized
+_serializers = dict()
+
+
+def get_serializer(model):
+    serializer = _serializers.get(model, None)
+    if serializer is None:
+        serializer = ModelSerializer(model)
+        _serializers[model] = serializer
+    return serializer
 
 
 class ClassEncoder(json.JSONEncoder):
 
     def __init__(self, *args, **kwargs):
         super(ClassEncoder, self).__init__(*args, **kwargs)
-        self.visited = []
+        # Ids of the model instances already serialized
+        self.visited = set()
 
     def default(self, obj):
         if isinstance(obj, Base):
-            self.visited.append(obj)
-
-        if isinstance(obj, datetime):
-            return obj.strftime('%Y-%m-%dT%H:%M:%S%z')
+            self.visited.add(id(obj))
+            return get_serializer(type(obj)).serialize(obj, self.visited)
+        elif isinstance(obj, datetime):
+            return _format_datetime(obj)
         elif isinstance(obj, set):
             return list(obj)
-        elif isinstance(obj, Base) or isinstance(obj, object):
-            str(obj) # Trigger sqlalchemy if needed
+        elif isinstance(obj, object):
+            str(obj)
             values = {}
             for (k, v) in obj.__dict__.iteritems():
-                if not k.startswith('_') and v not in self.visited:
+                if not k.startswith('_') and not (isinstance(v, Base) and id(v) in self.visited):
                     values[k] = v
                     if isinstance(v, Base):
-                        self.visited.append(v)
+                        self.visited.add(id(v))
             return values
         else:
             return super(ClassEncoder, self).default(obj)
@@ -53,11 +134,144 @@ def to_json(data):
     return [json.dumps(data, cls=ClassEncoder, indent=2, sort_keys=True)]
 
 
+def _dumps_pretty(data):
+    # Nested indentation. Newlines within strings are escaped, so this is safe
+    return json.dumps(data, cls=ClassEncoder, indent=2, sort_keys=True).replace('\n', '\n  ')
+
+
+def _dumps_minified(data):
+    return json.dumps(data, cls=ClassEncoder, separators=(',', ':'))
+
+
+# Output format => (content type, serializer of each item, and how to open, separate,
+# close, and represent an empty list)
+_FORMATS = {
+    PRETTY: (
+        'application/json', _dumps_pretty,
+        '[\n  ', json.JSONEncoder(indent=2).item_separator + '\n  ', '\n]', '[]'
+    ),
+    MINIFIED: ('application/json', _dumps_minified, '[', ',', ']', '[]'),
+    NDJSON: ('application/x-ndjson', _dumps_minified, '', '\n', '\n', ''),
+    MSGPACK: ('application/msgpack', None, None, None, None, None),
+}
+
+
+def negotiate(accept):
+    """
+    Returns the output format preferred by the client, given its Accept header.
+    Pretty JSON if nothing else is asked for, or if msgpack is asked for but not installed.
+    Minified JSON is asked for with application/json;pretty=false
+    """
+    candidates = list()
+    for (index, item) in enumerate(accept.split(',')):
+        parts = map(lambda p: p.strip(), item.split(';'))
+        params = dict()
+        for param in parts[1:]:
+            if '=' in param:
+                (name, value) = param.split('=', 1)
+                params[name.strip().lower()] = value.strip().lower()
+        try:
+            quality = float(params.get('q', 1))
+        except ValueError:
+            quality = 0
+        if quality > 0:
+            candidates.append((-quality, index, parts[0].lower(), params))
+
+    for (_, _, media_type, params) in sorted(candidates):
+        if media_type == 'application/json':
+            if params.get('pretty', 'true') in ('false', 'no', '0'):
+                return MINIFIED
+            return PRETTY
+        elif media_type == 'application/x-ndjson':
+            return NDJSON
+        elif media_type in ('application/msgpack', 'application/x-msgpack') and msgpack is not None:
+            return MSGPACK
+        elif media_type in ('*/*', 'application/*'):
+            return PRETTY
+    return PRETTY
+
+
+def get_content_type(output_format):
+    return _FORMATS[output_format][0]
+
+
+def stream_json(iterable, output_format=PRETTY):
+    """
+    Generator that serializes iterable as a JSON list, one item at a time.
+    The output is the same as to_json(list(iterable)) for pretty JSON.
+    For NDJSON, each item goes into its own line
+    """
+    (_, dumps, opening, separator, closing, empty) = _FORMATS[output_format]
+    buffered = list()
+    buffered_size = 0
+    first = True
+    for item in iterable:
+        if first:
+            buffered.append(opening)
+            first = False
+        else:
+            buffered.append(separator)
+        serialized = dumps(item)
+        buffered.append(serialized)
+        buffered_size += len(serialized)
+        if buffered_size >= STREAM_CHUNK_SIZE:
+            yield ''.join(buffered)
+            buffered = list()
+            buffered_size = 0
+    if first:
+        buffered.append(empty)
+    else:
+        buffered.append(closing)
+    yield ''.join(buffered)
+
+
+def _stream_query(query, output_format=PRETTY):
+    """
+    Stream the results of query. The session is closed once done, since
+    the controller has already released it by the time this runs
+    """
+    try:
+        for chunk in stream_json(query, output_format):
+            yield chunk
+    finally:
+        query.session.close()
+
+
+def to_msgpack(data):
+    """
+    Serializes data with msgpack. Models are converted the same way as for JSON
+    """
+    return msgpack.packb(data, default=ClassEncoder().default, use_bin_type=False)
+
+
+def serialize(data, output_format=PRETTY):
+    """
+    Serializes the data returned by a controller into the given format.
+    Queries and generators are streamed as lists, except for msgpack, which needs the whole list
+    """
+    is_stream = isinstance(data, Query) or isinstance(data, types.GeneratorType)
+    if output_format == MSGPACK:
+        if is_stream:
+            data = list(data)
+        return [to_msgpack(data)]
+    elif isinstance(data, Query):
+        return _stream_query(data, output_format)
+    elif isinstance(data, types.GeneratorType):
+        return stream_json(data, output_format)
+    elif output_format == NDJSON:
+        if isinstance(data, list):
+            return stream_json(data, output_format)
+        return [_dumps_minified(data) + '\n']
+    elif output_format == MINIFIED:
+        return [_dumps_minified(data)]
+    return to_json(data)
+
+
 @decorator
 def jsonify(f, *args, **kwargs):
     """
     Decorates methods in the controllers, and converts the output to a JSON
-    serialization
+    serialization, or the format negotiated with the client
 
     Args:
         f:      The method to be called
@@ -65,10 +279,13 @@ def jsonify(f, *args, **kwargs):
         kwargs: Named parameters for f
 
     Returns:
-        A string with the JSON representation of the value returned by f()
+        A string with the JSON representation of the value returned by f().
+        If f() returns a query or a generator, a generator that streams the JSON list
     """
     pylons = get_pylons(args)
-    pylons.response.headers['Content-Type'] = 'application/json'
+    output_format = negotiate(pylons.request.headers.get('Accept', ''))
+    pylons.response.headers['Content-Type'] = get_content_type(output_format)
+    pylons.response.headers['Vary'] = 'Accept'
 
     data = f(*args, **kwargs)
-    return [json.dumps(data, cls=ClassEncoder, indent=2, sort_keys=True)]
+    return serialize(data, output_format)
@@ -20,3 +20,21 @@ def average(iterable, start=None, transform=None):
         return addition / float(len(iterable))
     else:
         return None
+
+
+# Maximum number of ids within an IN clause
+IN_CHUNK_SIZE = 500
+
+
+def chunked(iterable, size):
+    """
+    Splits iterable into lists of, at most, size elements
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
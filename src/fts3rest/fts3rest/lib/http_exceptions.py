@@ -31,5 +31,11 @@ class HTTPMethodFailure(HTTPClientError):
     title = 'Method Failure'
     explanation = ('Method failure')
 
+class HTTPTooManyRequests(HTTPClientError):
+    code = 429
+    title = 'Too Many Requests'
+    explanation = ('Too many requests, try again later')
+
 status_map[419] = HTTPAuthenticationTimeout
 status_map[424] = HTTPMethodFailure
+status_map[429] = HTTPTooManyRequests
@@ -0,0 +1,281 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Job and file state changes, as a stream of events.
+A single watcher per process scans the jobs someone is subscribed to (by id, VO or
+delegation id), compares their state and the state of their files with the previous
+scan, and fans the changes out to the subscribers.
+The files of the active jobs are read at each scan, and compared with the previous one. Those of
+the jobs that finish are read one last time, and then forgotten.
+New subscribers get first the current state of what they are subscribed to.
+"""
+
+from datetime import datetime, timedelta
+import logging
+import Queue
+import threading
+import time
+
+import pylons
+from sqlalchemy import or_
+
+from fts3.model import File, Job, JobActiveStates
+from fts3rest.lib.helpers.misc import IN_CHUNK_SIZE, chunked
+from fts3rest.lib.middleware.fts3auth import authorized
+from fts3rest.lib.middleware.fts3auth.constants import TRANSFER
+from fts3rest.model.meta import Session
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_EVENTS_INTERVAL = 2
+# Events queued for a subscriber that does not read them are dropped beyond this
+MAX_QUEUED_EVENTS = 10000
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+class Subscriber(object):
+    """
+    Someone subscribed to the changes of some jobs.
+    The events are put into the queue as tuples (event type, data)
+    """
+
+    def __init__(self, user, job_ids=None, vo_name=None, dlg_id=None):
+        self.job_ids = set(job_ids or [])
+        self.vo_name = vo_name
+        self.dlg_id = dlg_id
+        self.queue = Queue.Queue(MAX_QUEUED_EVENTS)
+        self.primed = False
+        self._env = {'fts3.User.Credentials': user}
+        self._authorized = dict()
+
+    def matches(self, job):
+        """
+        True if the subscriber wants the events of the job, and can see them
+        """
+        if job.job_id in self.job_ids:
+            pass
+        elif self.vo_name and job.vo_name == self.vo_name:
+            pass
+        elif self.dlg_id and job.cred_id == self.dlg_id:
+            pass
+        else:
+            return False
+        allowed = self._authorized.get(job.job_id, None)
+        if allowed is None:
+            allowed = authorized(TRANSFER, resource_owner=job.user_dn, resource_vo=job.vo_name, env=self._env)
+            self._authorized[job.job_id] = allowed
+        return allowed
+
+    def send(self, event, data):
+        try:
+            self.queue.put_nowait((event, data))
+        except Queue.Full:
+            log.warning("Event dropped for a slow subscriber")
+
+
+class JobWatcher(threading.Thread):
+    """
+    Scans the state of the watched jobs, and sends the changes to the subscribers
+    """
+
+    def __init__(self, interval=DEFAULT_EVENTS_INTERVAL):
+        super(JobWatcher, self).__init__(name='JobWatcher')
+        self.daemon = True
+        self.interval = interval
+        self._subscribers = list()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        # Last seen states, job_id => job_state, and file_id => file_state for the files of the active jobs
+        self._job_states = dict()
+        self._file_states = dict()
+        self._last_scan = None
+
+    def subscribe(self, subscriber):
+        self._lock.acquire()
+        try:
+            was_idle = not self._subscribers
+            self._subscribers.append(subscriber)
+        finally:
+            self._lock.release()
+        # Wake up the watcher only if it was idle, so the interval is kept
+        if was_idle:
+            self._wake.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._lock.acquire()
+        try:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def _get_watched_jobs(self, subscribers, since, known_ids):
+        """
+        The jobs any subscriber is interested in: those requested by id, plus those
+        of the requested VOs and delegation ids that are running, or finished since the last scan.
+        known_ids are always looked up by id, so a job seen running is not missed when it finishes,
+        whatever the clocks say
+        """
+        job_ids = set(known_ids)
+        vos = set()
+        dlg_ids = set()
+        for subscriber in subscribers:
+            job_ids.update(subscriber.job_ids)
+            if subscriber.vo_name:
+                vos.add(subscriber.vo_name)
+            if subscriber.dlg_id:
+                dlg_ids.add(subscriber.dlg_id)
+
+        columns = (Job.job_id, Job.job_state, Job.user_dn, Job.vo_name, Job.cred_id)
+        jobs = dict()
+        for chunk in chunked(job_ids, IN_CHUNK_SIZE):
+            for job in Session.query(*columns).filter(Job.job_id.in_(chunk)):
+                jobs[job.job_id] = job
+        if vos or dlg_ids:
+            scope = list()
+            if vos:
+                scope.append(Job.vo_name.in_(vos))
+            if dlg_ids:
+                scope.append(Job.cred_id.in_(dlg_ids))
+            recent = (Job.job_finished == None)
+            if since is not None:
+                recent = recent | (Job.job_finished >= since)
+            for job in Session.query(*columns).filter(or_(*scope)).filter(recent):
+                jobs[job.job_id] = job
+        return jobs
+
+    def _get_file_states(self, job_ids):
+        """
+        The state of the files of the given jobs
+        """
+        files = dict()
+        for chunk in chunked(job_ids, IN_CHUNK_SIZE):
+            query = Session.query(File.file_id, File.job_id, File.file_state).filter(File.job_id.in_(chunk))
+            for f in query:
+                files[f.file_id] = f
+        return files
+
+    def scan(self):
+        """
+        Compare the current state of the watched jobs with the previous scan,
+        and send the changes to the subscribers
+
+        Returns:
+            How many events have been sent
+        """
+        self._lock.acquire()
+        try:
+            subscribers = list(self._subscribers)
+        finally:
+            self._lock.release()
+        if not subscribers:
+            self._job_states.clear()
+            self._file_states.clear()
+            self._last_scan = None
+            return 0
+
+        now = datetime.utcnow()
+        since = None
+        if self._last_scan is not None:
+            since = self._last_scan - timedelta(seconds=self.interval)
+        known_ids = filter(lambda job_id: self._job_states[job_id] in JobActiveStates, self._job_states)
+        jobs = self._get_watched_jobs(subscribers, since, known_ids)
+
+        # Changes since the previous scan. The files of the active jobs, and of those that have just
+        # changed (i.e. finished), are compared with the previous scan
+        job_changes = filter(lambda job: self._job_states.get(job.job_id) != job.job_state, jobs.itervalues())
+        tracked_ids = set(map(lambda job: job.job_id, job_changes))
+        tracked_ids.update(map(
+            lambda job: job.job_id, filter(lambda job: job.job_state in JobActiveStates, jobs.itervalues())
+        ))
+
+        # New subscribers get the current state of everything, so all the files of their jobs are needed
+        new_subscribers = filter(lambda s: not s.primed, subscribers)
+        new_job_ids = set()
+        if new_subscribers:
+            new_job_ids = set(filter(
+                lambda job_id: any(map(lambda s: s.matches(jobs[job_id]), new_subscribers)), jobs
+            ))
+
+        files = self._get_file_states(tracked_ids | new_job_ids)
+        file_changes = filter(
+            lambda f: f.job_id in tracked_ids and self._file_states.get(f.file_id) != f.file_state,
+            files.itervalues()
+        )
+        new_files = filter(lambda f: f.job_id in new_job_ids, files.itervalues())
+
+        sent = 0
+        for subscriber in subscribers:
+            if subscriber.primed:
+                sub_jobs, sub_files = job_changes, file_changes
+            else:
+                sub_jobs, sub_files = jobs.itervalues(), new_files
+            for job in sub_jobs:
+                if subscriber.matches(job):
+                    subscriber.send('job', dict(job_id=job.job_id, job_state=job.job_state))
+                    sent += 1
+            for f in sub_files:
+                if subscriber.matches(jobs[f.job_id]):
+                    subscriber.send('file', dict(job_id=f.job_id, file_id=f.file_id, file_state=f.file_state))
+                    sent += 1
+            subscriber.primed = True
+
+        self._job_states = dict((job.job_id, job.job_state) for job in jobs.itervalues())
+        self._file_states = dict(
+            (f.file_id, f.file_state) for f in files.itervalues() if jobs[f.job_id].job_state in JobActiveStates
+        )
+        self._last_scan = now
+        return sent
+
+    def run(self):
+        log.info("Job watcher started")
+        while True:
+            self._wake.clear()
+            try:
+                self.scan()
+            except Exception, e:
+                log.error("Could not scan the job states: %s" % str(e))
+            finally:
+                Session.remove()
+            # Scan every interval while someone is subscribed, wait for someone otherwise
+            if self._subscribers:
+                time.sleep(self.interval)
+            else:
+                self._wake.wait()
+
+
+def get_watcher():
+    """
+    Returns the watcher of this process, started the first time
+    """
+    global _watcher
+    if _watcher is None:
+        _watcher_lock.acquire()
+        try:
+            if _watcher is None:
+                watcher = JobWatcher(float(pylons.config.get('fts3.EventsInterval', DEFAULT_EVENTS_INTERVAL)))
+                watcher.start()
+                _watcher = watcher
+        finally:
+            _watcher_lock.release()
+    return _watcher
@@ -0,0 +1,193 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Long polling of the job states.
+The requests waiting for a job register themselves into a single poller, which checks
+the state of all the waited jobs with one query per interval, and wakes up those whose
+condition is met. The waiting requests do not hold any database connection.
+"""
+
+import logging
+import threading
+import time
+
+import pylons
+
+from fts3.model import Job, JobActiveStates
+from fts3rest.lib.helpers.misc import IN_CHUNK_SIZE, chunked
+from fts3rest.model.meta import Session
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 1
+
+# Conditions that can be waited for
+WAIT_CONDITIONS = ('terminal', 'change')
+
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def is_condition_met(until, initial_state, state):
+    """
+    Returns True if a job that was in initial_state, and is now in state, satisfies the condition
+    """
+    if state is None:
+        # The job is gone (i.e. archived)
+        return True
+    if until == 'terminal':
+        return state not in JobActiveStates
+    return state != initial_state
+
+
+class Waiter(object):
+    """
+    A request waiting for a job
+    """
+    __slots__ = ('job_id', 'until', 'initial_state', 'state', 'event')
+
+    def __init__(self, job_id, until, initial_state):
+        self.job_id = job_id
+        self.until = until
+        self.initial_state = initial_state
+        self.state = initial_state
+        self.event = threading.Event()
+
+
+class JobPoller(threading.Thread):
+    """
+    Checks, in bulk, the state of the jobs someone is waiting for
+    """
+
+    def __init__(self, interval=DEFAULT_POLL_INTERVAL):
+        super(JobPoller, self).__init__(name='JobPoller')
+        self.daemon = True
+        self.interval = interval
+        self._waiters = dict()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def register(self, job_id, until, initial_state):
+        """
+        Register a new waiter for the job
+        """
+        waiter = Waiter(job_id, until, initial_state)
+        self._lock.acquire()
+        try:
+            was_idle = not self._waiters
+            self._waiters.setdefault(job_id, list()).append(waiter)
+        finally:
+            self._lock.release()
+        # Wake up the poller only if it was idle, so the interval is kept
+        if was_idle:
+            self._wake.set()
+        return waiter
+
+    def unregister(self, waiter):
+        self._lock.acquire()
+        try:
+            waiters = self._waiters.get(waiter.job_id, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+            if not waiters:
+                self._waiters.pop(waiter.job_id, None)
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return len(self._waiters)
+
+    def wait(self, job_id, until, initial_state, timeout):
+        """
+        Block until the condition is met for the job, or timeout expires
+
+        Returns:
+            The last known state of the job
+        """
+        waiter = self.register(job_id, until, initial_state)
+        try:
+            waiter.event.wait(timeout)
+        finally:
+            self.unregister(waiter)
+        return waiter.state
+
+    def poll(self):
+        """
+        Check the state of all the waited jobs, and wake up those that are done
+
+        Returns:
+            How many waiters have been woken up
+        """
+        self._lock.acquire()
+        try:
+            job_ids = self._waiters.keys()
+        finally:
+            self._lock.release()
+        if not job_ids:
+            return 0
+
+        states = dict()
+        for chunk in chunked(job_ids, IN_CHUNK_SIZE):
+            for (job_id, job_state) in Session.query(Job.job_id, Job.job_state).filter(Job.job_id.in_(chunk)):
+                states[job_id] = job_state
+
+        woken = 0
+        self._lock.acquire()
+        try:
+            for job_id in job_ids:
+                state = states.get(job_id, None)
+                for waiter in self._waiters.get(job_id, []):
+                    waiter.state = state
+                    if not waiter.event.is_set() and is_condition_met(waiter.until, waiter.initial_state, state):
+                        waiter.event.set()
+                        woken += 1
+        finally:
+            self._lock.release()
+        return woken
+
+    def run(self):
+        log.info("Job poller started")
+        while True:
+            self._wake.clear()
+            try:
+                self.poll()
+            except Exception, e:
+                log.error("Could not poll the job states: %s" % str(e))
+            finally:
+                Session.remove()
+            # Sleep for the interval if someone is waiting, until someone comes otherwise
+            if self._waiters:
+                time.sleep(self.interval)
+            else:
+                self._wake.wait()
+
+
+def get_poller():
+    """
+    Returns the poller of this process, started the first time
+    """
+    global _poller
+    if _poller is None:
+        _poller_lock.acquire()
+        try:
+            if _poller is None:
+                poller = JobPoller(float(pylons.config.get('fts3.LongPollInterval', DEFAULT_POLL_INTERVAL)))
+                poller.start()
+                _poller = poller
+        finally:
+            _poller_lock.release()
+    return _poller
@@ -0,0 +1,181 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import zlib
+from paste.deploy.converters import asbool
+
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_LEVEL = 6
+
+# Only these are worth compressing
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'application/msgpack', 'text/')
+# Event streams are not, since each event must be sent as it comes
+STREAMED_TYPES = ('text/event-stream',)
+
+
+def get_encoding(accept_encoding):
+    """
+    Returns the preferred encoding, gzip or deflate, accepted by the client, or None
+    """
+    accepted = dict()
+    for item in accept_encoding.split(','):
+        parts = item.strip().split(';')
+        quality = 1.0
+        for param in parts[1:]:
+            param = param.strip()
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0
+        accepted[parts[0].strip().lower()] = quality
+    for encoding in ('gzip', 'deflate'):
+        quality = accepted.get(encoding, accepted.get('*', 0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+def _compressor(encoding, level):
+    if encoding == 'gzip':
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return zlib.compressobj(level)
+
+
+class Compression(object):
+    """
+    This middleware compresses the responses with gzip or deflate, if the client
+    accepts it, and the response is big enough.
+    The response is compressed as it is produced, so streamed responses remain streamed
+    """
+
+    def __init__(self, wrap_app, config):
+        self.app = wrap_app
+        self.enabled = asbool(config.get('fts3.Compression', True))
+        self.min_size = int(config.get('fts3.CompressionMinSize', DEFAULT_MIN_SIZE))
+        self.level = int(config.get('fts3.CompressionLevel', DEFAULT_LEVEL))
+
+    def __call__(self, environ, start_response):
+        encoding = None
+        if self.enabled and environ.get('REQUEST_METHOD') != 'HEAD':
+            encoding = get_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return self.app(environ, start_response)
+
+        captured = dict()
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured['status'] = status
+            captured['headers'] = headers
+            captured['exc_info'] = exc_info
+            # The body will be written only through the iterable
+            return None
+
+        response = self.app(environ, capture_start_response)
+        return self._compress(encoding, response, captured, start_response)
+
+    def _is_compressible(self, status, headers):
+        """
+        Returns True if the response is worth compressing, judging only by its status and headers
+        """
+        code = int(status.split()[0])
+        if code < 200 or code in (204, 304):
+            return False
+        content_type = ''
+        for (name, value) in headers:
+            name = name.lower()
+            if name == 'content-encoding':
+                return False
+            elif name == 'content-length' and int(value) < self.min_size:
+                return False
+            elif name == 'content-type':
+                content_type = value.lower()
+        if content_type.startswith(STREAMED_TYPES):
+            return False
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _content_length(self, headers):
+        for (name, value) in headers:
+            if name.lower() == 'content-length':
+                return int(value)
+        return None
+
+    def _compress(self, encoding, response, captured, start_response):
+        """
+        Generator of the compressed response.
+        The decision is taken once the first chunk has been produced, since the application may
+        call start_response only then. Responses that are not worth compressing are passed through
+        as they come. If the size is not known, the body is buffered until min_size to decide, and
+        then each chunk is flushed, so streamed responses remain streamed
+        """
+        try:
+            iterator = iter(response)
+            buffered = list()
+            for chunk in iterator:
+                buffered.append(chunk)
+                break
+
+            if not self._is_compressible(captured['status'], captured['headers']):
+                start_response(captured['status'], captured['headers'], captured['exc_info'])
+                for chunk in buffered:
+                    yield chunk
+                for chunk in iterator:
+                    yield chunk
+                return
+
+            streamed = self._content_length(captured['headers']) is None
+            compress = True
+            if streamed:
+                size = sum(map(len, buffered))
+                while size < self.min_size:
+                    try:
+                        chunk = iterator.next()
+                    except StopIteration:
+                        compress = False
+                        break
+                    buffered.append(chunk)
+                    size += len(chunk)
+
+            headers = captured['headers']
+            if compress:
+                headers = filter(lambda h: h[0].lower() not in ('content-length', 'vary'), headers)
+                vary = filter(lambda h: h[0].lower() == 'vary', captured['headers'])
+                vary = map(lambda h: h[1], vary) + ['Accept-Encoding']
+                headers.append(('Content-Encoding', encoding))
+                headers.append(('Vary', ', '.join(vary)))
+            start_response(captured['status'], headers, captured['exc_info'])
+
+            if not compress:
+                for chunk in buffered:
+                    yield chunk
+                return
+
+            compressor = _compressor(encoding, self.level)
+            data = compressor.compress(''.join(buffered))
+            if streamed:
+                data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+            for chunk in iterator:
+                data = compressor.compress(chunk)
+                if streamed:
+                    data += compressor.flush(zlib.Z_SYNC_FLUSH)
+                if data:
+                    yield data
+            yield compressor.flush()
+        finally:
+            if hasattr(response, 'close'):
+                response.close()
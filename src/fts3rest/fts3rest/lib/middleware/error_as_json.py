@@ -19,6 +19,9 @@ import json
 import pylons
 from webob import Response
 
+# Clients accepting any of these get the errors as json
+JSON_ACCEPTED = ('application/json', 'application/x-ndjson', 'application/msgpack', 'application/x-msgpack')
+
 
 class ErrorAsJson(object):
     """
@@ -31,7 +34,7 @@ class ErrorAsJson(object):
 
     def __call__(self, environ, start_response):
         accept = environ.get('HTTP_ACCEPT', 'application/json')
-        is_json_accepted = 'application/json' in accept
+        is_json_accepted = any(map(lambda t: t in accept, JSON_ACCEPTED))
 
         self._status_msg = None
         self._status_code = None
@@ -58,5 +61,9 @@ class ErrorAsJson(object):
                 'status': self._status_msg,
                 'message': err_msg
             }
+            # Some errors carry the detail of everything that went wrong
+            exception = environ.get('pylons.controller.exception', None)
+            if hasattr(exception, 'errors'):
+                json_error['errors'] = exception.errors
             response = [json.dumps(json_error)]
         return response
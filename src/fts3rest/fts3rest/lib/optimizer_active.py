@@ -0,0 +1,146 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Make sure the pairs (source_se, dest_se) exist in t_optimize_active, without
+modifying the existing ones, so concurrent submissions to the same link do not
+serialize on the same rows
+"""
+
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import text, and_
+
+import pylons
+
+from fts3.model import OptimizerActive
+from fts3rest.model.meta import Session
+
+
+DEFAULT_KNOWN_PAIRS_TTL = 300
+
+_known_pairs = dict()
+_known_pairs_lock = threading.Lock()
+
+_ORACLE_MERGE = text(
+    "MERGE INTO t_optimize_active t"
+    " USING (SELECT :source_se AS source_se, :dest_se AS dest_se FROM dual) p"
+    " ON (t.source_se = p.source_se AND t.dest_se = p.dest_se)"
+    " WHEN NOT MATCHED THEN"
+    " INSERT (source_se, dest_se, active, ema, datetime)"
+    " VALUES (p.source_se, p.dest_se, :active, :ema, :datetime)"
+)
+
+
+def _insert_ignore(session, rows):
+    """
+    MySQL: INSERT IGNORE with multiple VALUES
+    """
+    session.execute(OptimizerActive.__table__.insert().prefix_with('IGNORE').values(rows))
+
+
+def _insert_or_ignore(session, rows):
+    """
+    SQLite: INSERT OR IGNORE
+    """
+    session.execute(OptimizerActive.__table__.insert().prefix_with('OR IGNORE'), rows)
+
+
+def _merge_not_matched(session, rows):
+    """
+    Oracle: MERGE that only inserts when there is no match
+    """
+    session.execute(_ORACLE_MERGE, rows)
+
+
+def _select_and_insert(session, rows):
+    """
+    Generic fallback: insert only those that are not there already
+    """
+    for row in rows:
+        exists = session.query(OptimizerActive.source_se).filter(and_(
+            OptimizerActive.source_se == row['source_se'], OptimizerActive.dest_se == row['dest_se']
+        )).first()
+        if not exists:
+            session.execute(OptimizerActive.__table__.insert(), [row])
+
+
+STRATEGIES = {
+    'mysql': _insert_ignore,
+    'sqlite': _insert_or_ignore,
+    'oracle': _merge_not_matched,
+}
+
+
+def _get_ttl():
+    return int(pylons.config.get('fts3.KnownPairsTTL', DEFAULT_KNOWN_PAIRS_TTL))
+
+
+def ensure_pairs(pairs, session=Session):
+    """
+    Insert into t_optimize_active those pairs not known to exist already.
+    The existing entries are left untouched.
+
+    Args:
+        pairs:   An iterable of tuples (source_se, dest_se)
+        session: The session to use
+
+    Returns:
+        The list of pairs sent to the database. Once the transaction is committed,
+        they should be passed to remember_pairs, so the next submissions can skip them
+    """
+    now = time.time()
+    _known_pairs_lock.acquire()
+    try:
+        unknown = filter(lambda p: _known_pairs.get(p, 0) < now, set(pairs))
+    finally:
+        _known_pairs_lock.release()
+
+    if unknown:
+        timestamp = datetime.utcnow()
+        rows = map(
+            lambda (source_se, dest_se): dict(
+                source_se=source_se, dest_se=dest_se, active=2, ema=0, datetime=timestamp
+            ),
+            unknown
+        )
+        strategy = STRATEGIES.get(session.get_bind().dialect.name, _select_and_insert)
+        strategy(session, rows)
+    return unknown
+
+
+def remember_pairs(pairs):
+    """
+    Remember that pairs exist in the database, for a while
+    """
+    expiration = time.time() + _get_ttl()
+    _known_pairs_lock.acquire()
+    try:
+        for pair in pairs:
+            _known_pairs[pair] = expiration
+    finally:
+        _known_pairs_lock.release()
+
+
+def forget_pairs():
+    """
+    Forget all the known pairs
+    """
+    _known_pairs_lock.acquire()
+    try:
+        _known_pairs.clear()
+    finally:
+        _known_pairs_lock.release()
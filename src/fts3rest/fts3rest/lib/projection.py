@@ -0,0 +1,92 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Column projection: the fields requested by the clients are translated into the list
+of columns to select, so only those are read from the database and sent back.
+Only the columns mapped by the model can be requested
+"""
+
+from sqlalchemy.orm import class_mapper
+
+from fts3rest.lib.http_exceptions import HTTPBadRequest
+
+
+def get_columns(model):
+    """
+    Returns the mapped column attributes of model, by attribute name.
+    The attribute name may differ from the column name (i.e. Job.verify_checksum)
+    """
+    return dict((prop.key, getattr(model, prop.key)) for prop in class_mapper(model).column_attrs)
+
+
+def parse_fields(model, fields, strict=True):
+    """
+    Parses a comma separated list of fields of model
+
+    Args:
+        model:  The mapped class
+        fields: Comma separated list of fields
+        strict: If True, unknown fields raise HTTPBadRequest. Otherwise, they are ignored
+
+    Returns:
+        The list of fields, without repetitions, in the requested order
+    """
+    columns = get_columns(model)
+    parsed = list()
+    for field in fields.split(','):
+        field = field.strip()
+        if not field or field in parsed:
+            continue
+        if field in columns:
+            parsed.append(field)
+        elif strict:
+            raise HTTPBadRequest('Unknown field %s' % field)
+    return parsed
+
+
+def project(query, model, fields, extra=None):
+    """
+    Replaces the entities selected by query with the columns of model named in fields.
+    The extra fields are selected too, but they are not part of the projection (i.e. to
+    check authorization)
+    """
+    columns = get_columns(model)
+    selected = list(fields)
+    for field in extra or []:
+        if field not in selected:
+            selected.append(field)
+    # Labeled, so the rows are keyed by attribute name, and not by column name
+    return query.with_entities(*map(lambda field: columns[field].label(field), selected))
+
+
+def to_dict(row, fields):
+    """
+    Returns a dictionary with the given fields of the row
+    """
+    return dict((field, getattr(row, field)) for field in fields)
+
+
+def iter_projected(query, fields):
+    """
+    Generator of dictionaries with the given fields for each row of query.
+    The session is closed once done, since the answer is streamed after the
+    controller has released it
+    """
+    try:
+        for row in query:
+            yield to_dict(row, fields)
+    finally:
+        query.session.close()
@@ -0,0 +1,407 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Asynchronous submission: validated jobs are appended to a local SQLite journal (the spool),
+and a background thread moves them into the database by batches.
+
+Jobs are removed from the spool only after a successful commit into the database, so nothing
+is lost if the process dies. If it dies between both commits, the jobs already in the database
+are recognised by their id and skipped on restart.
+A batch is claimed in a short SQLite transaction before being persisted, and removed in another
+one afterwards, so several processes can share the same spool without holding its write lock
+while the database is reached. Claims left by a dead process expire after a while.
+Jobs that can not be persisted are kept, marked as failed, for SpoolFailedRetention seconds,
+so their failure can be reported.
+"""
+
+import cPickle
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+
+from paste.deploy.converters import asbool
+from sqlalchemy.exc import OperationalError
+
+from fts3.model import Job, File, DataManagement
+from fts3rest.lib.bulk_insert import bulk_insert
+from fts3rest.lib.optimizer_active import ensure_pairs, remember_pairs
+from fts3rest.model.meta import Session
+
+log = logging.getLogger(__name__)
+
+
+DEFAULT_SPOOL_PATH = '/var/lib/fts3/spool.db'
+DEFAULT_SPOOL_BATCH_SIZE = 10000
+DEFAULT_SPOOL_INTERVAL = 1
+DEFAULT_SPOOL_CLAIM_TIMEOUT = 600
+DEFAULT_SPOOL_FAILED_RETENTION = 7 * 24 * 3600
+# Seconds between purges of the failed jobs
+SPOOL_PURGE_INTERVAL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS t_spool (
+    seq     INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id  TEXT NOT NULL UNIQUE,
+    n_files INTEGER NOT NULL,
+    job     BLOB NOT NULL,
+    files   BLOB NOT NULL,
+    error   TEXT,
+    claimed REAL,
+    failed  REAL
+)
+"""
+
+_spool = None
+
+
+class SpooledJob(object):
+    """
+    A job waiting in the spool
+    """
+
+    def __init__(self, job, files=None, datamanagement=None, error=None):
+        self.job = job
+        self.files = files
+        self.datamanagement = datamanagement
+        self.error = error
+
+    @property
+    def job_id(self):
+        return self.job['job_id']
+
+
+def _dumps(value):
+    return sqlite3.Binary(cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL))
+
+
+def _loads(value):
+    return cPickle.loads(str(value))
+
+
+class Spool(object):
+    """
+    Durable journal of accepted jobs
+    """
+
+    def __init__(self, path, timeout=30, claim_timeout=DEFAULT_SPOOL_CLAIM_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.claim_timeout = claim_timeout
+        self.writer = None
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute(_SCHEMA)
+        # Spools created by previous versions
+        columns = map(lambda c: c[1], connection.execute('PRAGMA table_info(t_spool)'))
+        for column in ('claimed', 'failed'):
+            if column not in columns:
+                connection.execute('ALTER TABLE t_spool ADD COLUMN %s REAL' % column)
+
+    def _connection(self):
+        # sqlite3 connections can not be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=FULL')
+            self._local.connection = connection
+        return connection
+
+    def append(self, job, files, datamanagement):
+        """
+        Durably store the job, its transfers and data management operations
+        """
+        self._connection().execute(
+            'INSERT INTO t_spool (job_id, n_files, job, files) VALUES (?, ?, ?, ?)',
+            (job['job_id'], len(files) + len(datamanagement), _dumps(job), _dumps((files, datamanagement)))
+        )
+        if self.writer is not None:
+            self.writer.wake()
+
+    def get(self, job_id, with_files=False):
+        """
+        Returns the SpooledJob with the given id, or None if it is not in the spool
+        """
+        if with_files:
+            query = 'SELECT job, error, files FROM t_spool WHERE job_id = ?'
+        else:
+            query = 'SELECT job, error FROM t_spool WHERE job_id = ?'
+        row = self._connection().execute(query, (job_id,)).fetchone()
+        if row is None:
+            return None
+        spooled = SpooledJob(_loads(row[0]), error=row[1])
+        if with_files:
+            spooled.files, spooled.datamanagement = _loads(row[2])
+        return spooled
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM t_spool WHERE error IS NULL').fetchone()[0]
+
+    def _claim(self, connection, max_files):
+        """
+        Mark the oldest unclaimed jobs as in flight, and return them as a list of (seq, SpooledJob)
+        """
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = connection.execute(
+                'SELECT seq, n_files, job, files FROM t_spool'
+                ' WHERE error IS NULL AND (claimed IS NULL OR claimed < ?) ORDER BY seq',
+                (now - self.claim_timeout,)
+            )
+            batch = list()
+            n_files = 0
+            for (seq, count, job, files) in cursor:
+                if batch and n_files + count > max_files:
+                    break
+                files, datamanagement = _loads(files)
+                batch.append((seq, SpooledJob(_loads(job), files, datamanagement)))
+                n_files += count
+            cursor.close()
+            connection.executemany(
+                'UPDATE t_spool SET claimed = ? WHERE seq = ?', map(lambda (seq, spooled): (now, seq), batch)
+            )
+            connection.execute('COMMIT')
+        except:
+            connection.execute('ROLLBACK')
+            raise
+        return batch
+
+    def drain(self, persist, max_files=DEFAULT_SPOOL_BATCH_SIZE):
+        """
+        Pass the oldest jobs to persist, up to max_files transfers (but at least one job),
+        and remove them from the spool if persist does not raise.
+        The SQLite write lock is not held while persist runs.
+
+        Args:
+            persist:   Called with a list of SpooledJob. It returns a dictionary job_id => error
+                       for those jobs that can not be persisted at all, which are kept
+                       in the spool, marked as failed. Those whose error is None could not be
+                       persisted this time, and are retried later
+            max_files: Maximum number of transfers to pass in one go
+
+        Returns:
+            The number of jobs taken from the spool, persisted or failed
+        """
+        connection = self._connection()
+        batch = self._claim(connection, max_files)
+        if not batch:
+            return 0
+
+        try:
+            errors = persist(map(lambda (seq, spooled): spooled, batch))
+        except:
+            # Give them back, so they are retried
+            connection.executemany(
+                'UPDATE t_spool SET claimed = NULL WHERE seq = ?', map(lambda (seq, spooled): (seq,), batch)
+            )
+            raise
+
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            taken = 0
+            for (seq, spooled) in batch:
+                if spooled.job_id not in errors:
+                    connection.execute('DELETE FROM t_spool WHERE seq = ?', (seq,))
+                    taken += 1
+                elif errors[spooled.job_id] is None:
+                    # Give it back, so it is retried
+                    connection.execute('UPDATE t_spool SET claimed = NULL WHERE seq = ?', (seq,))
+                else:
+                    connection.execute(
+                        'UPDATE t_spool SET error = ?, failed = ?, claimed = NULL WHERE seq = ?',
+                        (errors[spooled.job_id], now, seq)
+                    )
+                    taken += 1
+            connection.execute('COMMIT')
+        except:
+            connection.execute('ROLLBACK')
+            raise
+        return taken
+
+    def purge(self, retention=DEFAULT_SPOOL_FAILED_RETENTION):
+        """
+        Remove the jobs that failed more than retention seconds ago
+        Returns how many have been removed
+        """
+        cursor = self._connection().execute(
+            'DELETE FROM t_spool WHERE error IS NOT NULL AND (failed IS NULL OR failed < ?)',
+            (time.time() - retention,)
+        )
+        return cursor.rowcount
+
+
+def _insert(spooled_jobs, session):
+    """
+    Insert the jobs, skipping those already in the database.
+    Returns the new pairs sent to t_optimize_active
+    """
+    job_ids = map(lambda s: s.job_id, spooled_jobs)
+    existing = set(map(lambda j: j[0], session.query(Job.job_id).filter(Job.job_id.in_(job_ids))))
+    spooled_jobs = filter(lambda s: s.job_id not in existing, spooled_jobs)
+    if not spooled_jobs:
+        return []
+
+    bulk_insert(Job.__table__, map(lambda s: s.job, spooled_jobs), session=session)
+    bulk_insert(File.__table__, itertools.chain(*map(lambda s: s.files, spooled_jobs)), session=session)
+    bulk_insert(
+        DataManagement.__table__, itertools.chain(*map(lambda s: s.datamanagement, spooled_jobs)),
+        session=session
+    )
+
+    pairs = set()
+    for spooled in spooled_jobs:
+        for f in spooled.files:
+            pairs.add((f['source_se'], f['dest_se']))
+    return ensure_pairs(pairs, session=session)
+
+
+def _is_transient(e):
+    """
+    True if the error may go away by itself (i.e. deadlock, lock wait timeout, lost connection)
+    """
+    return isinstance(e, OperationalError) or getattr(e, 'connection_invalidated', False)
+
+
+def _check_connection(session):
+    """
+    Raise if the database can not be reached
+    """
+    try:
+        session.execute('SELECT 1')
+    finally:
+        session.rollback()
+
+
+def persist(spooled_jobs, session=Session):
+    """
+    Insert the spooled jobs into the database, all of them in one transaction.
+    If that fails, they are inserted one by one, so one bad job does not block the others.
+    Jobs that fail while the database can still be reached are reported as failed, unless the
+    error is transient, and then they are retried later. If the database is unavailable,
+    the error is raised, so all of them are retried later.
+
+    Returns:
+        A dictionary job_id => error for the jobs that could not be inserted.
+        The error is None for those that must be retried
+    """
+    if len(spooled_jobs) > 1:
+        try:
+            new_pairs = _insert(spooled_jobs, session)
+            session.commit()
+            remember_pairs(new_pairs)
+            return dict()
+        except Exception:
+            session.rollback()
+
+    errors = dict()
+    for spooled in spooled_jobs:
+        try:
+            new_pairs = _insert([spooled], session)
+            session.commit()
+            remember_pairs(new_pairs)
+        except Exception, e:
+            session.rollback()
+            if _is_transient(e):
+                log.warning("Could not persist the spooled job %s, will retry: %s" % (spooled.job_id, str(e)))
+                errors[spooled.job_id] = None
+            else:
+                log.error("Could not persist the spooled job %s: %s" % (spooled.job_id, str(e)))
+                errors[spooled.job_id] = str(e)
+
+    if errors:
+        _check_connection(session)
+    return errors
+
+
+class SpoolWriter(threading.Thread):
+    """
+    Background thread that moves the jobs from the spool into the database
+    """
+
+    def __init__(self, spool, batch_size=DEFAULT_SPOOL_BATCH_SIZE, interval=DEFAULT_SPOOL_INTERVAL,
+                 failed_retention=DEFAULT_SPOOL_FAILED_RETENTION):
+        super(SpoolWriter, self).__init__(name='SpoolWriter')
+        self.daemon = True
+        self.spool = spool
+        self.batch_size = batch_size
+        self.interval = interval
+        self.failed_retention = failed_retention
+        self._last_purge = 0
+        self._wake = threading.Event()
+
+    def wake(self):
+        self._wake.set()
+
+    def run(self):
+        log.info("Spool writer started for %s" % self.spool.path)
+        while True:
+            drained = 0
+            try:
+                if time.time() - self._last_purge >= SPOOL_PURGE_INTERVAL:
+                    self._last_purge = time.time()
+                    purged = self.spool.purge(self.failed_retention)
+                    if purged:
+                        log.info("%d failed spooled jobs purged" % purged)
+                drained = self.spool.drain(persist, self.batch_size)
+                if drained:
+                    log.debug("%d spooled jobs persisted" % drained)
+            except Exception, e:
+                log.error("Could not drain the spool: %s" % str(e))
+            finally:
+                Session.remove()
+            # Go on while there is something, sleep otherwise
+            if not drained:
+                self._wake.wait(self.interval)
+                self._wake.clear()
+
+
+def setup_spool(config):
+    """
+    If asynchronous submission is enabled, open the spool and start the writer.
+    Whatever was left in the spool by a previous run is persisted first.
+    """
+    global _spool
+    if not asbool(config.get('fts3.AsyncSubmission', False)):
+        return None
+    spool = Spool(config.get('fts3.SpoolPath', DEFAULT_SPOOL_PATH))
+    spool.writer = SpoolWriter(
+        spool,
+        batch_size=int(config.get('fts3.SpoolBatchSize', DEFAULT_SPOOL_BATCH_SIZE)),
+        interval=float(config.get('fts3.SpoolInterval', DEFAULT_SPOOL_INTERVAL)),
+        failed_retention=int(config.get('fts3.SpoolFailedRetention', DEFAULT_SPOOL_FAILED_RETENTION))
+    )
+    spool.writer.start()
+    _spool = spool
+    return spool
+
+
+def get_spool():
+    """
+    Returns the spool, or None if submissions are synchronous
+    """
+    return _spool
+
+
+def set_spool(spool):
+    """
+    Replace the spool (i.e. tests)
+    """
+    global _spool
+    _spool = spool
@@ -0,0 +1,142 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Parsing of the SURLs on the submission path.
+Submissions repeat the same urls (i.e. one destination for several sources) and,
+above all, the same hosts, so both the parsed urls and the storage elements are
+kept in bounded LRU caches shared by the whole process
+"""
+
+import threading
+import urlparse
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+
+DEFAULT_SURL_CACHE_SIZE = 10000
+DEFAULT_STORAGE_CACHE_SIZE = 1000
+
+
+class LRUCache(object):
+    """
+    Thread safe dictionary that keeps, at most, the 'capacity' most recently used entries
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        self._lock.acquire()
+        try:
+            value = self._entries.pop(key)
+            self._entries[key] = value
+            return value
+        except KeyError:
+            return default
+        finally:
+            self._lock.release()
+
+    def put(self, key, value):
+        self._lock.acquire()
+        try:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Surl(object):
+    """
+    A parsed and validated SURL
+
+    Attributes:
+        parsed:  The urlparse result
+        url:     The url, as it is stored in the database
+        storage: The storage element: scheme + hostname, without the port
+    """
+    __slots__ = ('parsed', 'url', 'storage')
+
+    def __init__(self, parsed, storage):
+        self.parsed = parsed
+        self.url = parsed.geturl()
+        self.storage = storage
+
+
+_surls = LRUCache(DEFAULT_SURL_CACHE_SIZE)
+_storages = LRUCache(DEFAULT_STORAGE_CACHE_SIZE)
+
+
+def validate_url(url):
+    """
+    Validates the format and content of the url
+    """
+    if not url.scheme:
+        raise ValueError('Missing scheme (%s)' % url.geturl())
+    if url.scheme == 'file':
+        raise ValueError('Can not transfer local files (%s)' % url.geturl())
+    if not url.path or (url.path == '/' and not url.query):
+        raise ValueError('Missing path (%s)' % url.geturl())
+    if not url.hostname or url.hostname == '':
+        raise ValueError('Missing host (%s)' % url.geturl())
+
+
+def get_storage_element(url):
+    """
+    Returns the storage element of the given url, which is the scheme + hostname without the port.
+    The same string is returned for all the urls with the same scheme and network location
+
+    Args:
+        url: An urlparse instance
+    """
+    key = (url.scheme, url.netloc)
+    storage = _storages.get(key)
+    if storage is None:
+        storage = "%s://%s" % (url.scheme, url.hostname)
+        _storages.put(key, storage)
+    return storage
+
+
+def parse_surl(surl):
+    """
+    Parses and validates surl. Raises ValueError if it is not valid.
+
+    Returns:
+        A Surl instance
+    """
+    parsed_surl = _surls.get(surl)
+    if parsed_surl is None:
+        parsed = urlparse.urlparse(surl)
+        validate_url(parsed)
+        parsed_surl = Surl(parsed, get_storage_element(parsed))
+        _surls.put(surl, parsed_surl)
+    return parsed_surl
@@ -0,0 +1,213 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Admission control for the submissions: token buckets per VO and per user DN,
+for jobs and for files per second.
+
+A job is admitted if there is one job token left, and the files buckets are not in debt.
+The number of files is only known once the job has been expanded, so they are charged
+afterwards, and a big job can leave the files buckets in debt, delaying the next submissions.
+The buckets are kept by each process.
+"""
+
+import threading
+import time
+
+import pylons
+
+
+DEFAULT_THROTTLE_BURST = 10
+# When there are more buckets than this, those that are full are dropped
+MAX_BUCKETS = 10000
+
+# (scope, unit) => configuration key with the rate per second
+_RATE_KEYS = {
+    ('vo', 'jobs'): 'fts3.ThrottleVoJobs',
+    ('vo', 'files'): 'fts3.ThrottleVoFiles',
+    ('dn', 'jobs'): 'fts3.ThrottleDnJobs',
+    ('dn', 'files'): 'fts3.ThrottleDnFiles',
+}
+
+_throttle = None
+_throttle_lock = threading.Lock()
+
+
+class TokenBucket(object):
+    """
+    Holds up to capacity tokens, refilled at rate tokens per second.
+    The tokens can go below zero when charging more than what is available
+    """
+    __slots__ = ('rate', 'capacity', 'tokens', 'timestamp')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.timestamp = now
+
+    def refill(self, now):
+        if now > self.timestamp:
+            self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+            self.timestamp = now
+        return self.tokens
+
+    def wait_for(self, amount, now):
+        """
+        Seconds until amount tokens are available. 0 if they are already
+        """
+        missing = amount - self.refill(now)
+        if missing <= 0:
+            return 0
+        return missing / self.rate
+
+    def is_full(self, now):
+        return self.refill(now) >= self.capacity
+
+
+class Throttle(object):
+    """
+    Token buckets per VO and per user DN
+    """
+
+    def __init__(self, rates, burst=DEFAULT_THROTTLE_BURST):
+        """
+        Args:
+            rates: Dictionary (scope, unit) => tokens per second, where scope is 'vo' or 'dn',
+                   and unit 'jobs' or 'files'. Missing or 0 means no limit
+            burst: The buckets hold up to this many seconds of tokens
+        """
+        self.rates = dict(filter(lambda (k, v): v > 0, rates.iteritems()))
+        self.burst = burst
+        self._buckets = dict()
+        self._lock = threading.Lock()
+
+    def _bucket(self, scope, name, unit, now):
+        rate = self.rates.get((scope, unit), None)
+        if rate is None:
+            return None
+        key = (scope, name, unit)
+        bucket = self._buckets.get(key, None)
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._purge(now)
+            bucket = TokenBucket(rate, max(1.0, rate * self.burst), now)
+            self._buckets[key] = bucket
+        return bucket
+
+    def _purge(self, now):
+        for (key, bucket) in self._buckets.items():
+            if bucket.is_full(now):
+                del self._buckets[key]
+
+    def admit(self, vo, dn, now=None):
+        """
+        Try to admit a new job from the given vo and dn.
+        If it is admitted, a job token is taken from each bucket.
+
+        Returns:
+            None if the job is admitted. Otherwise, a tuple (scope, unit, seconds to wait)
+        """
+        if not self.rates:
+            return None
+        if now is None:
+            now = time.time()
+        self._lock.acquire()
+        try:
+            job_buckets = list()
+            for (scope, name) in (('vo', vo), ('dn', dn)):
+                bucket = self._bucket(scope, name, 'jobs', now)
+                if bucket is not None:
+                    wait = bucket.wait_for(1, now)
+                    if wait > 0:
+                        return scope, 'jobs', wait
+                    job_buckets.append(bucket)
+                bucket = self._bucket(scope, name, 'files', now)
+                if bucket is not None:
+                    wait = bucket.wait_for(0, now)
+                    if wait > 0:
+                        return scope, 'files', wait
+            for bucket in job_buckets:
+                bucket.tokens -= 1
+            return None
+        finally:
+            self._lock.release()
+
+    def charge_files(self, vo, dn, n_files, now=None):
+        """
+        Take n_files tokens from the files buckets of vo and dn
+        """
+        if not self.rates:
+            return
+        if now is None:
+            now = time.time()
+        self._lock.acquire()
+        try:
+            for (scope, name) in (('vo', vo), ('dn', dn)):
+                bucket = self._bucket(scope, name, 'files', now)
+                if bucket is not None:
+                    bucket.refill(now)
+                    bucket.tokens -= n_files
+        finally:
+            self._lock.release()
+
+    def state(self, now=None):
+        """
+        Returns the limits, and the current state of the buckets
+        """
+        if now is None:
+            now = time.time()
+        self._lock.acquire()
+        try:
+            buckets = list()
+            for ((scope, name, unit), bucket) in self._buckets.iteritems():
+                buckets.append(dict(
+                    scope=scope, name=name, unit=unit,
+                    rate=bucket.rate, capacity=bucket.capacity, tokens=bucket.refill(now)
+                ))
+        finally:
+            self._lock.release()
+        limits = list()
+        for ((scope, unit), rate) in self.rates.iteritems():
+            limits.append(dict(scope=scope, unit=unit, rate=rate))
+        return dict(burst=self.burst, limits=limits, buckets=buckets)
+
+
+def get_throttle():
+    """
+    Returns the process throttle, created from the configuration the first time
+    """
+    global _throttle
+    if _throttle is None:
+        _throttle_lock.acquire()
+        try:
+            if _throttle is None:
+                rates = dict()
+                for (key, option) in _RATE_KEYS.iteritems():
+                    rates[key] = float(pylons.config.get(option, 0))
+                burst = float(pylons.config.get('fts3.ThrottleBurst', DEFAULT_THROTTLE_BURST))
+                _throttle = Throttle(rates, burst)
+        finally:
+            _throttle_lock.release()
+    return _throttle
+
+
+def set_throttle(throttle):
+    """
+    Replace the process throttle (i.e. tests). If None, it will be created again from
+    the configuration
+    """
+    global _throttle
+    _throttle = throttle
@@ -38,8 +38,12 @@ from routes.util import URLGenerator
 from webtest import TestApp
 
 from fts3rest.lib.middleware import fts3auth
+from fts3rest.lib.banned_ses import invalidate_bans
 from fts3rest.lib.base import Session
-from fts3.model import Credential, CredentialCache, Job, File, FileRetryLog, OptimizerActive
+from fts3rest.lib.delegation_cache import clear_credentials, invalidate_credential
+from fts3rest.lib.optimizer_active import forget_pairs
+from fts3rest.lib.throttling import set_throttle
+from fts3.model import Credential, CredentialCache, Job, JobCancellation, File, FileRetryLog, OptimizerActive
 
 
 __all__ = ['environ', 'url', 'TestController']
@@ -124,6 +128,7 @@ class TestController(TestCase):
 
         Session.merge(delegated)
         Session.commit()
+        invalidate_credential(delegated.dlg_id, delegated.dn)
 
     def pop_delegation(self):
         """
@@ -135,6 +140,7 @@ class TestController(TestCase):
             if delegated:
                 Session.delete(delegated)
                 Session.commit()
+                invalidate_credential(cred.delegation_id, cred.user_dn)
 
     def get_x509_proxy(self, request_pem, issuer=None, subject=None, private_key=None):
         """
@@ -206,10 +212,15 @@ class TestController(TestCase):
         Session.query(Credential).delete()
         Session.query(CredentialCache).delete()
         Session.query(FileRetryLog).delete()
+        Session.query(JobCancellation).delete()
         Session.query(File).delete()
         Session.query(Job).delete()
         Session.query(OptimizerActive).delete()
         Session.commit()
+        forget_pairs()
+        invalidate_bans()
+        clear_credentials()
+        set_throttle(None)
 
     # Handy asserts not available in the EPEL-6 version
     def assertGreater(self, a, b):
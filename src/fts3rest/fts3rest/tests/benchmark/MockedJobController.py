@@ -17,6 +17,7 @@
 
 from datetime import datetime, timedelta
 from paste.registry import Registry
+from StringIO import StringIO
 from pylons import request, response
 
 from fts3.model import Credential
@@ -30,7 +31,7 @@ class MockCredentials:
         self.delegation_id = '12345'
         self.user_dn = '/DN=1234'
         self.voms_cred = []
-        self.vos = []
+        self.vos = ['benchmark']
 
     def get_granted_level_for(self, operation):
         return fts3auth.constants.ALL
@@ -41,6 +42,11 @@ class MockRequest(object):
         self.environ = {
             'fts3.User.Credentials': MockCredentials()
         }
+        self.body = ''
+
+    @property
+    def body_file(self):
+        return StringIO(self.body)
 
 
 class MockResponse(object):
@@ -48,6 +54,10 @@ class MockResponse(object):
         self.headers = {}
 
 
+def mock_start_response(status, headers):
+    pass
+
+
 class MockedJobController(JobsController):
     """
     Inherit from JobsController and mock some required objects
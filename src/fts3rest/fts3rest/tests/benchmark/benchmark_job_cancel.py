@@ -23,7 +23,7 @@ from sqlalchemy.exc import SQLAlchemyError
 import json
 from datetime import datetime
 
-from MockedJobController import MockedJobController, request
+from MockedJobController import MockedJobController, mock_start_response, request
 from QueryCounter import QueryCounter
 from util import *
 
@@ -39,7 +39,7 @@ def submit_job(files_number):
         })
     request.method = 'PUT'
     request.body = json.dumps({'files': files})
-    response = job_controller.submit()
+    response = job_controller.submit(mock_start_response)
     job_id = json.loads(response[0])['job_id']
 
     return job_id
@@ -54,7 +54,7 @@ def benchmark_cancel(files_number, callgraph_output):
         cancel_method = ProfiledFunction(cancel_method)
 
     start = datetime.utcnow()
-    cancel_method(job_id)
+    cancel_method(job_id, mock_start_response)
     end = datetime.utcnow()
 
     duration = end - start
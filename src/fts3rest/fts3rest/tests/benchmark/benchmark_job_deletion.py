@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from datetime import datetime
+from optparse import OptionParser
+from sqlalchemy.exc import SQLAlchemyError
+import sys
+
+from MockedJobController import MockedJobController, mock_start_response, request
+from QueryCounter import QueryCounter
+from util import *
+
+
+def build_deletion(entries_number, duplicates):
+    """
+    Build the body of a deletion job. The params go first, so the list can be streamed.
+    One of each 'duplicates' entries is repeated
+    """
+    surls = list()
+    for i in xrange(entries_number):
+        if duplicates and i % duplicates == 0 and i > 0:
+            surls.append('"gsiftp://se%d.example.com/path/file.%d"' % ((i - 1) % 10, i - 1))
+        else:
+            surls.append('"gsiftp://se%d.example.com/path/file.%d"' % (i % 10, i))
+    return '{"params": {}, "delete": [%s]}' % ','.join(surls)
+
+
+def benchmark_deletion(entries_number, duplicates, callgraph_output):
+    job_controller = MockedJobController()
+    controller_method = job_controller.submit
+    if callgraph_output:
+        controller_method = ProfiledFunction(controller_method)
+
+    request.method = 'PUT'
+    request.body = build_deletion(entries_number, duplicates)
+
+    start = datetime.utcnow()
+    controller_method(mock_start_response)
+    end = datetime.utcnow()
+
+    if callgraph_output:
+        controller_method.generate_callgraph(callgraph_output)
+
+    duration = end - start
+    duration_seconds = duration.seconds + (duration.microseconds / 1000000.0)
+    return duration_seconds, entries_number / duration_seconds
+
+
+if __name__ == "__main__":
+    opt_parser = OptionParser()
+    opt_parser.add_option("-d", "--database", dest="database",
+                          default="sqlite:////tmp/fts3_benchmark.db",
+                          help="Database connection string")
+    opt_parser.add_option("-e", "--entries", dest="entries", default="1000,10000,100000,1000000",
+                          help="Comma separated list of the number of entries of each deletion job")
+    opt_parser.add_option("--duplicates", dest="duplicates", type="int", default=0,
+                          help="Repeat one of each N entries")
+    opt_parser.add_option("--log-queries", dest="log_queries", action="store_true", default=False,
+                          help="Enable verbose output of the queries generated by SqlAlchemy")
+    opt_parser.add_option("--force", dest="force", action="store_true", default=False,
+                          help="Forces the execution, skip the confirmation question")
+    opt_parser.add_option("--callgraph", dest="callgraph", default=None,
+                          help="Generated callgraph")
+    (opts, args) = opt_parser.parse_args()
+
+    log = setup_logging(opts.log_queries)
+
+    try:
+        sizes = map(int, opts.entries.split(','))
+        log.info("Starting benchmark with deletion jobs of %s entries" % ', '.join(map(str, sizes)))
+        log.warning("This will modify the database!")
+
+        query_counter = QueryCounter()
+        setup_database(opts.database, proxy=query_counter)
+
+        if not opts.force:
+            log.warning("Are you sure? (Type Yes)")
+            if sys.stdin.readline().strip().lower() != "yes":
+                log.critical("Aborted!")
+                sys.exit(1)
+        else:
+            log.warning("--force specified, no confirmation required")
+
+        # If the deletion scales linearly, the time per entry must be roughly constant
+        log.info("{0: >10}\t{1: >10}\t{2: >12}\t{3: >10}".format(
+            'Entries', 'Seconds', 'Entries/sec', 'us/entry'
+        ))
+        for entries_number in sizes:
+            duration, entries_per_sec = benchmark_deletion(entries_number, opts.duplicates, opts.callgraph)
+            log.info("{0: >10}\t{1: >10.2f}\t{2: >12.2f}\t{3: >10.2f}".format(
+                entries_number, duration, entries_per_sec, 1000000.0 / entries_per_sec
+            ))
+
+        log.info("Query count:")
+        for (query, count) in query_counter:
+            log.info("\t{0: <8}\t{1}".format(query, count))
+    except SQLAlchemyError, e:
+        log.error("SQLAlchemy error: " + str(e))
@@ -23,7 +23,7 @@ from sqlalchemy.exc import SQLAlchemyError
 import json
 import sys
 
-from MockedJobController import MockedJobController, request
+from MockedJobController import MockedJobController, mock_start_response, request
 from QueryCounter import QueryCounter
 from util import *
 
@@ -45,7 +45,7 @@ def benchmark_submission(job_number, files_number, callgraph_output):
         request.method = 'PUT'
         request.body = json.dumps({'files': files})
         start = datetime.utcnow()
-        controller_method()
+        controller_method(mock_start_response)
         end = datetime.utcnow()
         duration += (end - start)
 
@@ -0,0 +1,218 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import os
+import tempfile
+
+from fts3rest.tests import TestController
+from fts3rest.lib.base import Session
+from fts3rest.lib.middleware.fts3auth import UserCredentials
+from fts3rest.lib import spool
+from fts3rest.lib.spool import Spool, get_spool, set_spool, persist
+from fts3.model import DataManagement, File, Job, OptimizerActive
+from sqlalchemy.exc import OperationalError
+
+
+class TestAsyncSubmission(TestController):
+    """
+    Submissions accepted into the spool, and persisted afterwards
+    """
+
+    def setUp(self):
+        fd, self.spool_path = tempfile.mkstemp(prefix='fts3-spool-', suffix='.db')
+        os.close(fd)
+        set_spool(Spool(self.spool_path))
+        self.setup_gridsite_environment()
+        self.push_delegation()
+
+    def tearDown(self):
+        set_spool(None)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.spool_path + suffix):
+                os.unlink(self.spool_path + suffix)
+        TestController.tearDown(self)
+
+    def _submit(self, n_files=2):
+        job = {
+            'files': [
+                {
+                    'sources': ['root://source.es/file%d' % i],
+                    'destinations': ['root://dest.ch/file%d' % i],
+                }
+                for i in xrange(n_files)
+            ],
+            'params': {'overwrite': True}
+        }
+        answer = self.app.put(url="/jobs", params=json.dumps(job), status=202)
+        return str(json.loads(answer.body)['job_id'])
+
+    def test_accept_and_persist(self):
+        """
+        The job is accepted, reported as such, and persisted once the spool is drained
+        """
+        job_id = self._submit()
+
+        self.assertEqual(None, Session.query(Job).get(job_id))
+        self.assertEqual(1, len(get_spool()))
+
+        job = json.loads(self.app.get(url="/jobs/%s?files=source_surl" % job_id, status=200).body)
+        self.assertEqual(job_id, job['job_id'])
+        self.assertEqual('ACCEPTED', job['job_state'])
+        self.assertEqual(
+            ['root://source.es/file0', 'root://source.es/file1'],
+            sorted(map(lambda f: f['source_surl'], job['files']))
+        )
+
+        self.assertEqual(1, get_spool().drain(persist))
+        self.assertEqual(0, len(get_spool()))
+
+        db_job = Session.query(Job).get(job_id)
+        self.assertEqual('SUBMITTED', db_job.job_state)
+        self.assertEqual('root://source.es', db_job.source_se)
+        self.assertEqual(2, len(db_job.files))
+        self.assertIsNotNone(Session.query(OptimizerActive).get(('root://source.es', 'root://dest.ch')))
+
+        job = json.loads(self.app.get(url="/jobs/%s" % job_id, status=200).body)
+        self.assertEqual('SUBMITTED', job['job_state'])
+
+    def test_batch(self):
+        """
+        Several jobs are persisted in one go, up to the given number of files
+        """
+        job_ids = [self._submit(2), self._submit(2), self._submit(2)]
+
+        self.assertEqual(2, get_spool().drain(persist, max_files=4))
+        self.assertEqual(1, len(get_spool()))
+        self.assertEqual(1, get_spool().drain(persist, max_files=4))
+        self.assertEqual(0, get_spool().drain(persist, max_files=4))
+
+        for job_id in job_ids:
+            self.assertEqual(2, Session.query(File).filter(File.job_id == job_id).count())
+
+    def test_deletion(self):
+        """
+        Deletion jobs go through the spool too
+        """
+        job = {'delete': ['root://source.es/file', 'root://source.es/file2']}
+        answer = self.app.put(url="/jobs", params=json.dumps(job), status=202)
+        job_id = str(json.loads(answer.body)['job_id'])
+
+        get_spool().drain(persist)
+        self.assertEqual(2, Session.query(DataManagement).filter(DataManagement.job_id == job_id).count())
+
+    def test_invalid_not_spooled(self):
+        """
+        Invalid submissions are still rejected right away
+        """
+        job = {'files': [{'sources': ['root://source.es/file'], 'destinations': ['/dest/file']}]}
+        self.app.put(url="/jobs", params=json.dumps(job), status=400)
+        self.assertEqual(0, len(get_spool()))
+
+    def test_recovery(self):
+        """
+        If the process dies after committing into the database, but before removing the
+        jobs from the spool, they must not be inserted twice
+        """
+        job_id = self._submit()
+
+        # Persist, but leave it in the spool
+        def persist_and_die(spooled_jobs):
+            persist(spooled_jobs)
+            raise KeyboardInterrupt()
+        self.assertRaises(KeyboardInterrupt, get_spool().drain, persist_and_die)
+        self.assertEqual(1, len(get_spool()))
+
+        # Restart
+        set_spool(Spool(self.spool_path))
+        self.assertEqual(1, get_spool().drain(persist))
+        self.assertEqual(0, len(get_spool()))
+        self.assertEqual(2, Session.query(File).filter(File.job_id == job_id).count())
+
+    def test_not_locked_while_persisting(self):
+        """
+        Other processes can append to the spool while a batch is being persisted
+        """
+        self._submit()
+        other = Spool(self.spool_path, timeout=0)
+
+        def persist_and_append(spooled_jobs):
+            other.append({'job_id': 'appended-meanwhile'}, [], [])
+            return persist(spooled_jobs)
+        self.assertEqual(1, get_spool().drain(persist_and_append))
+        self.assertEqual(1, len(get_spool()))
+        self.assertIsNotNone(get_spool().get('appended-meanwhile'))
+
+    def test_bad_job(self):
+        """
+        A job that can not be inserted while the database is available is marked as failed,
+        and not retried, even when it is alone
+        """
+        files = [{'file_id': 42, 'source_se': 'root://source.es', 'dest_se': 'root://dest.ch'}] * 2
+        get_spool().append({'job_id': 'bad-job', 'job_state': 'SUBMITTED'}, files, [])
+
+        self.assertEqual(1, get_spool().drain(persist))
+        self.assertEqual(0, len(get_spool()))
+        self.assertIsNotNone(get_spool().get('bad-job').error)
+        self.assertEqual(0, get_spool().drain(persist))
+        self.assertEqual(None, Session.query(Job).get('bad-job'))
+
+    def test_transient_error(self):
+        """
+        A job that fails with a transient error (i.e. a deadlock) is retried, and not marked as failed
+        """
+        job_id = self._submit()
+
+        original_insert = spool._insert
+
+        def deadlock(spooled_jobs, session):
+            raise OperationalError('INSERT', {}, Exception('Deadlock found when trying to get lock'))
+        spool._insert = deadlock
+        try:
+            self.assertEqual({job_id: None}, persist([get_spool().get(job_id, with_files=True)]))
+            self.assertEqual(0, get_spool().drain(persist))
+        finally:
+            spool._insert = original_insert
+
+        self.assertEqual(1, len(get_spool()))
+        self.assertEqual(None, get_spool().get(job_id).error)
+        self.assertEqual(1, get_spool().drain(persist))
+        self.assertEqual('SUBMITTED', Session.query(Job).get(job_id).job_state)
+
+    def test_purge_failed(self):
+        """
+        Failed jobs are forgotten after a while
+        """
+        files = [{'file_id': 42, 'source_se': 'root://source.es', 'dest_se': 'root://dest.ch'}] * 2
+        get_spool().append({'job_id': 'bad-job', 'job_state': 'SUBMITTED'}, files, [])
+        self.assertEqual(1, get_spool().drain(persist))
+
+        self.assertEqual(0, get_spool().purge(3600))
+        self.assertIsNotNone(get_spool().get('bad-job'))
+        self.assertEqual(1, get_spool().purge(0))
+        self.assertEqual(None, get_spool().get('bad-job'))
+
+    def test_get_other_user(self):
+        """
+        Accepted jobs are subject to the same authorization as the persisted ones
+        """
+        job_id = self._submit()
+
+        old_granted = UserCredentials.get_granted_level_for
+        UserCredentials.get_granted_level_for = lambda self_, op: None
+        try:
+            self.app.get(url="/jobs/%s" % job_id, status=403)
+        finally:
+            UserCredentials.get_granted_level_for = old_granted
@@ -343,6 +343,26 @@ class TestBanning(TestController):
         }
         self.app.post(url="/jobs", content_type='application/json', params=json.dumps(job), status=403)
 
+    def test_unban_se_submit(self):
+        """
+        Ban a SE and unban it. Submissions must be accepted right away, even though the bans are cached
+        """
+        self.push_delegation()
+
+        job = {
+            'files': [{
+                'sources': ['gsiftp://source/path/'],
+                'destinations': ['gsiftp://destination/file'],
+            }]
+        }
+        self.app.post(url="/jobs", content_type='application/json', params=json.dumps(job), status=200)
+
+        self.app.post(url="/ban/se", params={'storage': 'gsiftp://source'}, status=200)
+        self.app.post(url="/jobs", content_type='application/json', params=json.dumps(job), status=403)
+
+        self.app.delete(url="/ban/se?storage=%s" % urllib.quote('gsiftp://source'), status=204)
+        self.app.post(url="/jobs", content_type='application/json', params=json.dumps(job), status=200)
+
     def test_ban_se_with_submission(self):
         """
         Ban a SE but allowing submissions
@@ -0,0 +1,141 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import zlib
+
+from fts3rest.lib.middleware.compression import Compression, get_encoding
+from fts3rest.tests import TestController
+
+
+class TestCompression(TestController):
+    """
+    Compression of the responses
+    """
+
+    def setUp(self):
+        self.setup_gridsite_environment()
+        self.push_delegation()
+        job = {
+            'files': [
+                {
+                    'sources': ['root://source.es/file%d' % i],
+                    'destinations': ['root://dest.ch/file%d' % i],
+                }
+                for i in xrange(50)
+            ]
+        }
+        answer = self.app.put(url="/jobs", params=json.dumps(job), status=200)
+        self.job_id = str(json.loads(answer.body)['job_id'])
+
+    def test_get_encoding(self):
+        """
+        The preferred accepted encoding is chosen
+        """
+        self.assertEqual('gzip', get_encoding('gzip, deflate'))
+        self.assertEqual('deflate', get_encoding('deflate'))
+        self.assertEqual('deflate', get_encoding('gzip;q=0, deflate'))
+        self.assertEqual('gzip', get_encoding('*'))
+        self.assertEqual(None, get_encoding('identity'))
+        self.assertEqual(None, get_encoding(''))
+
+    def test_gzip(self):
+        """
+        Big answers are compressed with gzip
+        """
+        plain = self.app.get(url="/jobs/%s/files" % self.job_id, status=200)
+        self.assertNotIn('Content-Encoding', plain.headers)
+
+        answer = self.app.get(
+            url="/jobs/%s/files" % self.job_id, headers={'Accept-Encoding': 'gzip'}, status=200
+        )
+        self.assertEqual('gzip', answer.headers['Content-Encoding'])
+        self.assertIn('Accept-Encoding', answer.headers['Vary'])
+        self.assertLess(len(answer.body), len(plain.body))
+        self.assertEqual(plain.body, zlib.decompress(answer.body, 16 + zlib.MAX_WBITS))
+
+    def test_deflate(self):
+        """
+        Big answers are compressed with deflate
+        """
+        plain = self.app.get(url="/jobs/%s/files" % self.job_id, status=200)
+        answer = self.app.get(
+            url="/jobs/%s/files" % self.job_id, headers={'Accept-Encoding': 'deflate'}, status=200
+        )
+        self.assertEqual('deflate', answer.headers['Content-Encoding'])
+        self.assertEqual(plain.body, zlib.decompress(answer.body))
+
+    def test_small_not_compressed(self):
+        """
+        Small answers are sent as they are
+        """
+        answer = self.app.get(
+            url="/jobs/%s/job_state" % self.job_id, headers={'Accept-Encoding': 'gzip'}, status=200
+        )
+        self.assertNotIn('Content-Encoding', answer.headers)
+        self.assertEqual('SUBMITTED', json.loads(answer.body))
+
+    def test_small_error(self):
+        """
+        Errors are still returned as json
+        """
+        answer = self.app.get(url="/jobs/1234-5678", headers={'Accept-Encoding': 'gzip'}, status=404)
+        self.assertNotIn('Content-Encoding', answer.headers)
+        self.assertIn('1234-5678', json.loads(answer.body)['message'])
+
+    def test_event_stream(self):
+        """
+        Event streams are sent as they are, even if the client accepts gzip
+        """
+        answer = self.app.get(
+            url="/jobs/events?job_id=%s&timeout=1" % self.job_id, headers={'Accept-Encoding': 'gzip'}, status=200
+        )
+        self.assertEqual('text/event-stream', answer.headers['Content-Type'])
+        self.assertNotIn('Content-Encoding', answer.headers)
+        self.assertIn(self.job_id, answer.body)
+
+    def test_event_stream_not_buffered(self):
+        """
+        Each event reaches the client as soon as it is produced
+        """
+        produced = list()
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/event-stream')])
+            for i in xrange(3):
+                produced.append(i)
+                yield 'data: %d\n\n' % i
+
+        middleware = Compression(app, {})
+        response = middleware({'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': 'gzip'}, lambda s, h, e=None: None)
+        self.assertEqual('data: 0\n\n', response.next())
+        self.assertEqual([0], produced)
+
+    def test_streamed_flushed(self):
+        """
+        Streamed responses without a known length are flushed chunk by chunk
+        """
+        chunks = ['[' + ', '.join(['{"file_state": "SUBMITTED"}'] * 100), ']']
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'application/json')])
+            for chunk in chunks:
+                yield chunk
+
+        middleware = Compression(app, {})
+        response = middleware({'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': 'deflate'}, lambda s, h, e=None: None)
+        decompressor = zlib.decompressobj()
+        self.assertEqual(chunks[0], decompressor.decompress(response.next()))
+        self.assertEqual(chunks[1], decompressor.decompress(''.join(response)))
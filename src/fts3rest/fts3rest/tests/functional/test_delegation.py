@@ -194,6 +194,28 @@ class TestDelegation(TestController):
         proxy = Session.query(Credential).get((creds.delegation_id, creds.user_dn))
         self.assertEqual(None, proxy)
 
+    def test_remove_delegation_submit(self):
+        """
+        Once the proxy is removed, submissions must be rejected, even though the credentials are cached
+        """
+        self.setup_gridsite_environment()
+        creds = self.get_user_credentials()
+
+        self.test_valid_proxy()
+
+        job = {
+            'files': [{
+                'sources': ['root://source.es/file'],
+                'destinations': ['root://dest.ch/file'],
+            }]
+        }
+        self.app.put(url="/jobs", params=json.dumps(job), status=200)
+
+        self.app.delete(url="/delegation/%s" % creds.delegation_id,
+                        status=204)
+
+        self.app.put(url="/jobs", params=json.dumps(job), status=419)
+
     def test_set_voms(self):
         """
         The server must regenerate a proxy with VOMS extensions
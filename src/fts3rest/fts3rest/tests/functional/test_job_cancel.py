@@ -15,11 +15,14 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+from datetime import datetime, timedelta
 import json
 
+from fts3rest.lib.cancellation import Canceller, get_canceller, set_canceller
 from fts3rest.tests import TestController
+from fts3rest.tests.functional.insert_job import insert_job
 from fts3rest.lib.base import Session
-from fts3.model import Job
+from fts3.model import File, Job, JobCancellation
 
 
 class TestJobCancel(TestController):
@@ -203,3 +206,333 @@ class TestJobCancel(TestController):
                 self.assertEqual(job['http_status'], '200 Ok')
             else:
                 self.assertEqual(job['http_status'], '404 Not Found')
+
+    def test_cancel_many(self):
+        """
+        Cancel several jobs at once, with their files
+        """
+        self.setup_gridsite_environment()
+        job_ids = [insert_job('testvo', 'gsiftp://source', 'gsiftp://destination', 'SUBMITTED') for i in xrange(3)]
+        answer = self.app.delete(url="/jobs/%s" % ','.join(job_ids), status=200)
+        jobs = json.loads(answer.body)
+
+        self.assertEqual(job_ids, map(lambda j: j['job_id'], jobs))
+        for job in jobs:
+            self.assertEqual('CANCELED', job['job_state'])
+            self.assertEqual('200 Ok', job['http_status'])
+        files = Session.query(File).filter(File.job_id.in_(job_ids))
+        self.assertEqual(['CANCELED'] * 3, map(lambda f: f.file_state, files))
+
+    def test_cancel_matching(self):
+        """
+        Cancel the active jobs that match a filter
+        """
+        self.setup_gridsite_environment()
+        matching = [
+            insert_job('dteam', 'gsiftp://source', 'gsiftp://destination', 'SUBMITTED'),
+            insert_job('dteam', 'gsiftp://source', 'gsiftp://destination', 'ACTIVE'),
+        ]
+        finished = insert_job('dteam', 'gsiftp://source', 'gsiftp://destination', 'FINISHED')
+        other_se = insert_job('dteam', 'gsiftp://other', 'gsiftp://destination', 'SUBMITTED')
+        other_vo = insert_job('atlas', 'gsiftp://source', 'gsiftp://destination', 'SUBMITTED')
+
+        answer = self.app.delete(url="/jobs?vo_name=dteam&source_se=gsiftp://source", status=200)
+        self.assertEqual(sorted(matching), sorted(json.loads(answer.body)))
+
+        for job_id in matching:
+            job = Session.query(Job).get(job_id)
+            self.assertEqual('CANCELED', job.job_state)
+            self.assertEqual('Job canceled by the administrator', job.reason)
+            self.assertEqual(['CANCELED'], map(lambda f: f.file_state, job.files))
+        self.assertEqual('FINISHED', Session.query(Job).get(finished).job_state)
+        self.assertEqual('SUBMITTED', Session.query(Job).get(other_se).job_state)
+        self.assertEqual('SUBMITTED', Session.query(Job).get(other_vo).job_state)
+
+    def test_cancel_matching_background(self):
+        """
+        Big jobs that match a filter are canceled in the background too
+        """
+        previous = get_canceller()
+        canceller = Canceller(threshold=3, chunk_size=2)
+        set_canceller(canceller)
+        try:
+            big_job_id = self._submit(5)
+            small_job_id = self._submit(1)
+
+            answer = self.app.delete(url="/jobs?vo_name=testvo", status=202)
+            self.assertEqual(sorted([big_job_id, small_job_id]), sorted(json.loads(answer.body)))
+
+            Session.expire_all()
+            self.assertEqual('CANCELED', Session.query(Job).get(big_job_id).job_state)
+            self.assertEqual(['SUBMITTED'] * 5, map(lambda f: f.file_state, self._get_files(big_job_id)))
+            self.assertEqual(['CANCELED'], map(lambda f: f.file_state, self._get_files(small_job_id)))
+
+            self.assertEqual(1, canceller.work())
+            Session.expire_all()
+            self.assertEqual(['CANCELED'] * 5, map(lambda f: f.file_state, self._get_files(big_job_id)))
+        finally:
+            set_canceller(previous)
+
+    def test_cancel_matching_no_filter(self):
+        """
+        Cancelling everything is not allowed
+        """
+        self.setup_gridsite_environment()
+        self.app.delete(url="/jobs", status=400)
+
+    def _get_files(self, job_id):
+        return Session.query(File).filter(File.job_id == job_id).order_by(File.file_id).all()
+
+    def test_cancel_files(self):
+        """
+        Cancel some files of a job, and then the rest
+        """
+        job_id = self._submit(3)
+        file_ids = map(lambda f: f.file_id, self._get_files(job_id))
+
+        answer = self.app.delete(url="/jobs/%s/files/%d,%d" % (job_id, file_ids[0], file_ids[1]), status=200)
+        files = json.loads(answer.body)
+        self.assertEqual(file_ids[:2], map(lambda f: f['file_id'], files))
+        self.assertEqual(['CANCELED', 'CANCELED'], map(lambda f: f['file_state'], files))
+
+        Session.expire_all()
+        self.assertEqual(['CANCELED', 'CANCELED', 'SUBMITTED'], map(lambda f: f.file_state, self._get_files(job_id)))
+        self.assertEqual('SUBMITTED', Session.query(Job).get(job_id).job_state)
+
+        # Nothing left, so the job is done
+        answer = self.app.delete(url="/jobs/%s/files/%d" % (job_id, file_ids[2]), status=200)
+        self.assertEqual('CANCELED', json.loads(answer.body)['file_state'])
+
+        Session.expire_all()
+        job = Session.query(Job).get(job_id)
+        self.assertEqual('CANCELED', job.job_state)
+        self.assertNotEqual(None, job.job_finished)
+
+    def test_cancel_files_alternatives(self):
+        """
+        When a transfer with alternatives is canceled, the alternatives are enabled
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+        job = {
+            'files': [{
+                'sources': ['root://source.es/file', 'root://source2.es/file'],
+                'destinations': ['root://dest.ch/file'],
+            }]
+        }
+        job_id = str(json.loads(self.app.put(url="/jobs", params=json.dumps(job), status=200).body)['job_id'])
+        files = self._get_files(job_id)
+        self.assertEqual(['SUBMITTED', 'NOT_USED'], map(lambda f: f.file_state, files))
+
+        self.app.delete(url="/jobs/%s/files/%d" % (job_id, files[0].file_id), status=200)
+
+        Session.expire_all()
+        self.assertEqual(['CANCELED', 'SUBMITTED'], map(lambda f: f.file_state, self._get_files(job_id)))
+        self.assertEqual('SUBMITTED', Session.query(Job).get(job_id).job_state)
+
+    def test_cancel_files_alternatives_finished(self):
+        """
+        When a replica of a file has finished, its unused alternatives do not keep
+        the job active once the rest of the files are canceled
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+        job = {
+            'files': [
+                {
+                    'sources': ['root://source.es/file', 'root://source2.es/file'],
+                    'destinations': ['root://dest.ch/file'],
+                },
+                {
+                    'sources': ['root://source.es/file2'],
+                    'destinations': ['root://dest.ch/file2'],
+                }
+            ]
+        }
+        job_id = str(json.loads(self.app.put(url="/jobs", params=json.dumps(job), status=200).body)['job_id'])
+        files = self._get_files(job_id)
+        self.assertEqual(['SUBMITTED', 'NOT_USED', 'SUBMITTED'], map(lambda f: f.file_state, files))
+
+        Session.query(File).filter(File.file_id == files[0].file_id).update({'file_state': 'FINISHED'})
+        Session.commit()
+
+        self.app.delete(url="/jobs/%s/files/%d" % (job_id, files[2].file_id), status=200)
+
+        Session.expire_all()
+        self.assertEqual(['FINISHED', 'CANCELED', 'CANCELED'], map(lambda f: f.file_state, self._get_files(job_id)))
+        job = Session.query(Job).get(job_id)
+        self.assertEqual('CANCELED', job.job_state)
+        self.assertNotEqual(None, job.job_finished)
+
+    def test_cancel_job_alternatives(self):
+        """
+        When the whole job is canceled, the alternatives are canceled too
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+        job = {
+            'files': [{
+                'sources': ['root://source.es/file', 'root://source2.es/file'],
+                'destinations': ['root://dest.ch/file'],
+            }]
+        }
+        job_id = str(json.loads(self.app.put(url="/jobs", params=json.dumps(job), status=200).body)['job_id'])
+
+        self.app.delete(url="/jobs/%s" % job_id, status=200)
+
+        Session.expire_all()
+        self.assertEqual(['CANCELED', 'CANCELED'], map(lambda f: f.file_state, self._get_files(job_id)))
+        progress = json.loads(self.app.get(url="/jobs/%s/cancellation" % job_id, status=200).body)
+        self.assertEqual(0, progress['remaining'])
+
+    def test_cancel_files_wrong(self):
+        """
+        Cancel files that do not belong to the job, or are already terminal
+        """
+        job_id = self._submit(2)
+        other_job_id = self._submit()
+        file_ids = map(lambda f: f.file_id, self._get_files(job_id))
+        other_file_id = self._get_files(other_job_id)[0].file_id
+
+        self.app.delete(url="/jobs/%s/files/%d" % (job_id, other_file_id), status=404)
+        self.app.delete(url="/jobs/%s/files/abc" % job_id, status=400)
+        self.app.delete(url="/jobs/1234-5678/files/%d" % file_ids[0], status=404)
+
+        self.app.delete(url="/jobs/%s/files/%d" % (job_id, file_ids[0]), status=200)
+        answer = self.app.delete(url="/jobs/%s/files/%d,%d" % (job_id, file_ids[0], file_ids[1]), status=207)
+        files = json.loads(answer.body)
+        self.assertEqual('304 Not Modified', files[0]['http_status'])
+        self.assertEqual('200 Ok', files[1]['http_status'])
+
+        Session.expire_all()
+        self.assertEqual('SUBMITTED', Session.query(Job).get(other_job_id).job_state)
+        self.assertEqual('CANCELED', Session.query(Job).get(job_id).job_state)
+
+    def test_cancel_background(self):
+        """
+        Big jobs are marked as canceled at once, but their files are canceled in the background
+        """
+        previous = get_canceller()
+        canceller = Canceller(threshold=3, chunk_size=2)
+        set_canceller(canceller)
+        try:
+            big_job_id = self._submit(5)
+            small_job_id = self._submit(3)
+
+            answer = self.app.delete(url="/jobs/%s,%s" % (big_job_id, small_job_id), status=207)
+            jobs = json.loads(answer.body)
+            self.assertEqual('202 Accepted', jobs[0]['http_status'])
+            self.assertEqual('CANCELED', jobs[0]['job_state'])
+            self.assertEqual('200 Ok', jobs[1]['http_status'])
+
+            progress = json.loads(self.app.get(url="/jobs/%s/cancellation" % big_job_id, status=200).body)
+            self.assertEqual('PENDING', progress['state'])
+            self.assertEqual(5, progress['total'])
+            self.assertEqual(5, progress['remaining'])
+            self.assertEqual(['SUBMITTED'] * 5, map(lambda f: f.file_state, self._get_files(big_job_id)))
+
+            self.assertEqual(1, canceller.work())
+
+            progress = json.loads(self.app.get(url="/jobs/%s/cancellation" % big_job_id, status=200).body)
+            self.assertEqual('DONE', progress['state'])
+            self.assertEqual(5, progress['canceled'])
+            self.assertEqual(0, progress['remaining'])
+
+            Session.expire_all()
+            self.assertEqual(['CANCELED'] * 5, map(lambda f: f.file_state, self._get_files(big_job_id)))
+            job = Session.query(Job).get(big_job_id)
+            self.assertEqual('CANCELED', job.job_state)
+            self.assertNotEqual(None, job.job_finished)
+
+            # Single job, 202
+            answer = self.app.delete(url="/jobs/%s" % self._submit(4), status=202)
+            self.assertIn('/cancellation', json.loads(answer.body)['http_message'])
+        finally:
+            set_canceller(previous)
+
+    def _mark_canceled(self, job_id, lease=None, owner=None):
+        """
+        Leave the job as if it was being canceled in the background
+        """
+        job = Session.query(Job).get(job_id)
+        job.job_state = 'CANCELED'
+        job.cancel_job = True
+        Session.merge(job)
+        Session.merge(JobCancellation(
+            job_id=job_id, reason='Canceled', state='RUNNING' if owner else 'PENDING',
+            total=3, canceled=0, owner=owner, lease=lease
+        ))
+        Session.commit()
+
+    def test_cancel_background_resume(self):
+        """
+        Jobs marked as canceled whose files were not canceled are resumed
+        """
+        job_id = self._submit(3)
+        self._mark_canceled(job_id)
+
+        canceller = Canceller()
+        canceller.resume()
+        self.assertEqual(1, canceller.work())
+        Session.expire_all()
+        self.assertEqual(['CANCELED'] * 3, map(lambda f: f.file_state, self._get_files(job_id)))
+        self.assertNotEqual(None, Session.query(Job).get(job_id).job_finished)
+
+        progress = json.loads(self.app.get(url="/jobs/%s/cancellation" % job_id, status=200).body)
+        self.assertEqual('DONE', progress['state'])
+        self.assertEqual(3, progress['canceled'])
+
+    def test_cancel_background_claimed(self):
+        """
+        Only one process resumes a pending cancellation
+        """
+        job_id = self._submit(3)
+        self._mark_canceled(job_id)
+
+        first, second = Canceller(), Canceller()
+        first.resume()
+        second.resume()
+        self.assertEqual(1, first.work())
+        self.assertEqual(1, second.work())
+
+        # The first one did the work, the second one saw it was claimed
+        Session.expire_all()
+        cancellation = Session.query(JobCancellation).get(job_id)
+        self.assertEqual('DONE', cancellation.state)
+        self.assertEqual(first.owner, cancellation.owner)
+        self.assertEqual(3, cancellation.canceled)
+
+        # Finished, so nothing to resume
+        third = Canceller()
+        third.resume()
+        self.assertEqual(0, third.work())
+
+    def test_cancel_background_claim_expired(self):
+        """
+        A claim that has not been renewed in time is taken over
+        """
+        job_id = self._submit(3)
+        self._mark_canceled(job_id, lease=datetime.utcnow() + timedelta(minutes=5), owner='elsewhere')
+
+        canceller = Canceller()
+        canceller.resume()
+        self.assertEqual(0, canceller.work())
+        # The job finish time is not used for the claim
+        self.assertEqual(None, Session.query(Job).get(job_id).finish_time)
+
+        self._mark_canceled(job_id, lease=datetime.utcnow() - timedelta(seconds=1), owner='elsewhere')
+        canceller.resume()
+        self.assertEqual(1, canceller.work())
+        Session.expire_all()
+        self.assertNotEqual(None, Session.query(Job).get(job_id).job_finished)
+        self.assertEqual(canceller.owner, Session.query(JobCancellation).get(job_id).owner)
+
+    def test_cancellation_not_canceled(self):
+        """
+        A job that has not been canceled has no cancellation progress
+        """
+        job_id = self._submit()
+        self.app.get(url="/jobs/%s/cancellation" % job_id, status=404)
+        self.app.delete(url="/jobs/%s" % job_id, status=200)
+        progress = json.loads(self.app.get(url="/jobs/%s/cancellation" % job_id, status=200).body)
+        self.assertEqual('DONE', progress['state'])
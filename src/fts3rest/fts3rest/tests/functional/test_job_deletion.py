@@ -128,3 +128,25 @@ class TestJobDeletion(TestController):
             set(('root://source.es/file', 'root://source.es/file2', 'root://source.es/file3')),
             registered
         )
+
+    def test_delete_repeated_streamed(self):
+        """
+        Submit a big streamed deletion job with repeated files. The host name is case insensitive.
+        They must land only once in the db
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+
+        surls = ['root://source.es/file%d' % (i % 500) for i in xrange(2000)]
+        surls.append('root://SOURCE.es/file1')
+        surls.append('root://source.es/FILE1')
+        body = '{"params": {}, "delete": %s}' % json.dumps(surls)
+
+        answer = self.app.put(url="/jobs", params=body, status=200)
+        job_id = json.loads(answer.body)['job_id']
+
+        dm = Session.query(DataManagement).filter(DataManagement.job_id == job_id)
+        self.assertEqual(501, dm.count())
+        self.assertEqual(
+            1, dm.filter(DataManagement.source_surl == 'root://source.es/FILE1').count()
+        )
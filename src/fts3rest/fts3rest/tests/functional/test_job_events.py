@@ -0,0 +1,147 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from datetime import datetime
+import json
+
+from fts3.model import File, Job
+from fts3rest.lib.base import Session
+from fts3rest.lib.job_events import JobWatcher, Subscriber
+from fts3rest.tests import TestController
+
+
+def _parse_events(body):
+    events = list()
+    for block in body.split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n') if line and not line.startswith(':'))
+        if lines:
+            events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+class TestJobEvents(TestController):
+    """
+    Stream of job and file state changes
+    """
+
+    def setUp(self):
+        self.setup_gridsite_environment()
+        self.push_delegation()
+
+    def _submit(self):
+        job = {'files': [{'sources': ['root://source.es/file'], 'destinations': ['root://dest.ch/file']}]}
+        answer = self.app.put(url="/jobs", params=json.dumps(job), status=200)
+        return str(json.loads(answer.body)['job_id'])
+
+    def test_stream(self):
+        """
+        The stream starts with the current state of the job
+        """
+        job_id = self._submit()
+        answer = self.app.get(url="/jobs/events?job_id=%s&timeout=1" % job_id, status=200)
+        self.assertEqual('text/event-stream', answer.headers['Content-Type'])
+
+        events = _parse_events(answer.body)
+        self.assertIn(('job', {'job_id': job_id, 'job_state': 'SUBMITTED'}), events)
+        file_events = filter(lambda e: e[0] == 'file', events)
+        self.assertEqual(1, len(file_events))
+        self.assertEqual('SUBMITTED', file_events[0][1]['file_state'])
+
+    def test_invalid(self):
+        """
+        Something must be followed, and it must exist
+        """
+        self.app.get(url="/jobs/events", status=400)
+        self.app.get(url="/jobs/events?job_id=1234-5678", status=404)
+        self.app.get(url="/jobs/events?dlg_id=1234", status=403)
+        self.app.get(url="/jobs/events?vo_name=testvo&timeout=abc", status=400)
+
+    def test_changes(self):
+        """
+        After the current state, only the changes are sent, to everyone interested
+        """
+        job_ids = [self._submit(), self._submit()]
+        user = self.get_user_credentials()
+
+        watcher = JobWatcher()
+        by_id = watcher.subscribe(Subscriber(user, job_ids=[job_ids[0]]))
+        by_vo = watcher.subscribe(Subscriber(user, vo_name='testvo'))
+        self.assertEqual(2, len(watcher))
+
+        # Current state: job and file
+        self.assertEqual(2 + 4, watcher.scan())
+        self.assertEqual(2, by_id.queue.qsize())
+        self.assertEqual(4, by_vo.queue.qsize())
+        self.assertEqual(0, watcher.scan())
+
+        # A file changes
+        Session.query(File).filter(File.job_id == job_ids[0])\
+            .update({'file_state': 'ACTIVE', 'start_time': datetime.utcnow()})
+        Session.commit()
+        self.assertEqual(2, watcher.scan())
+        # The scans overlap, but the change is sent only once
+        self.assertEqual(0, watcher.scan())
+
+        # A new subscriber gets the current state, the others the changes
+        late = watcher.subscribe(Subscriber(user, job_ids=[job_ids[1]]))
+        Session.query(Job).filter(Job.job_id == job_ids[1]).update({'job_state': 'CANCELED'})
+        Session.commit()
+        self.assertEqual(1 + 2, watcher.scan())
+        self.assertEqual(2, late.queue.qsize())
+
+        watcher.unsubscribe(by_id)
+        watcher.unsubscribe(by_vo)
+        watcher.unsubscribe(late)
+        self.assertEqual(0, watcher.scan())
+
+    def test_changes_without_timestamps(self):
+        """
+        Transitions that do not touch the file timestamps are sent too, and the last
+        state of the files is sent when the job finishes
+        """
+        job_id = self._submit()
+        user = self.get_user_credentials()
+
+        watcher = JobWatcher()
+        subscriber = watcher.subscribe(Subscriber(user, vo_name='testvo'))
+        self.assertEqual(2, watcher.scan())
+
+        # SUBMITTED to READY, and back to SUBMITTED (i.e. retry)
+        Session.query(File).filter(File.job_id == job_id).update({'file_state': 'READY'})
+        Session.commit()
+        self.assertEqual(1, watcher.scan())
+        Session.query(File).filter(File.job_id == job_id).update({'file_state': 'SUBMITTED'})
+        Session.commit()
+        self.assertEqual(1, watcher.scan())
+
+        # The job finishes, with an old finish time (i.e. a clock skew)
+        Session.query(File).filter(File.job_id == job_id).update({'file_state': 'FINISHED'})
+        Session.query(Job).filter(Job.job_id == job_id)\
+            .update({'job_state': 'FINISHED', 'job_finished': datetime(2000, 1, 1)})
+        Session.commit()
+        self.assertEqual(2, watcher.scan())
+        self.assertEqual(0, watcher.scan())
+
+        events = list()
+        while not subscriber.queue.empty():
+            events.append(subscriber.queue.get_nowait())
+        self.assertEqual(
+            ['SUBMITTED', 'READY', 'SUBMITTED', 'FINISHED'],
+            map(lambda e: e[1]['file_state'], filter(lambda e: e[0] == 'file', events))
+        )
+        self.assertEqual(
+            ['SUBMITTED', 'FINISHED'],
+            map(lambda e: e[1]['job_state'], filter(lambda e: e[0] == 'job', events))
+        )
@@ -19,6 +19,8 @@ from datetime import timedelta
 import json
 
 from fts3rest.tests import TestController
+from fts3rest.lib.base import Session
+from fts3.model import File, Job
 
 
 class TestJobInvalidSubmits(TestController):
@@ -121,7 +123,10 @@ class TestJobInvalidSubmits(TestController):
         error = json.loads(response.body)
 
         self.assertEquals(error['status'], '400 Bad Request')
-        self.assertEquals(error['message'], 'Invalid value within the request: Can not transfer local files (file:///etc/passwd)')
+        self.assertEquals(
+            error['message'],
+            'Invalid value within the request: Can not transfer local files (file:///etc/passwd)'
+        )
 
     def test_one_single_slash(self):
         """
@@ -154,7 +159,10 @@ class TestJobInvalidSubmits(TestController):
         error = json.loads(response.body)
 
         self.assertEquals(error['status'], '400 Bad Request')
-        self.assertEquals(error['message'], 'Invalid value within the request: Missing host (gsiftp:/source.es:8446/file)')
+        self.assertEquals(
+            error['message'],
+            'Invalid value within the request: Missing host (gsiftp:/source.es:8446/file)'
+        )
 
     def test_empty_path(self):
         """
@@ -244,7 +252,10 @@ class TestJobInvalidSubmits(TestController):
         error = json.loads(response.body)
 
         self.assertEquals(error['status'], '400 Bad Request')
-        self.assertEquals(error['message'], 'Invalid value within the request: Missing host (http:/// //source.es/file)')
+        self.assertEquals(
+            error['message'],
+            'Invalid value within the request: Missing host (http:/// //source.es/file)'
+        )
 
     def test_submit_no_creds(self):
         """
@@ -508,3 +519,88 @@ class TestJobInvalidSubmits(TestController):
         self.app.put(url="/jobs",
                      params=json.dumps(job),
                      status=400)
+
+    def test_all_errors_reported(self):
+        """
+        All the errors must be reported at once, with their position
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+
+        job = {
+            'files': [
+                {
+                    'sources': ['root://source.es/file'],
+                    'destinations': ['root://dest.ch/file'],
+                },
+                {
+                    'sources': ['/etc/passwd'],
+                    'destinations': ['root://dest.ch/file', 'root://dest.ch:1094/'],
+                },
+                {
+                    'destinations': ['root://dest.ch/file'],
+                    'filesize': -5
+                },
+                {
+                    'sources': 'root://source.es/file',
+                    'destinations': ['root://dest.ch/file'],
+                }
+            ]
+        }
+
+        response = self.app.put(url="/jobs", params=json.dumps(job), status=400)
+        error = json.loads(response.body)
+
+        self.assertEqual(error['status'], '400 Bad Request')
+        self.assertEqual(error['message'], 'Invalid value within the request: Missing scheme (/etc/passwd)')
+        self.assertEqual(
+            [
+                'files[1].sources[0]', 'files[1].destinations[1]',
+                'files[2]', 'files[2].filesize', 'files[3].sources'
+            ],
+            map(lambda e: e['position'], error['errors'])
+        )
+        self.assertEqual('Missing parameter: files[2].sources', error['errors'][2]['message'])
+
+        self.assertEqual(0, Session.query(Job).count())
+
+    def test_filesize_as_string(self):
+        """
+        The file size can be given as a numeric string, as before, but not as any string
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+
+        job = {'files': [{'sources': ['root://source.es/file'], 'destinations': ['root://dest.ch/file']}]}
+        job['files'][0]['filesize'] = '1024'
+        job_id = json.loads(self.app.put(url="/jobs", params=json.dumps(job), status=200).body)['job_id']
+        self.assertEqual(1024, Session.query(File).filter(File.job_id == job_id).one().user_filesize)
+
+        for invalid in ('abc', '-5', ''):
+            job['files'][0]['filesize'] = invalid
+            error = json.loads(self.app.put(url="/jobs", params=json.dumps(job), status=400).body)
+            self.assertEqual(['files[0].filesize'], map(lambda e: e['position'], error['errors']))
+
+    def test_deletion_all_errors_reported(self):
+        """
+        All the errors of a deletion must be reported at once, with their position
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+
+        job = {
+            'delete': [
+                'root://source.es/file',
+                'xx',
+                {'metadata': 'nothing'},
+                42
+            ]
+        }
+
+        response = self.app.put(url="/jobs", params=json.dumps(job), status=400)
+        error = json.loads(response.body)
+
+        self.assertEqual(
+            ['delete[1]', 'delete[2]', 'delete[3]'],
+            map(lambda e: e['position'], error['errors'])
+        )
@@ -18,7 +18,7 @@
 import json
 from datetime import datetime
 
-from fts3.model import FileRetryLog
+from fts3.model import File, FileRetryLog, Job
 from fts3rest.lib.base import Session
 from fts3rest.lib.middleware.fts3auth import UserCredentials
 from fts3rest.tests import TestController
@@ -484,3 +484,261 @@ class TestJobListing(TestController):
                 self.assertEqual('404 Not Found', job['http_status'])
             else:
                 self.assertEqual('200 Ok', job['http_status'])
+
+    def test_list_paginated(self):
+        """
+        Walk the list of jobs following the cursors
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+
+        job_ids = [self._submit() for i in range(5)]
+
+        listed = list()
+        pages = 0
+        url = "/jobs?page_size=2"
+        while url:
+            page = json.loads(self.app.get(url=url, status=200).body)
+            self.assertLessEqual(len(page['jobs']), 2)
+            listed.extend(map(lambda j: j['job_id'], page['jobs']))
+            pages += 1
+            if page['next']:
+                url = "/jobs?page_size=2&cursor=%s" % page['next']
+            else:
+                url = None
+
+        self.assertEqual(3, pages)
+        self.assertEqual(job_ids, listed)
+
+    def test_list_bad_cursor(self):
+        """
+        The cursor must be one given by the server
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+
+        self.app.get(url="/jobs?cursor=1234", status=400)
+        self.app.get(url="/jobs?page_size=1000", status=400)
+
+    def test_get_multiple_jobs_one_forbidden(self):
+        """
+        Query multiple jobs at once, when one belongs to someone else
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+
+        job_ids = [self._submit(), self._submit()]
+        job = Session.query(Job).get(job_ids[1])
+        job.user_dn = '/DC=ch/CN=Someone Else'
+        job.vo_name = 'othervo'
+        Session.merge(job)
+        Session.commit()
+
+        answer = self.app.get(
+            url="/jobs/%s?files=source_surl,not_really_a_field" % ','.join(job_ids), status=207
+        )
+        job_list = json.loads(answer.body)
+
+        self.assertEqual(2, len(job_list))
+        self.assertEqual(job_ids[0], job_list[0]['job_id'])
+        self.assertEqual('200 Ok', job_list[0]['http_status'])
+        self.assertEqual([{'source_surl': 'root://source.es/file'}], job_list[0]['files'])
+        self.assertEqual(job_ids[1], job_list[1]['job_id'])
+        self.assertEqual('403 Forbidden', job_list[1]['http_status'])
+        self.assertNotIn('files', job_list[1])
+
+    def test_get_fields(self):
+        """
+        Get only some fields of the jobs and their files
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+        job_id = self._submit()
+
+        job = json.loads(self.app.get(url="/jobs/%s?fields=job_id,job_state" % job_id, status=200).body)
+        self.assertEqual({'job_id': job_id, 'job_state': 'SUBMITTED', 'http_status': '200 Ok'}, job)
+
+        files = json.loads(self.app.get(url="/jobs/%s/files?fields=source_surl,file_state" % job_id, status=200).body)
+        self.assertEqual([{'source_surl': 'root://source.es/file', 'file_state': 'SUBMITTED'}], files)
+
+        jobs = json.loads(self.app.get(url="/jobs?fields=job_id,vo_name", status=200).body)
+        self.assertIn({'job_id': job_id, 'vo_name': 'testvo'}, jobs)
+
+        page = json.loads(self.app.get(url="/jobs?fields=job_id&page_size=1", status=200).body)
+        self.assertEqual([{'job_id': job_id}], page['jobs'])
+
+    def test_get_fields_attribute_name(self):
+        """
+        Fields are the attribute names, even when the column is named differently
+        (verify_checksum is stored as checksum_method)
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+        job_id = self._submit()
+
+        job = json.loads(self.app.get(url="/jobs/%s?fields=job_id,verify_checksum" % job_id, status=200).body)
+        self.assertEqual(job_id, job['job_id'])
+        self.assertIn('verify_checksum', job)
+
+        jobs = json.loads(self.app.get(url="/jobs?fields=job_id,verify_checksum", status=200).body)
+        self.assertIn(job_id, map(lambda j: j['job_id'], jobs))
+        for j in jobs:
+            self.assertEqual(['job_id', 'verify_checksum'], sorted(j.keys()))
+
+        self.app.get(url="/jobs?fields=checksum_method", status=400)
+
+    def test_get_files_retries(self):
+        """
+        The retries of the files can be asked for together with the job
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+        job_id = self._submit()
+
+        file_id = Session.query(File.file_id).filter(File.job_id == job_id).scalar()
+        retry = FileRetryLog()
+        retry.file_id = file_id
+        retry.attempt = 1
+        retry.datetime = datetime.utcnow()
+        retry.reason = 'Blahblahblah'
+        Session.merge(retry)
+        Session.commit()
+
+        job = json.loads(self.app.get(url="/jobs/%s?files=file_id,retries" % job_id, status=200).body)
+        self.assertEqual(1, len(job['files']))
+        self.assertEqual(file_id, job['files'][0]['file_id'])
+        self.assertEqual(1, len(job['files'][0]['retries']))
+        self.assertEqual('Blahblahblah', job['files'][0]['retries'][0]['reason'])
+
+        job = json.loads(self.app.get(url="/jobs/%s?files=retries" % job_id, status=200).body)
+        self.assertEqual(['retries'], job['files'][0].keys())
+
+        self.app.get(url="/jobs/%s?files=job" % job_id, status=400)
+
+    def test_get_unknown_fields(self):
+        """
+        Only the columns of the jobs and files can be requested
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+        job_id = self._submit()
+
+        self.app.get(url="/jobs/%s?fields=job_id,files" % job_id, status=400)
+        self.app.get(url="/jobs/%s/files?fields=retries" % job_id, status=400)
+        self.app.get(url="/jobs?fields=not_really_a_field", status=400)
+
+    def test_get_not_modified(self):
+        """
+        Poll a job with its ETag
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+        job_id = str(self._submit())
+
+        answer = self.app.get(url="/jobs/%s" % job_id, status=200)
+        etag = answer.headers['ETag']
+
+        answer = self.app.get(url="/jobs/%s" % job_id, headers={'If-None-Match': etag}, status=304)
+        self.assertEqual('', answer.body)
+        self.assertEqual(etag, answer.headers['ETag'])
+
+        answer = self.app.head(url="/jobs/%s" % job_id, status=200)
+        self.assertEqual(etag, answer.headers['ETag'])
+        self.assertEqual('', answer.body)
+
+        # Other query, other ETag
+        answer = self.app.get(url="/jobs/%s?files=file_state" % job_id, headers={'If-None-Match': etag}, status=200)
+        self.assertNotEqual(etag, answer.headers['ETag'])
+
+        # Once the state changes, so does the ETag
+        self.app.delete(url="/jobs/%s" % job_id, status=200)
+        answer = self.app.get(url="/jobs/%s" % job_id, headers={'If-None-Match': etag}, status=200)
+        self.assertNotEqual(etag, answer.headers['ETag'])
+        self.assertEqual('CANCELED', json.loads(answer.body)['job_state'])
+
+    def test_get_job_retries(self):
+        """
+        Get the retries of all the files of a job at once
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+        job_ids = [self._submit(), self._submit()]
+
+        for job_id in job_ids:
+            file_id = json.loads(self.app.get(url="/jobs/%s/files" % job_id, status=200).body)[0]['file_id']
+            for attempt in (2, 1):
+                retry = FileRetryLog()
+                retry.file_id = file_id
+                retry.attempt = attempt
+                retry.datetime = datetime.utcnow()
+                retry.reason = '%s %d' % (job_id, attempt)
+                Session.merge(retry)
+            Session.commit()
+
+        retries = json.loads(self.app.get(url="/jobs/%s/retries" % job_ids[0], status=200).body)
+
+        self.assertEqual(1, len(retries))
+        self.assertEqual('%s 1' % job_ids[0], retries[0]['retries'][0]['reason'])
+        self.assertNotEqual(file_id, retries[0]['file_id'])
+        self.assertEqual([1, 2], map(lambda r: r['attempt'], retries[0]['retries']))
+
+        self.app.get(url="/jobs/1234-5678/retries", status=404)
+
+    def test_list_output_formats(self):
+        """
+        The listings can be asked minified, or as NDJSON
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+        job_ids = [self._submit(), self._submit()]
+
+        pretty = self.app.get(url="/jobs", status=200)
+        self.assertEqual('application/json', pretty.content_type)
+
+        minified = self.app.get(url="/jobs", headers={'Accept': 'application/json;pretty=false'}, status=200)
+        self.assertEqual('application/json', minified.content_type)
+        self.assertLess(len(minified.body), len(pretty.body))
+        self.assertEqual(json.loads(pretty.body), json.loads(minified.body))
+
+        ndjson = self.app.get(url="/jobs", headers={'Accept': 'application/x-ndjson'}, status=200)
+        self.assertEqual('application/x-ndjson', ndjson.content_type)
+        lines = filter(len, ndjson.body.split('\n'))
+        self.assertEqual(json.loads(pretty.body), map(json.loads, lines))
+        self.assertEqual(set(job_ids), set(map(lambda l: json.loads(l)['job_id'], lines)))
+
+        # Errors are still json
+        error = self.app.get(url="/jobs/1234-5678", headers={'Accept': 'application/x-ndjson'}, status=404)
+        self.assertIn('1234-5678', json.loads(error.body)['message'])
+
+    def test_get_summary(self):
+        """
+        Get the summary of a job, and of several at once
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+        job_ids = [self._submit(), self._submit()]
+
+        transfer = Session.query(File).filter(File.job_id == job_ids[0]).first()
+        transfer.file_state = 'FINISHED'
+        transfer.filesize = 1024
+        transfer.throughput = 10.0
+        transfer.tx_duration = 4.0
+        Session.merge(transfer)
+        Session.commit()
+
+        summary = json.loads(self.app.get(url="/jobs/%s/summary" % job_ids[0], status=200).body)
+        self.assertEqual(job_ids[0], summary['job_id'])
+        self.assertEqual({'FINISHED': 1}, summary['states'])
+        self.assertEqual(1, summary['total'])
+        self.assertEqual(1024, summary['bytes'])
+        self.assertEqual(10.0, summary['throughput'])
+        self.assertEqual(4.0, summary['duration'])
+
+        summaries = json.loads(self.app.get(url="/jobs/%s/summary" % ','.join(job_ids), status=200).body)
+        self.assertEqual(job_ids, map(lambda s: s['job_id'], summaries))
+        self.assertEqual({'SUBMITTED': 1}, summaries[1]['states'])
+        self.assertEqual(None, summaries[1]['throughput'])
+
+        self.app.get(url="/jobs/1234-5678/summary", status=404)
+        summaries = json.loads(self.app.get(url="/jobs/%s,1234-5678/summary" % job_ids[0], status=207).body)
+        self.assertEqual('404 Not Found', summaries[1]['http_status'])
@@ -16,12 +16,14 @@
 #   limitations under the License.
 
 import json
+from datetime import datetime
 import scipy.stats
 import socket
 from nose.plugins.skip import SkipTest
 
 from fts3rest.tests import TestController
 from fts3rest.lib.base import Session
+from fts3rest.lib.optimizer_active import forget_pairs
 from fts3.model import File, Job, OptimizerActive
 
 
@@ -460,6 +462,31 @@ class TestJobSubmission(TestController):
         oa2 = Session.query(OptimizerActive).get(('root://source.es', 'root://dest.ch'))
         self.assertEqual(20, oa2.active)
 
+    def test_optimizer_not_modified(self):
+        """
+        Submitting a job with an existing OptimizerActive entry must not modify it,
+        even if the pair is not known by the process
+        """
+        self.test_submit()
+        oa = Session.query(OptimizerActive).get(('root://source.es', 'root://dest.ch'))
+        oa.ema = 42
+        oa.datetime = datetime(2015, 1, 1)
+        Session.merge(oa)
+        Session.commit()
+
+        forget_pairs()
+        job = {
+            'files': [{
+                'sources': ['root://source.es/file'],
+                'destinations': ['root://dest.ch/file2'],
+            }]
+        }
+        self.app.put(url="/jobs", params=json.dumps(job), status=200)
+
+        oa2 = Session.query(OptimizerActive).get(('root://source.es', 'root://dest.ch'))
+        self.assertEqual(42, oa2.ema)
+        self.assertEqual(datetime(2015, 1, 1), oa2.datetime)
+
     def test_with_activity(self):
         """
         Submit a job specifiying activities for the files
@@ -674,3 +701,72 @@ class TestJobSubmission(TestController):
         self.assertGreater(min_value, -1)
         self.assertEqual(outsiders, 0)
         self.assertGreater(pvalue, 0.1)
+
+    def test_submit_streamed(self):
+        """
+        Submit a job where the parameters come before the transfers, so these are
+        inserted while they are read
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+
+        files = []
+        for r in xrange(25):
+            files.append({
+                'sources': ["root://source.es/file%d" % r],
+                'destinations': ["root://dest.ch/file%d" % r],
+                'checksum': 'adler32:1234'
+            })
+        body = '{"params": %s, "files": %s}' % (json.dumps({'overwrite': True}), json.dumps(files))
+
+        answer = self.app.put(url="/jobs",
+                              params=body,
+                              status=200)
+
+        job_id = json.loads(answer.body)['job_id']
+        job = Session.query(Job).get(job_id)
+        self.assertEqual(job.source_se, 'root://source.es')
+        self.assertEqual(job.dest_se, 'root://dest.ch')
+        self.assertEqual(job.overwrite_flag, True)
+        self.assertEqual(job.verify_checksum, 'r')
+        self.assertEqual(len(job.files), 25)
+        self.assertEqual(range(25), sorted(map(lambda f: f.file_index, job.files)))
+
+    def test_submit_streamed_malformed(self):
+        """
+        The transfers are streamed, but the JSON is broken half the way. Nothing must be inserted
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+
+        body = '{"params": {}, "files": [{"sources": ["root://source.es/file"], ' \
+               '"destinations": ["root://dest.ch/file"]}, {"sources": ['
+
+        error = json.loads(self.app.put(url="/jobs", params=body, status=400).body)
+        self.assertIn('Badly formatted JSON request', error['message'])
+        self.assertEqual(0, Session.query(Job).count())
+        self.assertEqual(0, Session.query(File).count())
+
+    def test_submit_streamed_and_delete(self):
+        """
+        A deletion comes after the streamed transfers. It must be rejected.
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+
+        body = '{"params": {}, "files": [{"sources": ["root://source.es/file"], ' \
+               '"destinations": ["root://dest.ch/file"]}], "delete": ["root://source.es/file"]}'
+
+        error = json.loads(self.app.put(url="/jobs", params=body, status=400).body)
+        self.assertEqual(error['message'], 'Transfer and metadata simultaneous operations not supported')
+        self.assertEqual(0, Session.query(Job).count())
+
+    def test_submit_streamed_empty(self):
+        """
+        Submit an empty list of streamed transfers
+        """
+        self.setup_gridsite_environment()
+        self.push_delegation()
+
+        error = json.loads(self.app.put(url="/jobs", params='{"params": {}, "files": []}', status=400).body)
+        self.assertEqual(error['message'], 'No transfers specified')
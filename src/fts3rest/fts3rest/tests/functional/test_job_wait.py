@@ -0,0 +1,122 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import threading
+import time
+
+from fts3.model import Job
+from fts3rest.lib.base import Session
+from fts3rest.lib.job_poller import JobPoller
+from fts3rest.tests import TestController
+
+
+def _set_job_state(job_id, state):
+    Session.query(Job).filter(Job.job_id == job_id).update({'job_state': state})
+    Session.commit()
+
+
+class TestJobWait(TestController):
+    """
+    Long polling of the job state
+    """
+
+    def setUp(self):
+        self.setup_gridsite_environment()
+        self.push_delegation()
+
+    def _submit(self):
+        job = {'files': [{'sources': ['root://source.es/file'], 'destinations': ['root://dest.ch/file']}]}
+        answer = self.app.put(url="/jobs", params=json.dumps(job), status=200)
+        return str(json.loads(answer.body)['job_id'])
+
+    def test_already_terminal(self):
+        """
+        If the job is already terminal, the answer is immediate
+        """
+        job_id = self._submit()
+        _set_job_state(job_id, 'FINISHED')
+
+        start = time.time()
+        job = json.loads(self.app.get(url="/jobs/%s?wait_until=terminal&timeout=10" % job_id, status=200).body)
+        self.assertEqual('FINISHED', job['job_state'])
+        self.assertLess(time.time() - start, 5)
+
+    def test_timeout(self):
+        """
+        If nothing changes, the current state is returned after the timeout
+        """
+        job_id = self._submit()
+
+        start = time.time()
+        job = json.loads(self.app.get(url="/jobs/%s?wait_until=change&timeout=1" % job_id, status=200).body)
+        self.assertEqual('SUBMITTED', job['job_state'])
+        self.assertGreaterEqual(time.time() - start, 1)
+
+    def test_wake_up(self):
+        """
+        The answer is sent as soon as the job finishes
+        """
+        job_id = self._submit()
+
+        def finish():
+            time.sleep(0.5)
+            try:
+                _set_job_state(job_id, 'CANCELED')
+            finally:
+                Session.remove()
+        threading.Thread(target=finish).start()
+
+        start = time.time()
+        job = json.loads(self.app.get(url="/jobs/%s?wait_until=terminal&timeout=30" % job_id, status=200).body)
+        self.assertEqual('CANCELED', job['job_state'])
+        self.assertLess(time.time() - start, 10)
+
+    def test_invalid(self):
+        """
+        Invalid conditions and timeouts
+        """
+        job_id = self._submit()
+        self.app.get(url="/jobs/%s?wait_until=forever" % job_id, status=400)
+        self.app.get(url="/jobs/%s?wait_until=terminal&timeout=1000" % job_id, status=400)
+        self.app.get(url="/jobs/%s?wait_until=terminal&timeout=abc" % job_id, status=400)
+        self.app.get(url="/jobs/%s,%s?wait_until=terminal" % (job_id, job_id), status=400)
+        self.app.get(url="/jobs/1234-5678?wait_until=terminal", status=404)
+
+    def test_poll(self):
+        """
+        One poll wakes up all the waiters whose condition is met
+        """
+        job_ids = [self._submit(), self._submit()]
+        poller = JobPoller()
+        terminal = poller.register(job_ids[0], 'terminal', 'SUBMITTED')
+        change = poller.register(job_ids[0], 'change', 'SUBMITTED')
+        other = poller.register(job_ids[1], 'terminal', 'SUBMITTED')
+        self.assertEqual(2, len(poller))
+
+        self.assertEqual(0, poller.poll())
+        _set_job_state(job_ids[0], 'ACTIVE')
+        self.assertEqual(1, poller.poll())
+        self.assertTrue(change.event.is_set())
+        self.assertFalse(terminal.event.is_set())
+        _set_job_state(job_ids[0], 'FINISHED')
+        self.assertEqual(1, poller.poll())
+        self.assertTrue(terminal.event.is_set())
+        self.assertEqual('FINISHED', terminal.state)
+        self.assertFalse(other.event.is_set())
+
+        for waiter in (terminal, change, other):
+            poller.unregister(waiter)
+        self.assertEqual(0, len(poller))
@@ -0,0 +1,86 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+
+from fts3rest.lib.middleware.fts3auth import UserCredentials
+from fts3rest.lib.throttling import Throttle, set_throttle
+from fts3rest.tests import TestController
+
+
+class TestThrottling(TestController):
+    """
+    Admission control of the submissions
+    """
+
+    def setUp(self):
+        self.setup_gridsite_environment()
+        self.push_delegation()
+
+    def _submit(self, n_files=1, status=200):
+        job = {
+            'files': [
+                {
+                    'sources': ['root://source.es/file%d' % i],
+                    'destinations': ['root://dest.ch/file%d' % i],
+                }
+                for i in xrange(n_files)
+            ]
+        }
+        return self.app.put(url="/jobs", params=json.dumps(job), status=status)
+
+    def test_too_many_jobs(self):
+        """
+        Over the jobs rate, 429 is returned with Retry-After
+        """
+        set_throttle(Throttle({('vo', 'jobs'): 0.1}, burst=10))
+        self._submit()
+        answer = self._submit(status=429)
+        self.assertEqual('10', answer.headers['Retry-After'])
+        self.assertIn('testvo', json.loads(answer.body)['message'])
+
+    def test_too_many_files(self):
+        """
+        A big job is admitted, but the next one has to wait
+        """
+        set_throttle(Throttle({('dn', 'files'): 1}, burst=5))
+        self._submit(n_files=20)
+        answer = self._submit(status=429)
+        self.assertEqual(int(answer.headers['Retry-After']), 15)
+
+    def test_state(self):
+        """
+        The state of the buckets is visible for the administrators
+        """
+        set_throttle(Throttle({('dn', 'files'): 1}, burst=5))
+        self._submit(n_files=2)
+
+        state = json.loads(self.app.get(url="/config/throttling", status=200).body)
+        self.assertEqual([{'scope': 'dn', 'unit': 'files', 'rate': 1}], state['limits'])
+        self.assertEqual(1, len(state['buckets']))
+        bucket = state['buckets'][0]
+        self.assertEqual(self.TEST_USER_DN, bucket['name'])
+        self.assertAlmostEqual(3, bucket['tokens'], delta=1)
+
+    def test_state_forbidden(self):
+        """
+        Only the administrators can see the state
+        """
+        old_granted = UserCredentials.get_granted_level_for
+        UserCredentials.get_granted_level_for = lambda self_, op: None
+        try:
+            self.app.get(url="/config/throttling", status=403)
+        finally:
+            UserCredentials.get_granted_level_for = old_granted
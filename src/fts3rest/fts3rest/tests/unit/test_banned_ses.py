@@ -0,0 +1,71 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from datetime import datetime
+
+from fts3.model import BannedSE
+from fts3rest.lib.banned_ses import Bans, get_bans, invalidate_bans
+from fts3rest.lib.base import Session
+from fts3rest.tests import TestController
+
+
+def _banned(se, vo, status='CANCEL', wait_timeout=0):
+    banned = BannedSE()
+    banned.se = se
+    banned.vo = vo
+    banned.status = status
+    banned.wait_timeout = wait_timeout
+    banned.addition_time = datetime.utcnow()
+    return banned
+
+
+class TestBannedSes(TestController):
+    """
+    Test the cache of banned storages
+    """
+
+    def tearDown(self):
+        Session.query(BannedSE).delete()
+        Session.commit()
+        TestController.tearDown(self)
+
+    def test_lookup(self):
+        """
+        A ban without VO applies to everyone, a ban with VO only to that VO
+        """
+        bans = Bans([
+            _banned('gsiftp://all', None),
+            _banned('gsiftp://dteam', 'dteam', 'WAIT_AS', 42)
+        ])
+        self.assertEqual(2, len(bans))
+        self.assertEqual(('CANCEL', 0), bans.get('gsiftp://all', 'dteam'))
+        self.assertEqual(('CANCEL', 0), bans.get('gsiftp://all', 'atlas'))
+        self.assertEqual(('WAIT_AS', 42), bans.get('gsiftp://dteam', 'dteam'))
+        self.assertEqual(None, bans.get('gsiftp://dteam', 'atlas'))
+        self.assertEqual(None, bans.get('gsiftp://other', 'dteam'))
+
+    def test_cached(self):
+        """
+        Changes done directly into the database are not seen until the cache is invalidated
+        """
+        self.assertEqual(0, len(get_bans()))
+
+        Session.merge(_banned('gsiftp://source', None))
+        Session.commit()
+        self.assertEqual(0, len(get_bans()))
+
+        invalidate_bans()
+        self.assertEqual(1, len(get_bans()))
+        self.assertEqual(('CANCEL', 0), get_bans().get('gsiftp://source', 'dteam'))
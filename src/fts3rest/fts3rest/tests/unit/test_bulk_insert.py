@@ -0,0 +1,79 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import sessionmaker
+
+from fts3.model import Base, File
+from fts3rest.lib import bulk_insert
+
+
+class TestBulkInsert(unittest.TestCase):
+    """
+    Test the bulk insertion strategies
+    """
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(bind=engine)
+        self.session = sessionmaker(bind=engine)()
+
+    def _rows(self, n):
+        for i in xrange(n):
+            row = dict(job_id='1234', file_index=i, source_se='gsiftp://source', file_metadata={'index': i})
+            # Not all rows have the same keys
+            if i % 2:
+                row['wait_timeout'] = 42
+            yield row
+
+    def _check_inserted(self, n):
+        files = self.session.query(File).order_by(File.file_index).all()
+        self.assertEqual(n, len(files))
+        for i, f in enumerate(files):
+            self.assertEqual(i, f.file_index)
+            self.assertEqual({'index': i}, f.file_metadata)
+            self.assertEqual('default', f.activity)
+            if i % 2:
+                self.assertEqual(42, f.wait_timeout)
+            else:
+                self.assertEqual(None, f.wait_timeout)
+
+    def test_strategies(self):
+        """
+        All strategies must insert the same
+        """
+        for strategy in set(bulk_insert.STRATEGIES.values()):
+            strategy(self.session, File.__table__, list(self._rows(50)))
+            self._check_inserted(50)
+            self.session.query(File).delete()
+
+    def test_chunked(self):
+        """
+        Insert a generator by chunks
+        """
+        n = bulk_insert.bulk_insert(File.__table__, self._rows(105), chunk_size=10, session=self.session)
+        self.assertEqual(105, n)
+        self._check_inserted(105)
+
+    def test_mysql_multi_values(self):
+        """
+        For MySQL, the rows must be sent in one single INSERT
+        """
+        rows = bulk_insert._normalize(File.__table__, list(self._rows(3)))
+        statement = File.__table__.insert().values(rows).compile(dialect=mysql.dialect())
+        self.assertEqual(1, str(statement).count('INSERT'))
+        self.assertEqual(3, str(statement).count('(%s'))
@@ -0,0 +1,91 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import time
+from datetime import datetime, timedelta
+
+from fts3.model import Credential
+from fts3rest.lib import delegation_cache
+from fts3rest.lib.delegation_cache import get_credential, invalidate_credential
+from fts3rest.lib.base import Session
+from fts3rest.tests import TestController
+
+
+class TestDelegationCache(TestController):
+    """
+    Test the cache of delegated credentials
+    """
+
+    def _store_credential(self, lifetime, proxy='-PROXY-'):
+        cred = Credential()
+        cred.dlg_id = '1234'
+        cred.dn = '/CN=Someone'
+        cred.proxy = proxy
+        cred.termination_time = datetime.utcnow() + lifetime
+        Session.merge(cred)
+        Session.commit()
+        return cred
+
+    def test_not_found(self):
+        """
+        Missing credentials are not cached
+        """
+        self.assertEqual(None, get_credential('1234', '/CN=Someone'))
+        cred = self._store_credential(timedelta(hours=2))
+        self.assertEqual(cred.termination_time, get_credential('1234', '/CN=Someone').termination_time)
+
+    def test_cached(self):
+        """
+        Changes done directly into the database are not seen until the entry is invalidated
+        """
+        cred = self._store_credential(timedelta(hours=2))
+        cached = get_credential('1234', '/CN=Someone')
+        self.assertEqual(cred.termination_time, cached.termination_time)
+        self.assertEqual(None, cached.proxy)
+        self.assertFalse(cached.expired())
+
+        cred2 = self._store_credential(timedelta(hours=3), proxy='-PROXY2-')
+        self.assertEqual(cred.termination_time, get_credential('1234', '/CN=Someone').termination_time)
+
+        invalidate_credential('1234', '/CN=Someone')
+        self.assertEqual(cred2.termination_time, get_credential('1234', '/CN=Someone').termination_time)
+
+    def test_with_proxy(self):
+        """
+        The proxy is loaded only when asked for
+        """
+        self._store_credential(timedelta(hours=2))
+        self.assertEqual(None, get_credential('1234', '/CN=Someone').proxy)
+        self.assertEqual('-PROXY-', get_credential('1234', '/CN=Someone', with_proxy=True).proxy)
+        self.assertEqual('-PROXY-', get_credential('1234', '/CN=Someone').proxy)
+
+    def test_expire_with_credential(self):
+        """
+        Entries must not outlive the credential
+        """
+        self._store_credential(timedelta(seconds=1))
+        self.assertFalse(get_credential('1234', '/CN=Someone').expired())
+        time.sleep(1)
+        Session.query(Credential).delete()
+        Session.commit()
+        self.assertEqual(None, get_credential('1234', '/CN=Someone'))
+
+    def test_expired_not_cached(self):
+        """
+        Expired credentials are returned, but not cached
+        """
+        self._store_credential(timedelta(hours=-1))
+        self.assertTrue(get_credential('1234', '/CN=Someone').expired())
+        self.assertEqual(0, len(delegation_cache._cache))
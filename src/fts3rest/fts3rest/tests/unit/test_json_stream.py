@@ -0,0 +1,88 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import types
+import unittest
+from StringIO import StringIO
+
+from fts3rest.lib.helpers.json_stream import JsonObjectReader, MalformedJson
+
+
+class TestJsonStream(unittest.TestCase):
+    """
+    Test the incremental JSON reader
+    """
+
+    def setUp(self):
+        self.document = {
+            'params': {'retry': 12345, 'overwrite': True, 'metadata': None},
+            'files': [{'sources': ['root://source/%d' % i], 'filesize': i * 1000} for i in xrange(100)],
+            'other': u'\u00e1\u00e9'
+        }
+
+    def _read(self, content, chunk_size=7):
+        reader = JsonObjectReader(StringIO(content), streamed=['files'], chunk_size=chunk_size)
+        result = dict()
+        for (key, value) in reader:
+            if isinstance(value, types.GeneratorType):
+                value = list(value)
+            result[key] = value
+        return result
+
+    def test_equivalent(self):
+        """
+        The read object must be the same as with json.loads, regardless of the chunk size
+        """
+        content = json.dumps(self.document, indent=2)
+        for chunk_size in (1, 2, 7, 1024):
+            self.assertEqual(self.document, self._read(content, chunk_size))
+
+    def test_streamed_is_generator(self):
+        """
+        The streamed members must be generators
+        """
+        reader = JsonObjectReader(StringIO(json.dumps(self.document)), streamed=['files'], chunk_size=16)
+        for (key, value) in reader:
+            if key == 'files':
+                self.assertTrue(isinstance(value, types.GeneratorType))
+                self.assertEqual(self.document['files'][0], value.next())
+            else:
+                self.assertFalse(isinstance(value, types.GeneratorType))
+
+    def test_skip_streamed(self):
+        """
+        If the streamed member is not consumed, the following members must be read anyway
+        """
+        content = '{"files": [1, 2, 3], "params": {"a": 5}}'
+        reader = JsonObjectReader(StringIO(content), streamed=['files'], chunk_size=3)
+        keys = map(lambda m: m[0], reader)
+        self.assertEqual(['files', 'params'], keys)
+
+    def test_not_an_object(self):
+        """
+        Something that is not an object must be rejected
+        """
+        self.assertRaises(MalformedJson, self._read, '[1, 2, 3]')
+        self.assertRaises(MalformedJson, self._read, 'thisXisXnotXjson')
+        self.assertRaises(MalformedJson, self._read, '')
+
+    def test_truncated(self):
+        """
+        Truncated documents must be rejected
+        """
+        content = json.dumps(self.document)
+        for end in (1, 10, len(content) / 2, len(content) - 1):
+            self.assertRaises(MalformedJson, self._read, content[:end])
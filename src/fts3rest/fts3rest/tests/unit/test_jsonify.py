@@ -0,0 +1,202 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from datetime import datetime
+from nose.plugins.skip import SkipTest
+from unittest import TestCase
+import json
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from fts3.model import File, FileRetryLog, Job
+from fts3.model.base import Base
+from fts3rest.lib.helpers.jsonify import negotiate, serialize, stream_json, to_json
+from fts3rest.lib.helpers.jsonify import PRETTY, MINIFIED, NDJSON, MSGPACK
+
+
+class _DictWalkEncoder(json.JSONEncoder):
+    """
+    How the models used to be serialized, walking their __dict__
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(_DictWalkEncoder, self).__init__(*args, **kwargs)
+        self.visited = []
+
+    def default(self, obj):
+        if isinstance(obj, Base):
+            self.visited.append(obj)
+        if isinstance(obj, datetime):
+            return obj.strftime('%Y-%m-%dT%H:%M:%S%z')
+        values = {}
+        for (k, v) in obj.__dict__.iteritems():
+            if not k.startswith('_') and v not in self.visited:
+                values[k] = v
+                if isinstance(v, Base):
+                    self.visited.append(v)
+        return values
+
+
+class TestStreamJson(TestCase):
+    """
+    The streamed serialization must be the same as the one done in one go
+    """
+
+    def _assertSameJson(self, items):
+        expected = to_json(items)[0]
+        self.assertEqual(expected, ''.join(stream_json(iter(items))))
+
+    def test_empty(self):
+        self._assertSameJson([])
+
+    def test_values(self):
+        self._assertSameJson([
+            1, 'a "string"\nwith newlines', None,
+            {'nested': {'list': [1, 2, {'a': 'b'}], 'when': datetime(2015, 1, 2, 3, 4, 5)}},
+            [[], {}]
+        ])
+
+    def test_model(self):
+        files = list()
+        for i in xrange(10):
+            f = File()
+            f.file_id = i
+            f.source_surl = 'root://source/file%d' % i
+            f.start_time = datetime(2015, 1, 2, 3, 4, i)
+            files.append(f)
+        self._assertSameJson(files)
+
+    def test_chunks(self):
+        """
+        Big lists are sent by several chunks
+        """
+        items = [{'key': 'x' * 1024}] * 200
+        chunks = list(stream_json(iter(items)))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(to_json(items)[0], ''.join(chunks))
+
+
+class TestModelSerializer(TestCase):
+    """
+    The precompiled serializers must give the same output as the __dict__ walk
+    """
+
+    def _assertSameJson(self, data):
+        expected = json.dumps(data, cls=_DictWalkEncoder, indent=2, sort_keys=True)
+        self.assertEqual(expected, to_json(data)[0])
+
+    def _job(self, n_files):
+        job = Job()
+        job.job_id = 'abcd-%d' % n_files
+        job.job_state = 'ACTIVE'
+        job.submit_time = datetime(2015, 1, 2, 3, 4, 5)
+        job.job_finished = None
+        job.overwrite_flag = True
+        job.verify_checksum = 'r'
+        job.job_metadata = {'key': ['value', 1]}
+        for i in xrange(n_files):
+            f = File()
+            f.file_id = i
+            f.file_state = 'SUBMITTED'
+            f.file_metadata = None
+            retry = FileRetryLog()
+            retry.attempt = 1
+            retry.datetime = datetime(2015, 1, 2, 3, 4, i)
+            retry.reason = 'failure %d' % i
+            f.retries.append(retry)
+            job.files.append(f)
+        return job
+
+    def test_job(self):
+        self._assertSameJson(self._job(0))
+
+    def test_cycles(self):
+        """
+        The job holds the files, which point back to the job, and hold their retries,
+        which point back to the file
+        """
+        job = self._job(5)
+        self._assertSameJson(job)
+        self._assertSameJson([job, job.files[0]])
+
+    def test_extra_attributes(self):
+        """
+        Attributes set by the controllers are serialized too
+        """
+        job = self._job(1)
+        setattr(job, 'http_status', '200 Ok')
+        setattr(job, 'other', job.files[0])
+        self._assertSameJson(job)
+        self.assertEqual('200 Ok', json.loads(to_json(job)[0])['http_status'])
+
+    def test_no_lazy_load(self):
+        """
+        Relationships not loaded are not serialized
+        """
+        job = self._job(0)
+        self.assertNotIn('dm', json.loads(to_json(job)[0]))
+
+
+class TestOutputFormats(TestCase):
+    """
+    Content negotiation of the output format
+    """
+
+    def test_negotiate(self):
+        self.assertEqual(PRETTY, negotiate(''))
+        self.assertEqual(PRETTY, negotiate('*/*'))
+        self.assertEqual(PRETTY, negotiate('application/json'))
+        self.assertEqual(PRETTY, negotiate('text/html'))
+        self.assertEqual(MINIFIED, negotiate('application/json;pretty=false'))
+        self.assertEqual(NDJSON, negotiate('application/x-ndjson, application/json;q=0.5'))
+        self.assertEqual(PRETTY, negotiate('application/x-ndjson;q=0.1, application/json'))
+        self.assertEqual(PRETTY, negotiate('application/x-ndjson;q=0, */*'))
+
+    def test_msgpack_optional(self):
+        if msgpack is None:
+            self.assertEqual(MINIFIED, negotiate('application/msgpack, application/json;pretty=false;q=0.5'))
+        else:
+            self.assertEqual(MSGPACK, negotiate('application/msgpack, application/json;pretty=false;q=0.5'))
+
+    def test_msgpack(self):
+        if msgpack is None:
+            raise SkipTest('msgpack is not installed')
+        job = Job()
+        job.job_id = 'abcd'
+        job.submit_time = datetime(2015, 1, 2, 3, 4, 5)
+        decoded = msgpack.unpackb(''.join(serialize((j for j in [job]), MSGPACK)), raw=False)
+        self.assertEqual(json.loads(to_json([job])[0]), decoded)
+
+    def test_minified(self):
+        data = [{'a': 1, 'b': [1, 2]}, {'when': datetime(2015, 1, 2, 3, 4, 5)}]
+        minified = ''.join(serialize(data, MINIFIED))
+        self.assertNotIn(' ', minified)
+        self.assertEqual(json.loads(to_json(data)[0]), json.loads(minified))
+        self.assertEqual(minified, ''.join(serialize((d for d in data), MINIFIED)))
+
+    def test_ndjson(self):
+        data = [{'a': 1}, {'b': 'with\nnewline'}, []]
+        lines = ''.join(serialize((d for d in data), NDJSON)).split('\n')
+        self.assertEqual(['{"a":1}', '{"b":"with\\nnewline"}', '[]', ''], lines)
+        self.assertEqual(''.join(serialize(data, NDJSON)), ''.join(serialize((d for d in data), NDJSON)))
+        self.assertEqual('', ''.join(serialize((d for d in []), NDJSON)))
+        self.assertEqual('{"a":1}\n', ''.join(serialize({'a': 1}, NDJSON)))
+
+    def test_pretty_unchanged(self):
+        data = [{'a': 1, 'b': [1, 2]}]
+        self.assertEqual(to_json(data), serialize(data, PRETTY))
+        self.assertEqual(to_json(data)[0], ''.join(serialize((d for d in data), PRETTY)))
@@ -0,0 +1,119 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import unittest
+
+from fts3rest.lib.api.submit_validator import *
+
+
+class TestSubmitValidator(unittest.TestCase):
+    """
+    Validation of the transfers against the compiled schema
+    """
+
+    def _validate(self, transfer):
+        errors = SubmissionErrors()
+        valid = validate_transfer(transfer, 'files[0]', errors)
+        self.assertEqual(valid, len(errors) == 0)
+        return errors
+
+    def test_valid(self):
+        """
+        A regular transfer has no errors
+        """
+        errors = self._validate({
+            'sources': ['root://source.es/file'],
+            'destinations': ['root://dest.ch/file'],
+            'metadata': {'a': 'b'},
+            'filesize': 1024,
+            'checksum': None,
+            'selection_strategy': 'orderly'
+        })
+        self.assertEqual(0, len(errors))
+
+    def test_string_metadata(self):
+        """
+        Metadata can be a plain string
+        """
+        errors = self._validate({
+            'sources': ['root://source.es/file'],
+            'destinations': ['root://dest.ch/file'],
+            'metadata': 'some-metadata',
+        })
+        self.assertEqual(0, len(errors))
+
+    def test_string_filesize(self):
+        """
+        The file size can be a numeric string, but not any string
+        """
+        transfer = {'sources': ['root://source.es/file'], 'destinations': ['root://dest.ch/file']}
+        transfer['filesize'] = '1024'
+        self.assertEqual(0, len(self._validate(transfer)))
+        transfer['filesize'] = '1024.5'
+        self.assertEqual(0, len(self._validate(transfer)))
+        transfer['filesize'] = '-5'
+        self.assertEqual(['files[0].filesize'], map(lambda e: e['position'], self._validate(transfer).errors))
+        transfer['filesize'] = 'abc'
+        self.assertEqual(['files[0].filesize'], map(lambda e: e['position'], self._validate(transfer).errors))
+
+    def test_not_an_object(self):
+        """
+        Nothing else is checked if the type is wrong
+        """
+        errors = self._validate('root://source.es/file')
+        self.assertEqual(1, len(errors))
+        self.assertEqual('files[0]', errors.errors[0]['position'])
+
+    def test_all_collected(self):
+        """
+        All the errors are collected
+        """
+        errors = self._validate({
+            'sources': [],
+            'destinations': [42],
+            'filesize': True,
+            'checksum': 5
+        })
+        self.assertEqual(
+            ['files[0].checksum', 'files[0].destinations[0]', 'files[0].filesize', 'files[0].sources'],
+            sorted(map(lambda e: e['position'], errors.errors))
+        )
+
+    def test_limit(self):
+        """
+        Only up to the limit are reported, but all are counted
+        """
+        errors = SubmissionErrors(limit=2)
+        for i in range(5):
+            validate_transfer({}, 'files[%d]' % i, errors)
+        self.assertEqual(10, len(errors))
+        self.assertEqual(2, len(errors.errors))
+        try:
+            errors.check()
+            self.fail('Expected HTTPInvalidSubmission')
+        except HTTPInvalidSubmission, e:
+            self.assertEqual(10, e.error_count)
+            self.assertEqual(errors.errors[0]['message'], e.detail)
+
+    def test_deletion(self):
+        """
+        Deletions are strings or objects with a surl
+        """
+        errors = SubmissionErrors()
+        self.assertTrue(validate_deletion('root://source.es/file', 'delete[0]', errors))
+        self.assertTrue(validate_deletion({'surl': 'root://source.es/file'}, 'delete[1]', errors))
+        self.assertFalse(validate_deletion({'metadata': 'x'}, 'delete[2]', errors))
+        self.assertFalse(validate_deletion(None, 'delete[3]', errors))
+        self.assertEqual(['delete[2]', 'delete[3]'], map(lambda e: e['position'], errors.errors))
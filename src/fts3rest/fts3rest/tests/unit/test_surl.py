@@ -0,0 +1,65 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import unittest
+
+from fts3rest.lib.surl import LRUCache, parse_surl
+
+
+class TestSurl(unittest.TestCase):
+    """
+    Parsing of SURLs and storage elements
+    """
+
+    def test_parse(self):
+        """
+        The storage element is the scheme and the lowercase host, without port
+        """
+        surl = parse_surl('gsiftp://Some.Host:2811/path/file?query')
+        self.assertEqual('gsiftp://Some.Host:2811/path/file?query', surl.url)
+        self.assertEqual('gsiftp://some.host', surl.storage)
+        self.assertEqual('/path/file', surl.parsed.path)
+
+    def test_memoized(self):
+        """
+        The same string is parsed only once, and the storage elements are shared
+        """
+        a = parse_surl('root://host.cern.ch/file1')
+        self.assertTrue(a is parse_surl('root://host.cern.ch/file1'))
+        b = parse_surl('root://host.cern.ch/file2')
+        self.assertTrue(a.storage is b.storage)
+
+    def test_invalid(self):
+        """
+        Invalid urls raise ValueError every time
+        """
+        for i in range(2):
+            self.assertRaises(ValueError, parse_surl, '/etc/passwd')
+            self.assertRaises(ValueError, parse_surl, 'file:///etc/passwd')
+            self.assertRaises(ValueError, parse_surl, 'gsiftp://host.cern.ch/')
+
+    def test_lru(self):
+        """
+        The least recently used entries are dropped
+        """
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.put('c', 3)
+        self.assertEqual(2, len(cache))
+        self.assertEqual(None, cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
@@ -0,0 +1,80 @@
+#   Copyright notice:
+#   Copyright CERN, 2015.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from unittest import TestCase
+
+from fts3rest.lib.throttling import Throttle, TokenBucket
+
+
+class TestThrottling(TestCase):
+    """
+    Test the token buckets used for the admission control
+    """
+
+    def test_bucket_refill(self):
+        """
+        The bucket refills at the given rate, up to its capacity
+        """
+        bucket = TokenBucket(2, 4, now=100)
+        self.assertEqual(0, bucket.wait_for(4, 100))
+        bucket.tokens -= 4
+        self.assertEqual(1, bucket.wait_for(2, 100))
+        self.assertEqual(0, bucket.wait_for(2, 101))
+        self.assertEqual(4, bucket.refill(1000))
+
+    def test_no_limits(self):
+        """
+        Without limits, everything is admitted and there are no buckets
+        """
+        throttle = Throttle({('vo', 'jobs'): 0})
+        for i in xrange(100):
+            self.assertEqual(None, throttle.admit('dteam', '/DN=user', now=0))
+        throttle.charge_files('dteam', '/DN=user', 1000, now=0)
+        self.assertEqual([], throttle.state(now=0)['buckets'])
+
+    def test_jobs_per_vo(self):
+        """
+        The jobs are limited per VO, regardless of the user
+        """
+        throttle = Throttle({('vo', 'jobs'): 1}, burst=2)
+        self.assertEqual(None, throttle.admit('dteam', '/DN=user1', now=0))
+        self.assertEqual(None, throttle.admit('dteam', '/DN=user2', now=0))
+        self.assertEqual(('vo', 'jobs', 1), throttle.admit('dteam', '/DN=user3', now=0))
+        self.assertEqual(None, throttle.admit('atlas', '/DN=user3', now=0))
+        self.assertEqual(None, throttle.admit('dteam', '/DN=user3', now=1))
+
+    def test_files_per_dn(self):
+        """
+        The files are charged after admitting the job, so a big job puts the bucket in debt
+        """
+        throttle = Throttle({('dn', 'files'): 10}, burst=1)
+        self.assertEqual(None, throttle.admit('dteam', '/DN=user', now=0))
+        throttle.charge_files('dteam', '/DN=user', 30, now=0)
+        self.assertEqual(('dn', 'files', 2), throttle.admit('dteam', '/DN=user', now=0))
+        self.assertEqual(None, throttle.admit('dteam', '/DN=other', now=0))
+        self.assertEqual(None, throttle.admit('dteam', '/DN=user', now=2))
+
+    def test_rejected_not_charged(self):
+        """
+        A rejected job does not take tokens from the other buckets
+        """
+        throttle = Throttle({('vo', 'jobs'): 10, ('dn', 'jobs'): 1}, burst=1)
+        self.assertEqual(None, throttle.admit('dteam', '/DN=user', now=0))
+        self.assertEqual(('dn', 'jobs', 1), throttle.admit('dteam', '/DN=user', now=0))
+        buckets = dict(
+            map(lambda b: ((b['scope'], b['unit']), b['tokens']), throttle.state(now=0)['buckets'])
+        )
+        self.assertEqual(9, buckets[('vo', 'jobs')])
+        self.assertEqual(0, buckets[('dn', 'jobs')])